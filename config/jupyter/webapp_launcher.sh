@@ -3,8 +3,9 @@
 # Usage: webapp_launcher.sh <app_name>
 #
 # This script is called by JupyterLab ServerProxy to start a webapp.
-# It delegates to the Python wrapper which handles splash pages, container
-# startup, and proxying.
+# It attaches the app to the shared Python wrapper daemon, which handles
+# splash pages, container startup, and proxying for every webapp. Set
+# NEURODESK_WEBAPP_DAEMON=0 to run a separate wrapper process per app instead.
 
 APP_NAME="$1"
 
@@ -16,4 +17,8 @@ if [ -z "$APP_NAME" ]; then
     exit 1
 fi
 
-exec python3 /opt/neurodesktop/webapp_wrapper/webapp_wrapper.py "$APP_NAME"
+if [ "${NEURODESK_WEBAPP_DAEMON:-1}" = "0" ]; then
+    exec python3 /opt/neurodesktop/webapp_wrapper/webapp_wrapper.py "$APP_NAME"
+fi
+
+exec python3 /opt/neurodesktop/webapp_wrapper/webapp_attach.py "$APP_NAME"
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Attach a webapp launcher to the shared webapp wrapper daemon.
+
+Usage: webapp_attach.py <app_name>
+
+Connects to the daemon's control socket, starting the daemon first if it is
+not running, and asks it to start <app_name>.  The process then stays
+running for as long as jupyter-server-proxy keeps the app open; when it
+exits the daemon stops the app's backend.
+
+Only the standard library is imported so that each launcher stays small.
+"""
+
+import os
+import socket
+import struct
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+CONTROL_SOCKET = os.environ.get(
+    "NEURODESK_WEBAPP_DAEMON_SOCKET", f"/tmp/neurodesk_webapp_{os.getuid()}/daemon.sock"
+)
+DAEMON_LOGFILE = "/tmp/neurodesk_webapp_daemon.log"
+WRAPPER_PATH = Path(__file__).resolve().with_name("webapp_wrapper.py")
+DAEMON_START_TIMEOUT = 30
+
+
+def connect():
+    """Connect to the control socket; None if no daemon is listening.
+
+    Raises PermissionError when the process listening on it is not ours.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(CONTROL_SOCKET)
+    except OSError:
+        sock.close()
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+    _pid, uid, _gid = struct.unpack("3i", creds)
+    if uid != os.getuid():
+        sock.close()
+        raise PermissionError(f"{CONTROL_SOCKET} is served by uid {uid}, not by this user")
+    return sock
+
+
+def start_daemon():
+    # Own session: the daemon outlives the launcher that happened to start it
+    subprocess.Popen(
+        [sys.executable, str(WRAPPER_PATH), "--daemon"],
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def connect_or_start_daemon():
+    sock = connect()
+    if sock is not None:
+        return sock
+
+    start_daemon()
+    deadline = time.time() + DAEMON_START_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(0.05)
+        sock = connect()
+        if sock is not None:
+            return sock
+    return None
+
+
+def read_reply(sock):
+    reply = b""
+    while not reply.endswith(b"\n"):
+        data = sock.recv(1024)
+        if not data:
+            break
+        reply += data
+    return reply.decode("utf-8", "replace").strip()
+
+
+def main():
+    if len(sys.argv) != 2:
+        print("Usage: webapp_attach.py <app_name>")
+        print()
+        print("Starts the specified webapp in the shared webapp wrapper daemon")
+        print("and keeps it running until this process exits.")
+        sys.exit(1)
+
+    app_name = sys.argv[1]
+    try:
+        sock = connect_or_start_daemon()
+    except PermissionError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if sock is None:
+        print(f"Error: webapp daemon did not start; see {DAEMON_LOGFILE}")
+        sys.exit(1)
+
+    with sock:
+        sock.sendall(f"attach {app_name}\n".encode("utf-8"))
+        reply = read_reply(sock)
+        if reply != "ok":
+            reason = reply.removeprefix("error").strip() or "daemon closed the connection"
+            print(f"Error: {reason}")
+            sys.exit(1)
+
+        # Hold the attachment until the daemon exits; SIGTERM from
+        # jupyter-server-proxy ends the process and closes the socket
+        while sock.recv(1024):
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -8,33 +8,75 @@ This server provides instant startup for web applications by:
 3. Proxying requests to the application once it's ready
 
 Usage: webapp_wrapper.py <app_name>
+       webapp_wrapper.py --daemon
+
+With --daemon one process serves every webapp's socket and launchers attach
+to it through webapp_attach.py; with an app name it serves just that app.
 
 Reads configuration from /opt/neurodesktop/webapps.json
 """
 
+import abc
+import asyncio
+import atexit
+import bisect
+import errno
+import fcntl
+import functools
+import hashlib
 import http.server
+import io
+import queue
+import shutil
 import socket
 import socketserver
 import subprocess
 import threading
+import tracemalloc
 import urllib.parse
+import zlib
+import httpcore
 import httpx
 import os
 import json
+import random
 import re
 import select
+import shlex
+import stat
+import struct
 import time
 import signal
 import sys
+from collections import OrderedDict, deque
 from pathlib import Path
 from string import Template
 
+try:
+    import brotli
+except ImportError:  # Optional: br bodies are then proxied without rewriting
+    brotli = None
+
 
 # Streaming chunk size: 128KB reduces syscall count vs 8KB default
 STREAM_CHUNK_SIZE = 131072
+# Response writes at least this large bypass the wfile buffer: the payload and
+# its chunk framing go out in one sendmsg() straight from the chunk's memory
+SENDMSG_MIN_PAYLOAD = 16384
+# Most segments passed to one sendmsg() call (IOV_MAX on Linux)
+SENDMSG_MAX_SEGMENTS = 1024
 
 # Paths
 CONFIG_PATH = Path("/opt/neurodesktop/webapps.json")
+# Per-user directory for files the wrapper trusts when it reads them back
+RUNTIME_DIR = Path(f"/tmp/neurodesk_webapp_{os.getuid()}")
+DAEMON_SOCKET_PATH = str(RUNTIME_DIR / "daemon.sock")
+DAEMON_LOCK_PATH = str(RUNTIME_DIR / "daemon.lock")
+# Per-user record of opened webapps, read by the launcher for the warm set
+LAUNCH_HISTORY_PATH = Path.home() / ".config" / "neurodesk" / "webapp_launches.json"
+# Per-user directory for the resolved launch plans of module-based backends
+LAUNCH_PLAN_DIR = Path.home() / ".cache" / "neurodesk"
+DAEMON_LOGFILE = "/tmp/neurodesk_webapp_daemon.log"
 SCRIPT_DIR = Path(__file__).parent
 SPLASH_TEMPLATE_PATH = SCRIPT_DIR / "splash_template.html"
 
@@ -44,27 +86,47 @@ class UnixSocketHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamS
 
     daemon_threads = True
 
+    def __init__(self, *args, app=None, **kwargs):
+        self.app = app
+        self._detached_requests = set()
+        self._detached_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
     def get_request(self):
         request, client_address = super().get_request()
         # Wrap the socket to work with HTTP handler
         return request, ("", 0)
 
+    def detach_request(self, request):
+        """Mark a request socket as handed off (e.g. to the tunnel thread).
+
+        The handler thread's socket object is still closed when it finishes,
+        but without shutdown(SHUT_WR), which would also end the connection
+        for the duplicated descriptor that now owns it.
+        """
+        with self._detached_lock:
+            self._detached_requests.add(request)
+
+    def shutdown_request(self, request):
+        with self._detached_lock:
+            detached = request in self._detached_requests
+            self._detached_requests.discard(request)
+        if detached:
+            self.close_request(request)
+        else:
+            super().shutdown_request(request)
+
 
 class WebappConfig:
     """Load and provide access to webapp configuration."""
 
-    def __init__(self, app_name: str):
+    def __init__(self, app_name: str, webapps=None):
         self.app_name = app_name
-        self._load_config()
-
-    def _load_config(self):
-        if not CONFIG_PATH.exists():
-            raise FileNotFoundError(f"Config not found: {CONFIG_PATH}")
+        self._load_config(webapps)
 
-        with open(CONFIG_PATH) as f:
-            all_config = json.load(f)
-
-        webapps = all_config.get("webapps", {})
+    def _load_config(self, webapps=None):
+        if webapps is None:
+            webapps = load_webapps()
         if self.app_name not in webapps:
             available = ", ".join(webapps.keys()) or "none"
             raise ValueError(f"Unknown webapp: {self.app_name}. Available: {available}")
@@ -117,6 +179,52 @@ class WebappConfig:
         )
         self.stop_timeout = parse_int(config.get("stop_timeout"), get_default_stop_timeout(), minimum=1)
 
+        # What to do with an idle backend: "stop" it, or "freeze" it and stop
+        # it only after the longer idle_kill_timeout (0 keeps it frozen)
+        self.idle_action = parse_idle_action(config.get("idle_action"), get_default_idle_action())
+        self.idle_kill_timeout = parse_int(
+            config.get("idle_kill_timeout"),
+            get_default_idle_kill_timeout(),
+            minimum=0
+        )
+
+        # How a local test image is run: "exec" runs apptainer exec on every
+        # start; "instance" keeps a named apptainer instance across idle stops
+        # and execs into it, stopping it once the stopped app has had no
+        # traffic for instance_timeout seconds (0 keeps it until exit)
+        self.launch_mode = parse_launch_mode(config.get("launch_mode"), get_default_launch_mode())
+        self.instance_timeout = parse_int(
+            config.get("instance_timeout"), get_default_instance_timeout(), minimum=0
+        )
+
+        # cgroup v2 limits for the backend: cpu_quota (CPU cores), memory_max
+        # (bytes or a size such as "4G") and io_weight (1-10000)
+        self.cgroup_limits = parse_cgroup_limits(config, self.app_name)
+
+        # On-demand CPU and memory profiles of the wrapper process
+        self.profiling = bool(config.get("profiling", get_default_profiling()))
+
+        # Launcher hints may start the backend before the app is opened; a
+        # backend nobody opens is stopped after the shorter prestart timeout
+        self.prestart = bool(config.get("prestart", get_default_prestart()))
+        self.prestart_idle_timeout = parse_int(
+            config.get("prestart_idle_timeout"), get_default_prestart_idle_timeout(), minimum=1
+        )
+
+        # Socket activation: the wrapper binds the app's port and hands the
+        # listening socket to the app as fd 3 (LISTEN_FDS convention)
+        self.socket_activation = bool(config.get("socket_activation", False))
+
+        # Readiness probes; all must pass before requests are proxied
+        self.ready_probes = parse_ready_probes(
+            config.get("ready_probes"), self.app_name, self.socket_activation
+        )
+
+        # Serving engine: "threaded" (one thread per connection) or "asyncio"
+        # (a single event loop for all connections, suited to apps that hold
+        # many long-polls or WebSockets open)
+        self.server_mode = parse_server_mode(config.get("server_mode"), get_default_server_mode())
+
         # Path rewrites for apps built with hard-coded absolute paths
         # This rewrites paths like /hub/ezbids/ to the correct base path
         # Always include the app's own path as a fallback rewrite
@@ -125,36 +233,112 @@ class WebappConfig:
         if f"/{self.app_name}/" not in self.path_rewrites:
             self.path_rewrites.append(f"/{self.app_name}/")
 
+        # HTTP/1.1 persistent connections on the wrapper socket: seconds a
+        # connection may wait for its next request, and requests per connection
+        self.keepalive_timeout = parse_int(
+            config.get("keepalive_timeout"), get_default_keepalive_timeout(), minimum=1
+        )
+        self.keepalive_max_requests = parse_int(
+            config.get("keepalive_max_requests"), get_default_keepalive_max_requests(), minimum=1
+        )
+
+        # Bulk lane for large downloads and uploads: concurrent backend
+        # requests, the size (MiB) that makes a transfer bulk, and the rate
+        # (MiB/s; 0 disables pacing) bulk bodies are held to while
+        # interactive requests are active
+        self.bulk_max_connections = parse_int(
+            config.get("bulk_max_connections"), get_default_bulk_max_connections(), minimum=1
+        )
+        self.bulk_threshold_mb = parse_int(
+            config.get("bulk_threshold_mb"), get_default_bulk_threshold_mb(), minimum=1
+        )
+        self.bulk_rate_mb = parse_int(config.get("bulk_rate_mb"), get_default_bulk_rate_mb(), minimum=0)
+
+        # Replay the environment of the first successful module load on later
+        # starts instead of resolving the module through Lmod every time
+        self.launch_plan = bool(config.get("launch_plan", get_default_launch_plan()))
+
+        # On-disk cache of rewritten text assets (MiB; 0 disables it)
+        self.asset_cache_mb = parse_int(config.get("asset_cache_mb"), get_default_asset_cache_mb(), minimum=0)
+
+        # On-the-fly compression of uncompressed text responses: zlib level
+        # (0 disables it), smallest body worth compressing, and the share of
+        # one CPU core above which new responses are sent uncompressed
+        self.compression_level = min(
+            parse_int(config.get("compression_level"), get_default_compression_level(), minimum=0), 9
+        )
+        self.compression_min_bytes = parse_int(
+            config.get("compression_min_bytes"), get_default_compression_min_bytes(), minimum=0
+        )
+        self.compression_cpu_percent = parse_int(
+            config.get("compression_cpu_percent"), get_default_compression_cpu_percent(), minimum=0
+        )
+
         # Paths
         self.logfile = f"/tmp/{self.app_name}_wrapper.log"
+        self.access_logfile = f"/tmp/{self.app_name}_wrapper_access.log"
+        self.asset_cache_dir = str(RUNTIME_DIR / f"{self.app_name}_asset_cache")
+        self.launch_plan_file = str(LAUNCH_PLAN_DIR / f"webapp_{self.app_name}_launch_plan.json")
+        self.local_sif = f"/opt/neurodesktop-test-webapps/{self.app_name}/{self.app_name}.sif"
         self.status_endpoint = f"{self.app_name}-wrapper-status"
+        self.metrics_endpoint = f"{self.app_name}-wrapper-metrics"
+        self.logs_endpoint = f"{self.app_name}-wrapper-logs"
+        self.prestart_endpoint = f"{self.app_name}-wrapper-prestart"
+        self.profile_endpoint = f"{self.app_name}-wrapper-profile"
+
+
+# Backend connection pools: interactive requests and bulk transfers each
+# have their own, so long downloads cannot take the connections the UI needs
+BACKEND_POOL_CONNECTIONS = 20
+BULK_POOL_CONNECTIONS = 8
+
 
+def _http_client_options(max_connections=BACKEND_POOL_CONNECTIONS):
+    """Backend client settings shared by the threaded and asyncio engines."""
+    return {
+        "follow_redirects": False,
+        "timeout": httpx.Timeout(300.0, connect=10.0),
+        "limits": httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections // 2
+        ),
+    }
 
-def _create_http_client():
+
+def _create_http_client(max_connections=BACKEND_POOL_CONNECTIONS):
     """Create an httpx client with connection pooling."""
-    return httpx.Client(
-        follow_redirects=False,
-        timeout=httpx.Timeout(300.0, connect=10.0),
-        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
-    )
+    return httpx.Client(**_http_client_options(max_connections))
+
+
+def _create_async_http_client(max_connections=BACKEND_POOL_CONNECTIONS):
+    """Create the asyncio engine's backend client (same pool limits)."""
+    return httpx.AsyncClient(**_http_client_options(max_connections))
 
-# Persistent HTTP client with connection pooling (no redirect following so we can rewrite Location headers)
+
+def close_idle_connections(client, ports):
+    """Close ``client``'s idle pooled connections to the given localhost ports.
+
+    Connections in use are left alone; the pool drops closed connections
+    the next time it hands one out.
+    """
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return
+    origins = [httpcore.Origin(b"http", b"localhost", port) for port in ports]
+    for connection in pool.connections:
+        if connection.is_idle() and any(connection.can_handle_request(o) for o in origins):
+            connection.close()
+
+
+# Persistent HTTP client with connection pooling (no redirect following so we
+# can rewrite Location headers), shared by every app the process serves
 _http_client = _create_http_client()
+# Separate pool for requests in the bulk lane (see ProxyLanes)
+_bulk_http_client = _create_http_client(BULK_POOL_CONNECTIONS)
 
-# Global state
-config: WebappConfig = None
-container_ready = False
-container_error = None
-container_process = None
-container_pgid = None
-container_output = []  # Collected output from container process
-startup_start_time = None
-container_start_thread = None
-last_client_activity = 0.0
-active_client_requests = 0
-httpd_server = None
-shutdown_event = threading.Event()
-shutdown_lock = threading.Lock()
+# Process-wide log for messages not tied to one app: the app's own log in
+# single-app mode, the daemon log in daemon mode.  Per-app state lives in
+# WebappApp.
+process_logfile = None
 
 
 def parse_int(value, default, minimum=0):
@@ -186,572 +370,3933 @@ def get_default_stop_timeout():
     return parse_int(os.environ.get("NEURODESK_WEBAPP_STOP_TIMEOUT"), 10, minimum=1)
 
 
-def drain_process_output(proc):
-    """Read and store process output to prevent pipe buffer from blocking."""
-    global container_output
-    try:
-        while True:
-            line = proc.stdout.readline()
-            if not line and proc.poll() is not None:
-                break
-            if line:
-                container_output.append(line.rstrip())
-                log(f"Container output: {line.rstrip()}")
-    except Exception as e:
-        log(f"Error draining output: {e}")
-
-
-def log(message):
-    """Log message to file with timestamp."""
-    with open(config.logfile, "a") as f:
-        f.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')}: {message}\n")
-
+def get_default_asset_cache_mb():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_ASSET_CACHE_MB"), 256, minimum=0)
 
-def find_free_port():
-    """Find a free TCP port by briefly binding to port 0."""
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(('', 0))
-        return s.getsockname()[1]
 
+def get_default_compression_level():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_COMPRESSION_LEVEL"), 6, minimum=0)
 
-def check_port(port):
-    """Check if something is listening on the given TCP port."""
-    try:
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(0.2)
-        result = sock.connect_ex(('localhost', port))
-        sock.close()
-        return result == 0
-    except Exception:
-        return False
 
+def get_default_compression_min_bytes():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_COMPRESSION_MIN_BYTES"), 1024, minimum=0)
 
-def check_app_ready():
-    """Check if the webapp is responding on its expected port.
 
-    Checks the dynamic port first. If the container hasn't been updated to
-    read NEURODESK_WEBAPP_PORT, it will still listen on its default port,
-    so we fall back to checking that as well.
-    """
-    # Check dynamic port first (container supports NEURODESK_WEBAPP_PORT)
-    if check_port(config.target_port):
-        return True
+def get_default_compression_cpu_percent():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_COMPRESSION_CPU_PERCENT"), 80, minimum=0)
 
-    # Fallback: check the default port from the recipe config.
-    # This handles containers that haven't been rebuilt yet and still
-    # use a hardcoded port. Once all containers are updated, this
-    # fallback is never triggered.
-    if config.default_port != config.target_port and check_port(config.default_port):
-        log(f"App listening on default port {config.default_port} instead of "
-            f"dynamic port {config.target_port} — container likely needs rebuild "
-            f"to support NEURODESK_WEBAPP_PORT")
-        config.target_port = config.default_port
-        for i, (prefix, port) in enumerate(config.routes):
-            if prefix == f"/{config.app_name}":
-                config.routes[i] = (prefix, config.default_port)
-                break
-        return True
 
-    return False
+def get_default_prestart():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_PRESTART"), 1, minimum=0) > 0
 
 
-def build_path_rewrite_map(path_rewrites, base_path):
-    """Build byte rewrite pairs for backend paths embedded in text responses."""
-    rewrite_map = []
-    base_bytes = base_path.encode('utf-8')
+def get_default_prestart_idle_timeout():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_PRESTART_IDLE_TIMEOUT"), 60, minimum=1)
 
-    for rewrite in path_rewrites or []:
-        if isinstance(rewrite, str):
-            if rewrite:
-                rewrite_map.append((rewrite.encode('utf-8'), base_bytes))
-            continue
 
-        if not isinstance(rewrite, dict):
-            continue
+def get_default_warm_set_size():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_WARM_SET"), 0, minimum=0)
 
-        source = rewrite.get("from")
-        target = rewrite.get("to", "${base_path}")
-        if not isinstance(source, str) or not source:
-            continue
-        if not isinstance(target, str):
-            continue
 
-        target = target.replace("${base_path}", base_path)
-        target = target.replace("$base_path", base_path)
-        rewrite_map.append((source.encode('utf-8'), target.encode('utf-8')))
+def get_default_launch_plan():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_LAUNCH_PLAN"), 1, minimum=0) > 0
 
-    return rewrite_map
 
+def get_default_profiling():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_PROFILING"), 0, minimum=0) > 0
 
-def apply_path_rewrites(data, rewrite_map):
-    """Apply path rewrites without rewriting replacement text again."""
-    if not rewrite_map:
-        return data
 
-    rewrite_map = sorted(rewrite_map, key=lambda item: len(item[0]), reverse=True)
-    replacements = {old: new for old, new in rewrite_map}
-    pattern = re.compile(b"|".join(re.escape(old) for old, _ in rewrite_map))
-    return pattern.sub(lambda match: replacements[match.group(0)], data)
+def get_default_idle_kill_timeout():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_IDLE_KILL_TIMEOUT"), 1800, minimum=0)
 
 
-def mark_client_activity():
-    """Update last-seen timestamp for browser activity."""
-    global last_client_activity
-    last_client_activity = time.time()
+def get_default_keepalive_timeout():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_KEEPALIVE_TIMEOUT"), 60, minimum=1)
 
 
-def begin_client_request():
-    """Track in-flight client requests and activity."""
-    global active_client_requests
-    with shutdown_lock:
-        active_client_requests += 1
-    mark_client_activity()
+def get_default_keepalive_max_requests():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_KEEPALIVE_MAX_REQUESTS"), 1000, minimum=1)
 
 
-def end_client_request():
-    """Update request counters after handling a client request.
+def get_default_log_max_mb():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_LOG_MAX_MB"), 10, minimum=0)
 
-    Does NOT mark activity — only begin_client_request() does that.
-    A response completing just means the proxy finished; the browser
-    may already be gone (e.g. a long-poll returning after tab close).
-    """
-    global active_client_requests
-    with shutdown_lock:
-        active_client_requests = max(0, active_client_requests - 1)
 
+def get_default_log_backups():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_LOG_BACKUPS"), 3, minimum=0)
 
-def process_group_exists(pgid):
-    """Check whether a process group still exists."""
-    if pgid is None:
-        return False
-    try:
-        os.killpg(pgid, 0)
-        return True
-    except ProcessLookupError:
-        return False
-    except PermissionError:
-        return True
 
+def get_default_bulk_max_connections():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_BULK_MAX_CONNECTIONS"), 4, minimum=1)
 
-def _find_session_pids(sid):
-    """Find all PIDs belonging to the given session, excluding ourselves.
 
-    When start_new_session=True is used, the child becomes the session
-    leader (SID == PID).  All descendants inherit this SID even if they
-    create their own process groups, so scanning by SID catches processes
-    that escape the PGID-based kill.
-    """
-    pids = []
-    my_pid = os.getpid()
-    try:
-        for entry in os.listdir('/proc'):
-            if not entry.isdigit():
-                continue
-            pid = int(entry)
-            if pid == my_pid:
-                continue
-            try:
-                with open(f'/proc/{pid}/stat') as f:
-                    stat_line = f.read()
-                # Format: pid (comm) state ppid pgrp session ...
-                # comm can contain spaces/parens, so find the LAST ')'.
-                close_paren = stat_line.rindex(')')
-                fields = stat_line[close_paren + 2:].split()
-                # fields: 0=state, 1=ppid, 2=pgrp, 3=session
-                proc_sid = int(fields[3])
-                if proc_sid == sid:
-                    pids.append(pid)
-            except (FileNotFoundError, ValueError, PermissionError, IndexError):
-                continue
-    except FileNotFoundError:
-        pass
-    return pids
+def get_default_bulk_threshold_mb():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_BULK_THRESHOLD_MB"), 8, minimum=1)
 
 
-def _kill_orphan_processes(sid):
-    """Kill any descendant processes that escaped the PGID-based kill.
+def get_default_bulk_rate_mb():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_BULK_RATE_MB"), 8, minimum=0)
 
-    This handles the case where Apptainer/Singularity child processes
-    (e.g. rserver forks, fuse handlers) create their own process groups
-    and survive os.killpg().  We find them by session ID and SIGKILL them.
-    """
-    if sid is None:
-        return
 
-    remaining = _find_session_pids(sid)
-    if not remaining:
-        return
+IDLE_ACTIONS = ("stop", "freeze")
 
-    log(f"Found {len(remaining)} orphan process(es) in session {sid}: {remaining}")
-    for pid in remaining:
-        try:
-            os.kill(pid, signal.SIGKILL)
-            log(f"Killed orphan PID {pid}")
-        except (ProcessLookupError, PermissionError):
-            pass
 
-    # Give the kernel a moment to reap the killed processes
-    time.sleep(0.5)
+def parse_idle_action(value, default):
+    """Return a known idle action name, or the default."""
+    if isinstance(value, str) and value.strip().lower() in IDLE_ACTIONS:
+        return value.strip().lower()
+    return default
 
-    # Check if any survived even SIGKILL (e.g. stuck in uninterruptible I/O)
-    still_alive = _find_session_pids(sid)
-    if still_alive:
-        log(f"Warning: {len(still_alive)} process(es) survived SIGKILL: {still_alive}")
 
+def get_default_idle_action():
+    return parse_idle_action(os.environ.get("NEURODESK_WEBAPP_IDLE_ACTION"), "stop")
 
-def _kill_processes_on_port(port):
-    """Kill any process still listening on the target port.
 
-    Safety net for processes that escaped both the PGID and SID kills
-    (e.g. Apptainer child that called setsid()).  Parses /proc/net/tcp
-    to find socket inodes bound to the port, then matches them against
-    /proc/*/fd to identify owning PIDs.
-    """
-    if port is None:
-        return
+LAUNCH_MODES = ("exec", "instance")
 
-    hex_port = f'{port:04X}'
-    target_inodes = set()
-    try:
-        with open('/proc/net/tcp') as f:
-            for line in f:
-                parts = line.split()
-                if len(parts) < 10:
-                    continue
-                # local_address format: hex_ip:hex_port
-                local_addr = parts[1]
-                if local_addr.endswith(f':{hex_port}'):
-                    inode = parts[9]
-                    if inode != '0':
-                        target_inodes.add(inode)
-    except (FileNotFoundError, PermissionError):
-        return
 
-    if not target_inodes:
-        return
+def parse_launch_mode(value, default):
+    """Return a known launch mode name, or the default."""
+    if isinstance(value, str) and value.strip().lower() in LAUNCH_MODES:
+        return value.strip().lower()
+    return default
 
-    my_pid = os.getpid()
-    for entry in os.listdir('/proc'):
-        if not entry.isdigit():
-            continue
-        pid = int(entry)
-        if pid == my_pid:
-            continue
-        try:
-            fd_dir = f'/proc/{pid}/fd'
-            for fd in os.listdir(fd_dir):
-                try:
-                    link = os.readlink(f'{fd_dir}/{fd}')
-                    if link.startswith('socket:['):
-                        inode = link[8:-1]
-                        if inode in target_inodes:
-                            log(f"Killing PID {pid} still bound to port {port}")
-                            os.kill(pid, signal.SIGKILL)
-                            break
-                except (FileNotFoundError, PermissionError):
-                    continue
-        except (FileNotFoundError, PermissionError):
-            continue
 
+def get_default_launch_mode():
+    return parse_launch_mode(os.environ.get("NEURODESK_WEBAPP_LAUNCH_MODE"), "exec")
 
-def stop_container_processes():
-    """Stop the started container/app process group and all descendants."""
-    global container_process, container_pgid
 
-    pgid = container_pgid
-    if pgid is None and container_process is not None:
-        try:
-            pgid = os.getpgid(container_process.pid)
-        except (ProcessLookupError, PermissionError):
-            pgid = None
+def get_default_instance_timeout():
+    return parse_int(os.environ.get("NEURODESK_WEBAPP_INSTANCE_TIMEOUT"), 3600, minimum=0)
 
-    if pgid is None or not process_group_exists(pgid):
-        container_pgid = None
-        # Process group gone, but children may have escaped to their own group
-        _kill_processes_on_port(config.target_port)
-        return
 
-    # SID == PGID for the session leader (start_new_session=True)
-    sid = pgid
+SERVER_MODES = ("threaded", "asyncio")
 
-    log(f"Stopping process group {pgid} for {config.app_name}")
 
-    try:
-        os.killpg(pgid, signal.SIGTERM)
-    except ProcessLookupError:
-        container_pgid = None
-        _kill_orphan_processes(sid)
-        _kill_processes_on_port(config.target_port)
-        return
+def parse_server_mode(value, default):
+    """Return a known serving engine name, or the default."""
+    if isinstance(value, str) and value.strip().lower() in SERVER_MODES:
+        return value.strip().lower()
+    return default
 
-    deadline = time.time() + config.stop_timeout
-    while time.time() < deadline:
-        if not process_group_exists(pgid):
-            container_pgid = None
-            _kill_orphan_processes(sid)
-            _kill_processes_on_port(config.target_port)
-            return
-        time.sleep(0.2)
 
-    log(f"Process group {pgid} did not exit after {config.stop_timeout}s; sending SIGKILL")
-    try:
-        os.killpg(pgid, signal.SIGKILL)
-    except ProcessLookupError:
-        pass
-    container_pgid = None
+def get_default_server_mode():
+    return parse_server_mode(os.environ.get("NEURODESK_WEBAPP_SERVER_MODE"), "threaded")
 
-    # Wait briefly for SIGKILL to take effect before scanning for orphans
-    time.sleep(0.5)
-    _kill_orphan_processes(sid)
-    _kill_processes_on_port(config.target_port)
 
+READY_PROBE_TYPES = ("tcp", "http", "output", "unix_socket", "accept")
 
-def reset_container_runtime_state(clear_error=True):
-    """Reset runtime state after stopping or before restarting the backend."""
-    global container_ready, container_error, container_process, container_output, startup_start_time
-    container_ready = False
-    container_process = None
-    container_output = []
-    startup_start_time = None
-    if clear_error:
-        container_error = None
 
+def parse_ready_probes(value, app_name, socket_activation=False):
+    """Validate a webapp's ``ready_probes`` list.
 
-def ensure_container_starting(reason="request"):
-    """Start the backend container if it is not already ready/starting."""
-    global container_start_thread
+    Defaults to a TCP probe, or to an accept probe for socket-activated
+    apps (their port accepts connections before the app is running).
+    """
+    if value is None:
+        return [{"type": "accept" if socket_activation else "tcp"}]
+    if not isinstance(value, list) or not value:
+        raise ValueError(f"{app_name}: ready_probes must be a non-empty list")
+
+    probes = []
+    for spec in value:
+        if isinstance(spec, str):
+            spec = {"type": spec}
+        if not isinstance(spec, dict) or spec.get("type") not in READY_PROBE_TYPES:
+            raise ValueError(
+                f"{app_name}: invalid ready probe {spec!r} "
+                f"(type must be one of {', '.join(READY_PROBE_TYPES)})"
+            )
+        if spec["type"] == "output":
+            try:
+                re.compile(spec.get("pattern", ""))
+            except (TypeError, re.error) as e:
+                raise ValueError(f"{app_name}: invalid output probe pattern: {e}") from e
+            if not spec.get("pattern"):
+                raise ValueError(f"{app_name}: output probe needs a pattern")
+        if spec["type"] == "unix_socket" and not isinstance(spec.get("path"), str):
+            raise ValueError(f"{app_name}: unix_socket probe needs a path")
+        probes.append(spec)
+    return probes
+
+
+# cpu.max period; cpu_quota is written as cores * period microseconds
+CPU_MAX_PERIOD_USEC = 100000
+# Smallest cpu.max quota the kernel accepts
+CPU_MAX_MIN_QUOTA_USEC = 1000
+MEMORY_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_memory_size(value):
+    """Bytes from an integer or a size such as ``"512M"`` or ``"4GiB"``; None if invalid."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if value > 0 else None
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*", str(value), re.IGNORECASE)
+    if match is None:
+        return None
+    size = int(float(match.group(1)) * MEMORY_SIZE_UNITS[match.group(2).lower()])
+    return size if size > 0 else None
+
+
+def parse_cgroup_limits(config, app_name):
+    """Validate a webapp's cgroup limit keys into cgroup v2 file values.
+
+    Returns a dict mapping ``cpu.max``, ``memory.max`` and ``io.weight`` to
+    what is written there; keys the webapp does not set are left out.
+    """
+    limits = {}
+    cpu_quota = config.get("cpu_quota")
+    if cpu_quota is not None:
+        try:
+            cores = float(cpu_quota)
+        except (TypeError, ValueError):
+            cores = 0.0
+        if isinstance(cpu_quota, bool) or not 0 < cores < 10000:
+            raise ValueError(f"{app_name}: cpu_quota must be a positive number of CPU cores")
+        quota = max(int(cores * CPU_MAX_PERIOD_USEC), CPU_MAX_MIN_QUOTA_USEC)
+        limits["cpu.max"] = f"{quota} {CPU_MAX_PERIOD_USEC}"
+    memory_max = config.get("memory_max")
+    if memory_max is not None:
+        size = parse_memory_size(memory_max)
+        if size is None:
+            raise ValueError(f'{app_name}: memory_max must be a size in bytes or like "4G"')
+        limits["memory.max"] = str(size)
+    io_weight = config.get("io_weight")
+    if io_weight is not None:
+        weight = parse_int(io_weight, 0, minimum=1)
+        if isinstance(io_weight, bool) or not 1 <= weight <= 10000:
+            raise ValueError(f"{app_name}: io_weight must be an integer from 1 to 10000")
+        limits["io.weight"] = f"default {weight}"
+    return limits
+
+
+# Log records waiting for the writer thread, and most written per batch
+LOG_QUEUE_SIZE = 10000
+LOG_BATCH_SIZE = 512
+
+
+class LogWriter:
+    """Background writer for the wrapper's log files.
+
+    write() only queues the line; one thread appends it to a file it keeps
+    open, flushing once per batch, and rotates files by size into
+    ``<file>.1`` (newest) .. ``<file>.<backups>``.  When the queue is full,
+    records are dropped and counted rather than slowing the request or
+    output reader that produced them.
+    """
 
-    with shutdown_lock:
-        if shutdown_event.is_set():
-            return
-        if container_ready:
+    def __init__(self, max_bytes, backups, queue_size=LOG_QUEUE_SIZE):
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.queue = queue.Queue(queue_size)
+        self.dropped = 0
+        self._reported_dropped = 0
+        self._files = {}  # path -> [file, size]
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+                    self._thread.start()
+
+    def write(self, path, line):
+        """Queue ``line`` (with its newline) to be appended to ``path``."""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait((path, line))
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout=None):
+        """Wait until everything queued so far has been written."""
+        if self._thread is None:
             return
-        if container_start_thread is not None and container_start_thread.is_alive():
+        written = threading.Event()
+        try:
+            self.queue.put((None, written), timeout=timeout)
+        except queue.Full:
             return
+        written.wait(timeout)
 
-        # Clear previous errors for fresh restart attempts.
-        reset_container_runtime_state(clear_error=True)
-        container_start_thread = threading.Thread(target=start_container, daemon=True)
-        container_start_thread.start()
-        log(f"Starting backend launch thread ({reason})")
-
-
-def _close_backend_connections():
-    """Close all pooled TCP connections to the backend.
+    def _run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < LOG_BATCH_SIZE:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
 
-    httpx's pool only reaps expired connections when a new request arrives.
-    When the user closes all tabs and no requests follow, idle connections
-    linger until the OS times them out.  Swapping the client forces an
-    immediate close so that TCP sessions don't outlive the backend process.
-    """
-    global _http_client
-    old_client = _http_client
-    _http_client = _create_http_client()
-    old_client.close()
+            flushed = []
+            touched = set()
+            for path, line in batch:
+                if path is None:
+                    flushed.append(line)
+                    continue
+                self._append(path, line)
+                touched.add(path)
+            if self.dropped != self._reported_dropped and process_logfile is not None:
+                dropped, self._reported_dropped = self.dropped - self._reported_dropped, self.dropped
+                self._append(process_logfile, format_log_line(
+                    f"{dropped} log records dropped; the log writer fell behind"
+                ))
+                touched.add(process_logfile)
+            for path in touched:
+                entry = self._files.get(path)
+                if entry is not None:
+                    try:
+                        entry[0].flush()
+                    except OSError:
+                        self._close(path)
+            for event in flushed:
+                event.set()
+
+    def _append(self, path, line):
+        data = line.encode("utf-8", "replace")
+        try:
+            entry = self._files.get(path)
+            if entry is not None and self.max_bytes and entry[1] and entry[1] + len(data) > self.max_bytes:
+                self._rotate(path)
+                entry = None
+            if entry is None:
+                log_file = open(path, "ab")
+                entry = self._files[path] = [log_file, log_file.tell()]
+            entry[0].write(data)
+            entry[1] += len(data)
+        except OSError:
+            # Nowhere to report it; try the file afresh on the next record
+            self._close(path)
+
+    def _close(self, path):
+        entry = self._files.pop(path, None)
+        if entry is not None:
+            try:
+                entry[0].close()
+            except OSError:
+                pass
 
+    def _rotate(self, path):
+        self._close(path)
+        if self.backups == 0:
+            os.unlink(path)
+            return
+        for generation in range(self.backups - 1, 0, -1):
+            older = f"{path}.{generation}"
+            if os.path.exists(older):
+                os.replace(older, f"{path}.{generation + 1}")
+        os.replace(path, f"{path}.1")
 
-def stop_backend_for_idle(idle_for):
-    """Stop only the backend app after inactivity, keeping wrapper alive."""
-    with shutdown_lock:
-        backend_running = process_group_exists(container_pgid)
-        was_ready = container_ready
 
-    if not backend_running and not was_ready:
-        return
+_log_writer = LogWriter(get_default_log_max_mb() * 1024 * 1024, get_default_log_backups())
+# Records still queued at exit are written before the process ends
+atexit.register(_log_writer.flush, 5)
 
-    log(f"Idle timeout reached after {idle_for:.1f}s; stopping backend and waiting for next launch")
-    stop_container_processes()
-    with shutdown_lock:
-        reset_container_runtime_state(clear_error=True)
-        mark_client_activity()
-    _close_backend_connections()
 
+def format_log_line(message):
+    return f"{time.strftime('%Y-%m-%d %H:%M:%S')}: {message}\n"
 
-def initiate_shutdown(reason):
-    """Stop container processes and exit the wrapper server."""
-    global httpd_server
 
-    if shutdown_event.is_set():
+def log(message, logfile=None):
+    """Log message to ``logfile`` (default: the process log) with timestamp."""
+    logfile = logfile or process_logfile
+    if logfile is None:
         return
-
-    with shutdown_lock:
-        if shutdown_event.is_set():
-            return
-        shutdown_event.set()
-
-    log(f"Initiating wrapper shutdown: {reason}")
-    stop_container_processes()
-
-    if httpd_server is not None:
-        threading.Thread(target=httpd_server.shutdown, daemon=True).start()
+    _log_writer.write(logfile, format_log_line(message))
 
 
-def monitor_idle_timeout():
-    """Stop backend processes when the browser is gone and requests stop."""
-    if config.idle_timeout <= 0:
-        log("Idle timeout disabled (idle_timeout <= 0)")
-        return
+def flush_logs(timeout=5):
+    """Wait for queued log records to reach their files."""
+    _log_writer.flush(timeout)
 
-    log(
-        f"Idle timeout enabled: {config.idle_timeout}s "
-        f"(check interval: {config.idle_check_interval}s, heartbeat: {config.heartbeat_interval}s)"
-    )
 
-    while not shutdown_event.is_set():
-        time.sleep(config.idle_check_interval)
-        if shutdown_event.is_set():
-            return
+def find_free_port():
+    """Find a free TCP port by briefly binding to port 0."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('', 0))
+        return s.getsockname()[1]
 
-        with shutdown_lock:
-            inflight = active_client_requests
+
+def check_port(port):
+    """Check if something is listening on the given TCP port."""
+    try:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.settimeout(0.2)
+        result = sock.connect_ex(('localhost', port))
+        sock.close()
+        return result == 0
+    except Exception:
+        return False
+
+
+class ReadinessProbe(abc.ABC):
+    """One entry of a webapp's ``ready_probes``; check() is True once it passes."""
+
+    def __init__(self, spec, app=None):
+        self.spec = spec
+        self.app = app
+
+    def __str__(self):
+        return self.spec["type"]
+
+    @abc.abstractmethod
+    def check(self):
+        """Return True once the backend passes this probe; called repeatedly."""
+
+
+class TcpReadinessProbe(ReadinessProbe):
+    """Something accepts TCP connections on the app's port."""
+
+    def check(self):
+        return self.app.check_app_ready()
+
+
+class HttpReadinessProbe(ReadinessProbe):
+    """A GET of ``path`` (default: start_page) returns an expected status.
+
+    ``status`` may be a code or a list of codes; without it any response
+    below 500 counts.
+    """
+
+    def __init__(self, spec, app=None):
+        super().__init__(spec, app)
+        self.path = spec.get("path", app.config.start_page)
+        statuses = spec.get("status")
+        if isinstance(statuses, int):
+            statuses = [statuses]
+        self.statuses = set(statuses) if statuses else None
+
+    def __str__(self):
+        return f"http {self.path}"
+
+    def check(self):
+        try:
+            response = _http_client.get(
+                f"http://localhost:{self.app.config.target_port}{self.path}", timeout=2.0
+            )
+        except httpx.HTTPError:
+            return False
+        if self.statuses is not None:
+            return response.status_code in self.statuses
+        return response.status_code < 500
+
+
+class OutputReadinessProbe(ReadinessProbe):
+    """A container output line matches ``pattern``."""
+
+    def __init__(self, spec, app=None):
+        super().__init__(spec, app)
+        self.pattern = re.compile(spec["pattern"])
+        self._next_line = 0
+        self._matched = False
+
+    def __str__(self):
+        return f"output /{self.pattern.pattern}/"
+
+    def check(self):
+        if not self._matched:
+            lines, self._next_line, _missed = self.app.container_output.since(self._next_line)
+            self._matched = any(self.pattern.search(line) for line in lines)
+        return self._matched
+
+
+class UnixSocketReadinessProbe(ReadinessProbe):
+    """A Unix socket exists at ``path`` and accepts connections."""
+
+    def __str__(self):
+        return f"unix_socket {self.spec['path']}"
+
+    def check(self):
+        path = self.spec["path"]
+        try:
+            if not stat.S_ISSOCK(os.stat(path).st_mode):
+                return False
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(0.5)
+                sock.connect(path)
+        except OSError:
+            return False
+        return True
+
+
+# First fd passed under the LISTEN_FDS convention (SD_LISTEN_FDS_START)
+LISTEN_FDS_START = 3
+
+
+def create_listen_socket():
+    """Bind and listen on a free loopback port for a socket-activated app."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(("127.0.0.1", 0))
+        sock.listen(socket.SOMAXCONN)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def backend_launch_command(cmd, listen_fd=None, cgroup=None):
+    """Wrap ``cmd`` in a shell prelude that runs before the backend starts.
+
+    The prelude joins ``cgroup`` first, so every process the backend forks
+    is created inside it, and for socket activation moves the listener to
+    fd 3 and sets LISTEN_PID.  LISTEN_PID is the pid that execs ``cmd``;
+    apps behind apptainer or a module wrapper run in a child of it and
+    should rely on LISTEN_FDS.
+    """
+    steps = []
+    if cgroup is not None:
+        # Best effort: without the move the backend is tracked by process group
+        steps.append(f"{{ echo $$ > {shlex.quote(str(cgroup.procs_path))}; }} 2>/dev/null")
+    if listen_fd is not None:
+        if listen_fd != LISTEN_FDS_START:
+            steps.append(f"exec {LISTEN_FDS_START}<&{listen_fd} {listen_fd}<&-")
+        steps.append("export LISTEN_PID=$$ APPTAINERENV_LISTEN_PID=$$")
+    if not steps:
+        return cmd
+    steps.append('exec "$@"')
+    return ["bash", "-c", "; ".join(steps), "webapp-backend", *cmd]
+
+
+def find_cgroup2_mount():
+    """Return the cgroup v2 mount point, or None on cgroup v1-only hosts."""
+    try:
+        with open("/proc/self/mountinfo") as f:
+            for line in f:
+                fields, _, fs_fields = line.partition(" - ")
+                if fs_fields.split(" ", 1)[0] == "cgroup2":
+                    return fields.split(" ")[4]
+    except OSError:
+        pass
+    return None
+
+
+def get_backend_cgroup_parent():
+    """Directory under which backend cgroups are created, or None.
+
+    Defaults to the wrapper's own cgroup v2 directory, which is writable
+    when the container was given a delegated cgroup namespace.
+    NEURODESK_WEBAPP_CGROUP_ROOT overrides it.
+    """
+    override = os.environ.get("NEURODESK_WEBAPP_CGROUP_ROOT")
+    if override:
+        return Path(override)
+    mount = find_cgroup2_mount()
+    if mount is None:
+        return None
+    try:
+        with open("/proc/self/cgroup") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return Path(mount) / line[3:].strip().lstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+# Controller that owns each limit file written from a webapp's cgroup keys
+CGROUP_LIMIT_CONTROLLERS = {"cpu.max": "cpu", "memory.max": "memory", "io.weight": "io"}
+PRESSURE_RESOURCES = ("cpu", "memory", "io")
+# memory.events counters logged when they grow
+MEMORY_EVENT_KEYS = ("high", "max", "oom", "oom_kill")
+# Memory PSI "some avg10" (%) at which a pressure episode is logged; it
+# ends once the value falls below half of this
+MEMORY_PRESSURE_LOG_PERCENT = 10.0
+
+
+class BackendCgroup:
+    """A cgroup v2 child holding one backend's process tree."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def procs_path(self):
+        return self.path / "cgroup.procs"
+
+    @classmethod
+    def create(cls, name):
+        """Create (or reuse) the named child cgroup; None if not possible."""
+        parent = get_backend_cgroup_parent()
+        if parent is None:
+            return None
+        cgroup = cls(parent / name)
+        try:
+            cgroup.path.mkdir(exist_ok=True)
+        except OSError:
+            return None
+        if not os.access(cgroup.procs_path, os.W_OK):
+            return None
+        return cgroup
+
+    def _write(self, name, value):
+        try:
+            (self.path / name).write_text(value)
+        except OSError as e:
+            log(f"Cannot write {self.path / name}: {e}")
+            return False
+        return True
+
+    def pids(self):
+        try:
+            return [int(pid) for pid in self.procs_path.read_text().split()]
+        except (OSError, ValueError):
+            return []
+
+    def _read(self, name):
+        try:
+            return (self.path / name).read_text()
+        except OSError:
+            return None
+
+    def _read_keyed(self, name):
+        """Parse a flat-keyed file such as cgroup.events into a dict of ints."""
+        values = {}
+        for line in (self._read(name) or "").splitlines():
+            key, _, value = line.partition(" ")
+            if value.strip().isdigit():
+                values[key] = int(value)
+        return values
+
+    def _read_limit(self, name):
+        """An integer from a single-value file; None if unset ("max") or unreadable."""
+        text = self._read(name)
+        if text is None or not text.split() or not text.split()[0].isdigit():
+            return None
+        return int(text.split()[0])
+
+    def events(self):
+        """Parse cgroup.events into a dict of ints."""
+        return self._read_keyed("cgroup.events")
+
+    def enable_controllers(self, controllers):
+        """Enable ``controllers`` for this cgroup; return those it now has.
+
+        Controllers are enabled in the parent's cgroup.subtree_control.  The
+        kernel refuses that while the parent holds processes itself, as the
+        wrapper's own cgroup does, so they must already be on there or the
+        parent must be a delegated cgroup without processes.
+        """
+        subtree_control = self.path.parent / "cgroup.subtree_control"
+        for controller in controllers:
+            try:
+                subtree_control.write_text(f"+{controller}")
+            except OSError:
+                pass
+        return set((self._read("cgroup.controllers") or "").split())
+
+    def apply_limits(self, limits):
+        """Write ``limits`` (file name -> value); return {file name: error} for those not set."""
+        available = self.enable_controllers(sorted({CGROUP_LIMIT_CONTROLLERS[name] for name in limits}))
+        errors = {}
+        for name, value in limits.items():
+            controller = CGROUP_LIMIT_CONTROLLERS[name]
+            if controller not in available:
+                errors[name] = f"{controller} controller is not available under {self.path.parent}"
+                continue
+            try:
+                (self.path / name).write_text(value)
+            except OSError as e:
+                errors[name] = str(e)
+        return errors
+
+    def cpu_usage_usec(self):
+        """CPU time used by the cgroup's processes so far, from cpu.stat."""
+        return self._read_keyed("cpu.stat").get("usage_usec")
+
+    def memory_events(self):
+        """memory.events counters; empty without the memory controller."""
+        return self._read_keyed("memory.events")
+
+    def pressure(self, resource):
+        """Parse ``<resource>.pressure`` into {"some"/"full": {"avg10": ..}}; None if absent."""
+        text = self._read(f"{resource}.pressure")
+        if text is None:
+            return None
+        pressure = {}
+        for line in text.splitlines():
+            kind, _, fields = line.partition(" ")
+            averages = {}
+            for field in fields.split():
+                key, _, value = field.partition("=")
+                if key.startswith("avg"):
+                    try:
+                        averages[key] = float(value)
+                    except ValueError:
+                        pass
+            if averages:
+                pressure[kind] = averages
+        return pressure
+
+    def usage(self):
+        """Current memory use, limits and pressure, read from the interface files."""
+        cpu_max = (self._read("cpu.max") or "").split()
+        cpu_max_cores = None
+        if len(cpu_max) == 2 and cpu_max[0].isdigit() and cpu_max[1].isdigit() and int(cpu_max[1]):
+            cpu_max_cores = round(int(cpu_max[0]) / int(cpu_max[1]), 2)
+        memory_events = self.memory_events()
+        return {
+            "memory_current": self._read_limit("memory.current"),
+            "memory_peak": self._read_limit("memory.peak"),
+            "memory_max": self._read_limit("memory.max"),
+            "cpu_max": cpu_max_cores,
+            "memory_events": {key: memory_events.get(key, 0) for key in MEMORY_EVENT_KEYS},
+            "pressure": {resource: self.pressure(resource) for resource in PRESSURE_RESOURCES},
+        }
+
+    def freeze(self):
+        return self._write("cgroup.freeze", "1")
+
+    def thaw(self):
+        return self._write("cgroup.freeze", "0")
+
+    def signal_all(self, sig):
+        """Send ``sig`` to every process in the cgroup."""
+        for pid in self.pids():
+            try:
+                os.kill(pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+    def kill(self):
+        """SIGKILL the whole tree at once via cgroup.kill (Linux 5.14+).
+
+        Falls back to signalling each member on older kernels.
+        """
+        if not (self.path / "cgroup.kill").exists() or not self._write("cgroup.kill", "1"):
+            self.signal_all(signal.SIGKILL)
+
+    def is_populated(self):
+        events = self.events()
+        if "populated" in events:
+            return events["populated"] == 1
+        return bool(self.pids())
+
+    def wait_for_event(self, key, value, timeout):
+        """Wait until cgroup.events has ``key`` == ``value``; False on timeout.
+
+        The kernel signals POLLPRI on cgroup.events when it changes, so this
+        sleeps until the change instead of polling; a regular file (as in
+        test hierarchies) is re-read every 10ms.
+        """
+        deadline = time.time() + timeout
+        try:
+            fd = os.open(self.path / "cgroup.events", os.O_RDONLY)
+        except OSError:
+            return False
+        try:
+            regular_file = stat.S_ISREG(os.fstat(fd).st_mode)
+            poller = select.poll()
+            poller.register(fd, select.POLLPRI | select.POLLERR)
+            while True:
+                if self.events().get(key) == value:
+                    return True
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                if regular_file:
+                    time.sleep(min(remaining, 0.01))
+                else:
+                    # Bounded so a missed notification only costs 100ms
+                    poller.poll(min(remaining, 0.1) * 1000)
+        finally:
+            os.close(fd)
+
+    def remove(self):
+        """Remove the cgroup once it is empty; leftovers are reused next start."""
+        try:
+            self.path.rmdir()
+        except OSError:
+            pass
+
+
+class BackendResourceMonitor:
+    """Samples a backend cgroup's CPU use and logs its memory pressure.
+
+    check() runs on the app's idle-check cadence.  It measures the CPU usage
+    rate over the time since the previous check and logs memory.events
+    counters that grew and each memory pressure episode, with the memory
+    use at the time, so limits can be sized from the log.
+    """
+
+    def __init__(self, cgroup, log=log, clock=time.monotonic):
+        self.cgroup = cgroup
+        self.log = log
+        self.clock = clock
+        self.cpu_sample = None  # (clock, usage_usec) at the previous check
+        self.cpu_percent = None  # Share of one core used since then
+        self.memory_events = cgroup.memory_events()
+        self.under_pressure = False
+
+    def _memory_summary(self):
+        usage = self.cgroup.usage()
+        current, limit = usage["memory_current"], usage["memory_max"]
+        if current is None:
+            return "memory use unknown"
+        summary = f"{current / 1048576:.0f} MiB used"
+        if limit is not None:
+            summary += f" of {limit / 1048576:.0f} MiB"
+        return summary
+
+    def check(self):
+        now = self.clock()
+        used = self.cgroup.cpu_usage_usec()
+        if used is not None and self.cpu_sample is not None and now > self.cpu_sample[0]:
+            elapsed = now - self.cpu_sample[0]
+            self.cpu_percent = round((used - self.cpu_sample[1]) / 1e6 / elapsed * 100, 1)
+        self.cpu_sample = None if used is None else (now, used)
+
+        events = self.cgroup.memory_events()
+        grown = [
+            f"{key} +{events[key] - self.memory_events.get(key, 0)}"
+            for key in MEMORY_EVENT_KEYS if events.get(key, 0) > self.memory_events.get(key, 0)
+        ]
+        self.memory_events = events
+        if grown:
+            self.log(f"Backend memory events: {', '.join(grown)} ({self._memory_summary()})")
+
+        some = ((self.cgroup.pressure("memory") or {}).get("some") or {}).get("avg10")
+        if some is None:
+            return
+        if not self.under_pressure and some >= MEMORY_PRESSURE_LOG_PERCENT:
+            self.under_pressure = True
+            self.log(f"Backend under memory pressure: some avg10={some:.1f}% ({self._memory_summary()})")
+        elif self.under_pressure and some < MEMORY_PRESSURE_LOG_PERCENT / 2:
+            self.under_pressure = False
+            self.log(f"Backend memory pressure eased: some avg10={some:.1f}% ({self._memory_summary()})")
+
+    def usage(self):
+        """The cgroup's current readings plus the last measured CPU rate."""
+        usage = self.cgroup.usage()
+        usage["cpu_percent"] = self.cpu_percent
+        return usage
+
+
+def accept_queue_length(sock):
+    """Connections waiting in a listening socket's accept queue, or None.
+
+    For listeners, Linux reports the queue length in tcp_info.tcpi_unacked.
+    """
+    tcp_info = getattr(socket, "TCP_INFO", None)
+    if tcp_info is None:
+        return None
+    try:
+        info = sock.getsockopt(socket.IPPROTO_TCP, tcp_info, 104)
+    except OSError:
+        return None
+    return int.from_bytes(info[24:28], sys.byteorder)
+
+
+class AcceptReadinessProbe(ReadinessProbe):
+    """A socket-activated app has called accept() on its inherited listener.
+
+    Connecting always succeeds (the kernel queues the connection), so the
+    probe queues one connection of its own and watches the accept queue:
+    the app is accepting once the queue shrinks or drains.
+    """
+
+    def __init__(self, spec, app=None):
+        super().__init__(spec, app)
+        self._client = None
+        self._queued = None
+        self._accepted = False
+
+    def check(self):
+        if self._accepted:
+            return True
+        listener = self.app.container_listen_socket
+        if listener is None:
+            return False
+        if self._client is None:
+            try:
+                self._client = socket.create_connection(listener.getsockname(), timeout=1)
+            except OSError:
+                return False
+        queued = accept_queue_length(listener)
+        if queued is None:
+            # No way to observe accept(); the backlog holds requests anyway
+            self._accepted = True
+        elif queued == 0 or (self._queued is not None and queued < self._queued):
+            self._accepted = True
+        self._queued = queued
+        if self._accepted:
+            self._client.close()
+            self._client = None
+        return self._accepted
+
+
+_READY_PROBE_CLASSES = {
+    "accept": AcceptReadinessProbe,
+    "tcp": TcpReadinessProbe,
+    "http": HttpReadinessProbe,
+    "output": OutputReadinessProbe,
+    "unix_socket": UnixSocketReadinessProbe,
+}
+
+
+def create_ready_probes(specs, app):
+    return [_READY_PROBE_CLASSES[spec["type"]](spec, app) for spec in specs]
+
+
+class ReadinessBackoff:
+    """Exponential backoff with jitter between readiness probe rounds."""
+
+    def __init__(self, initial=0.05, maximum=1.0, factor=2.0):
+        self.maximum = maximum
+        self.factor = factor
+        self._delay = initial
+
+    def next_delay(self):
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.maximum)
+        return random.uniform(delay / 2, delay)
+
+
+# How long probes keep running after the launch process exits (some apps
+# like rserver fork and the parent exits immediately)
+PROCESS_EXIT_READY_GRACE = 10
+
+# How long a proxied request arriving during startup waits for readiness
+# before it gets the 503 loading response
+REQUEST_READY_WAIT_SECONDS = 5
+
+# Request body bytes a response may leave unread and still keep the
+# connection open; larger leftovers close it instead of being read
+KEEPALIVE_DRAIN_LIMIT = 65536
+
+# Longest chunk-size or trailer line, and most trailer lines, accepted in a
+# chunked request body
+CHUNK_LINE_LIMIT = 4096
+CHUNK_TRAILER_LIMIT = 100
+
+_HEX_DIGITS = frozenset(b"0123456789abcdefABCDEF")
+_TOKEN_CHARS = frozenset(
+    b"!#$%&'*+-.^_`|~0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"
+)
+
+
+class RequestFramingError(ValueError):
+    """The client's request body framing is malformed or unsupported."""
+
+
+def is_chunked_transfer_encoding(value):
+    """Whether a request Transfer-Encoding header means a chunked body.
+
+    Raises RequestFramingError for codings the wrapper cannot frame:
+    chunked must be the final coding, and nothing else is decoded.
+    """
+    codings = [coding.strip().lower() for coding in value.split(",") if coding.strip()]
+    if codings != ["chunked"]:
+        raise RequestFramingError(f"Unsupported Transfer-Encoding: {value}")
+    return True
+
+
+def parse_chunk_size_line(line):
+    """Return the size from a chunk-size line (extensions are ignored)."""
+    if len(line) > CHUNK_LINE_LIMIT or not line.endswith(b"\r\n"):
+        raise RequestFramingError("Chunk size line is too long or not CRLF-terminated")
+    size = line[:-2].split(b";", 1)[0].rstrip(b" \t")
+    if not size or len(size) > 16 or not _HEX_DIGITS.issuperset(size):
+        raise RequestFramingError(f"Invalid chunk size: {size[:32]!r}")
+    return int(size, 16)
+
+
+def is_last_trailer_line(line):
+    """Check one line of a chunked body's trailer; True for the closing blank line."""
+    if len(line) > CHUNK_LINE_LIMIT or not line.endswith(b"\r\n"):
+        raise RequestFramingError("Trailer line is too long or not CRLF-terminated")
+    if line == b"\r\n":
+        return True
+    name, colon, _value = line.partition(b":")
+    if not colon or not name or not _TOKEN_CHARS.issuperset(name):
+        raise RequestFramingError(f"Invalid trailer field: {line[:64]!r}")
+    return False
+
+
+# File names downloaded in the bulk lane from the first request on
+BULK_PATH_SUFFIXES = (
+    ".zip", ".tar", ".tgz", ".gz", ".bz2", ".xz", ".zst", ".7z",
+    ".nii", ".mgz", ".dcm", ".sif", ".img", ".mp4", ".webm",
+)
+
+# Binary media types whose bodies are bulk unless known to be small
+BULK_MEDIA_TYPES = frozenset((
+    "application/octet-stream", "application/zip", "application/x-zip-compressed",
+    "application/gzip", "application/x-gzip", "application/x-tar",
+    "application/x-bzip2", "application/x-xz", "application/zstd",
+    "application/x-7z-compressed",
+))
+BULK_MEDIA_PREFIXES = ("video/", "audio/")
+BULK_BINARY_MIN_BYTES = 65536
+
+# Interactive traffic within this many seconds makes bulk bodies paced
+INTERACTIVE_PRESSURE_SECONDS = 1.0
+
+# Paths remembered as answering with bulk bodies, per app
+BULK_PATH_MEMORY = 256
+
+# How long a request queues for a lane slot before it gets a 503
+LANE_WAIT_SECONDS = 30
+
+
+def _parse_length(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def classify_request_lane(method, path, headers, bulk_threshold):
+    """Lane for a request before the backend has answered.
+
+    Uploads of ``bulk_threshold`` bytes or more, chunked uploads of unknown
+    size, and downloads of archive and image-volume file names are "bulk";
+    everything else, HTML, JSON and XHR traffic included, is "interactive".
+    """
+    content_length = _parse_length(headers.get("Content-Length"))
+    if content_length is not None and content_length >= bulk_threshold:
+        return "bulk"
+    if headers.get("Transfer-Encoding"):
+        return "bulk"
+    if method in ("GET", "HEAD") and path.lower().endswith(BULK_PATH_SUFFIXES):
+        return "bulk"
+    return "interactive"
+
+
+def classify_response_lane(headers, bulk_threshold):
+    """Lane a backend response belongs in, from its headers.
+
+    Attachments and binary media types are bulk unless their length is
+    known to be small, and any body of ``bulk_threshold`` bytes or more is
+    bulk.  Text, JSON, JavaScript and XML are interactive whatever their
+    size: the page needs them to render.
+    """
+    content_length = _parse_length(headers.get("content-length"))
+    possibly_large = content_length is None or content_length >= BULK_BINARY_MIN_BYTES
+    if "attachment" in headers.get("content-disposition", "").lower() and possibly_large:
+        return "bulk"
+    media_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+    if media_type.startswith("text/") or any(
+        kind in media_type for kind in ("json", "javascript", "xml")
+    ):
+        return "interactive"
+    if content_length is not None and content_length >= bulk_threshold:
+        return "bulk"
+    if (media_type in BULK_MEDIA_TYPES or media_type.startswith(BULK_MEDIA_PREFIXES)) and possibly_large:
+        return "bulk"
+    return "interactive"
+
+
+class ProxyLane:
+    """Concurrency budget for one class of proxied requests.
+
+    Requests over the limit queue in arrival order, and a released slot is
+    handed straight to the oldest waiter so later requests cannot overtake
+    it.  Waiters are callables run once they hold a slot, which lets
+    threads and event loops wait on the same lane.
+    """
+
+    def __init__(self, name, limit):
+        self.name = name
+        self.limit = limit
+        self.active = 0
+        self.requests = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, wake):
+        """Take a slot (True), or queue ``wake`` to be called with one later."""
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                self.requests += 1
+                return True
+            self._waiters.append(wake)
+            return False
+
+    def cancel(self, wake):
+        """Withdraw a queued waiter; False if it has already been given a slot."""
+        with self._lock:
+            try:
+                self._waiters.remove(wake)
+            except ValueError:
+                return False
+            return True
+
+    def acquire(self, timeout=LANE_WAIT_SECONDS):
+        """Block the calling thread until it holds a slot; False on timeout."""
+        granted = threading.Event()
+        if self.try_acquire(granted.set) or granted.wait(timeout):
+            return True
+        # Handed a slot between the timeout and the cancel: keep it
+        return not self.cancel(granted.set)
+
+    async def acquire_async(self, timeout=LANE_WAIT_SECONDS):
+        """Wait on the running event loop until the caller holds a slot; False on timeout."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            if not granted.done():
+                granted.set_result(None)
+
+        def wake():
+            try:
+                loop.call_soon_threadsafe(grant)
+            except RuntimeError:  # Loop closed; pass the slot on
+                self.release()
+
+        if self.try_acquire(wake):
+            return True
+        try:
+            await asyncio.wait_for(granted, timeout)
+        except asyncio.TimeoutError:
+            return not self.cancel(wake)
+        except asyncio.CancelledError:
+            if not self.cancel(wake):
+                self.release()
+            raise
+        return True
+
+    def add(self):
+        """Count a request that is already running, even beyond the limit."""
+        with self._lock:
+            self.active += 1
+            self.requests += 1
+
+    def release(self):
+        with self._lock:
+            wake = None
+            if self._waiters and self.active <= self.limit:
+                wake = self._waiters.popleft()
+                self.requests += 1
+            else:
+                self.active -= 1
+        if wake is not None:
+            wake()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": len(self._waiters),
+                "limit": self.limit,
+                "requests": self.requests,
+            }
+
+
+class TokenBucket:
+    """Byte budget refilled at ``rate`` bytes per second, up to ``burst``.
+
+    reserve() always takes the bytes and returns how long the caller must
+    wait before sending them, so threads can sleep and coroutines await.
+    """
+
+    def __init__(self, rate, burst, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = burst
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class ProxyLanes:
+    """Interactive and bulk lanes for one app's proxied requests.
+
+    Each lane has its own connection budget and backend pool.  Requests are
+    classified on arrival; a response that turns out to be bulk moves to
+    the bulk lane, and its path is remembered so the next request for it
+    starts there.  Bulk bodies streamed to the browser are paced by a token
+    bucket while interactive requests are about, so page loads and XHRs
+    are not stuck behind a download.
+    """
+
+    def __init__(self, bulk_limit, bulk_threshold, bulk_rate,
+                 interactive_limit=BACKEND_POOL_CONNECTIONS, clock=time.monotonic):
+        self.interactive = ProxyLane("interactive", interactive_limit)
+        self.bulk = ProxyLane("bulk", bulk_limit)
+        self.bulk_threshold = bulk_threshold
+        self.bucket = None
+        if bulk_rate > 0:
+            self.bucket = TokenBucket(bulk_rate, max(bulk_rate // 4, STREAM_CHUNK_SIZE), clock)
+        self.clock = clock
+        self.bulk_paths = OrderedDict()
+        self.last_interactive = None
+        self.paced_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def _note(self, lane):
+        if lane is self.interactive:
+            self.last_interactive = self.clock()
+
+    def classify(self, method, path, headers):
+        """Pick the lane a new request waits in."""
+        with self._lock:
+            learned = path in self.bulk_paths
+            if learned:
+                self.bulk_paths.move_to_end(path)
+        if learned or classify_request_lane(method, path, headers, self.bulk_threshold) == "bulk":
+            return self.bulk
+        self._note(self.interactive)
+        return self.interactive
+
+    def settle(self, lane, path, response_headers):
+        """Move a request whose response is bulk into the bulk lane.
+
+        ``lane`` must be held by the caller; returns the lane now held.
+        """
+        if lane is self.bulk or classify_response_lane(response_headers, self.bulk_threshold) != "bulk":
+            return lane
+        with self._lock:
+            self.bulk_paths[path] = True
+            self.bulk_paths.move_to_end(path)
+            while len(self.bulk_paths) > BULK_PATH_MEMORY:
+                self.bulk_paths.popitem(last=False)
+        self.release(lane)
+        # Already connected: counts against the bulk budget without waiting
+        self.bulk.add()
+        return self.bulk
+
+    def release(self, lane):
+        self._note(lane)
+        lane.release()
+
+    def pace(self, size):
+        """Seconds to wait before sending ``size`` more bytes of a bulk body."""
+        if self.bucket is None:
+            return 0.0
+        under_pressure = self.interactive.stats()["queued"] > 0 or (
+            self.last_interactive is not None
+            and self.clock() - self.last_interactive < INTERACTIVE_PRESSURE_SECONDS
+        )
+        if not under_pressure:
+            # Keep the bucket's clock current so no stale burst builds up
+            self.bucket.reserve(0)
+            return 0.0
+        delay = self.bucket.reserve(size)
+        if delay:
+            with self._lock:
+                self.paced_seconds += delay
+        return delay
+
+    def stats(self):
+        bulk = self.bulk.stats()
+        bulk["paced_seconds"] = round(self.paced_seconds, 1)
+        return {"interactive": self.interactive.stats(), "bulk": bulk}
+
+
+def pool_connection_counts(client):
+    """Return ``(active, idle)`` connection counts of an httpx client's pool."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    if pool is None:
+        return 0, 0
+    connections = list(pool.connections)
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return len(connections) - idle, idle
+
+
+# Prometheus metrics: name -> (type, help); histograms also have buckets
+METRICS_PREFIX = "neurodesk_webapp_"
+METRIC_DEFINITIONS = {
+    "backend_ready": ("gauge", "Whether the backend is ready to serve requests."),
+    "requests_in_flight": ("gauge", "Client requests being handled."),
+    "request_duration_seconds": (
+        "histogram", "Time to serve a client request, by how it was served."
+    ),
+    "upstream_ttfb_seconds": (
+        "histogram", "Time from sending a request to the backend to its response headers."
+    ),
+    "request_body_bytes_total": ("counter", "Request body bytes streamed from clients."),
+    "response_body_bytes_total": ("counter", "Response body bytes sent to clients."),
+    "tunnels_open": ("gauge", "Open upgrade tunnels such as WebSockets."),
+    "tunnel_bytes_total": ("counter", "Bytes carried by upgrade tunnels, by direction."),
+    "backend_pool_connections": (
+        "gauge", "Backend connections in the process-wide pools, by pool and state."
+    ),
+    "lane_requests": ("gauge", "Proxied requests per lane, holding a slot or queued."),
+    "backend_starts_total": ("counter", "Backend launches."),
+    "prestarts_total": (
+        "counter", "Backends started from launcher hints, and whether they were then opened (hit) or not (miss)."
+    ),
+    "cold_start_seconds": ("histogram", "Time from launching the backend to it being ready."),
+    "idle_stops_total": ("counter", "Backends stopped after being idle."),
+    "idle_freezes_total": ("counter", "Backends frozen after being idle."),
+    "rewrite_cpu_seconds_total": ("counter", "CPU time spent rewriting text responses."),
+    "compression_input_bytes_total": (
+        "counter", "Uncompressed backend body bytes compressed on the fly without rewriting."
+    ),
+    "compression_output_bytes_total": ("counter", "Bytes those bodies were compressed to."),
+    "compression_skipped_total": (
+        "counter", "Responses sent uncompressed because the wrapper was over its CPU budget."
+    ),
+    "log_records_dropped_total": (
+        "counter", "Log and access records the wrapper process dropped because its writer fell behind."
+    ),
+}
+HISTOGRAM_BUCKETS = {
+    "request_duration_seconds": (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    "upstream_ttfb_seconds": (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+    "cold_start_seconds": (0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300),
+}
+
+
+def _merge_metric_values(totals, values):
+    for key, value in values.items():
+        if isinstance(value, list):
+            total = totals.get(key)
+            if total is None:
+                totals[key] = list(value)
+            else:
+                for index, count in enumerate(value):
+                    total[index] += count
+        else:
+            totals[key] = totals.get(key, 0) + value
+
+
+class WrapperMetrics:
+    """Counters and histograms for one app, in Prometheus text format.
+
+    Each thread records into a shard only it writes to, so the proxy path
+    takes no lock; a scrape adds the shards up.  Shards of threads that have
+    exited are folded into one total so per-connection threads do not pile
+    up.  Values are keyed by metric name and an optional rendered label
+    such as ``kind="proxied"``.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._shards = []  # (thread, shard) pairs
+        self._retired = {}
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append((threading.current_thread(), shard))
+            return shard
+
+    def add(self, name, value=1, label=None):
+        """Add to a counter (or move a gauge kept as a running sum)."""
+        shard = self._shard()
+        key = (name, label)
+        shard[key] = shard.get(key, 0) + value
+
+    def observe(self, name, value, label=None):
+        """Record one histogram observation."""
+        shard = self._shard()
+        key = (name, label)
+        buckets = HISTOGRAM_BUCKETS[name]
+        counts = shard.get(key)
+        if counts is None:
+            # One count per bucket, then the overflow count, then the sum
+            counts = shard[key] = [0] * (len(buckets) + 2)
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+    def snapshot(self):
+        """Return every shard added up, keyed like the shards."""
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive():
+                    live.append((thread, shard))
+                else:
+                    _merge_metric_values(self._retired, shard)
+            self._shards = live
+            totals = {}
+            _merge_metric_values(totals, self._retired)
+            for _thread, shard in live:
+                _merge_metric_values(totals, shard.copy())
+        return totals
+
+    def render(self, app_name, gauges):
+        """Render the recorded values plus ``gauges`` ({(name, label): value})."""
+        values = self.snapshot()
+        values.update(gauges)
+        by_name = {}
+        for (name, label), value in values.items():
+            by_name.setdefault(name, []).append((label or "", value))
+
+        app_label = f'app="{app_name}"'
+        lines = []
+        for name, (kind, help_text) in METRIC_DEFINITIONS.items():
+            full_name = METRICS_PREFIX + name
+            lines.append(f"# HELP {full_name} {help_text}")
+            lines.append(f"# TYPE {full_name} {kind}")
+            samples = sorted(by_name.get(name, []), key=lambda sample: sample[0])
+            if not samples and kind != "histogram":
+                samples = [("", 0)]
+            for label, value in samples:
+                labels = f"{app_label},{label}" if label else app_label
+                if kind != "histogram":
+                    lines.append(f"{full_name}{{{labels}}} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(HISTOGRAM_BUCKETS[name], value):
+                    cumulative += count
+                    lines.append(f'{full_name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                cumulative += value[-2]
+                lines.append(f'{full_name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                lines.append(f"{full_name}_sum{{{labels}}} {value[-1]}")
+                lines.append(f"{full_name}_count{{{labels}}} {cumulative}")
+        return ("\n".join(lines) + "\n").encode()
+
+
+# Profile windows: default and longest ?seconds=, and the CPU sampling interval
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 60
+PROFILE_SAMPLE_INTERVAL = 0.01
+# Lines in a memory profile, and traceback frames tracemalloc groups by
+MEMORY_PROFILE_TOP = 30
+MEMORY_PROFILE_FRAMES = 1
+
+
+def peer_uid(sock):
+    """User id of the process at the other end of a Unix socket, or None."""
+    peercred = getattr(socket, "SO_PEERCRED", None)
+    if peercred is None:
+        return None
+    try:
+        creds = sock.getsockopt(socket.SOL_SOCKET, peercred, struct.calcsize("3i"))
+    except (AttributeError, OSError):
+        return None
+    return struct.unpack("3i", creds)[1]
+
+
+class WrapperProfiler:
+    """On-demand CPU and memory profiles of the whole wrapper process.
+
+    Nothing runs between profiles.  A CPU profile samples every thread's
+    stack with sys._current_frames() and returns them as collapsed stacks
+    (``thread;outer;...;inner count`` per line) for flamegraph tools.  A
+    memory profile traces allocations with tracemalloc for the window only
+    and returns the lines whose live allocations grew most.  One profile
+    runs at a time.
+    """
+
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.lock = threading.Lock()
+
+    def run(self, kind, seconds):
+        """Profile for ``seconds``; the text result, or None if one is already running."""
+        if not self.lock.acquire(blocking=False):
+            return None
+        try:
+            if kind == "memory":
+                return self.allocation_diff(seconds)
+            return self.sample_stacks(seconds)
+        finally:
+            self.lock.release()
+
+    @staticmethod
+    def _frame_name(frame):
+        code = frame.f_code
+        return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+    def sample_stacks(self, seconds):
+        sampler = threading.get_ident()
+        thread_names = {}
+        counts = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == sampler:
+                    continue
+                if ident not in thread_names:
+                    thread_names.update((thread.ident, thread.name) for thread in threading.enumerate())
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame))
+                    frame = frame.f_back
+                stack.append(thread_names.get(ident, f"thread-{ident}"))
+                # ";" separates frames in the collapsed format
+                key = ";".join(name.replace(";", ":") for name in reversed(stack))
+                counts[key] = counts.get(key, 0) + 1
+            time.sleep(self.interval)
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(counts.items()))
+
+    def allocation_diff(self, seconds):
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(MEMORY_PROFILE_FRAMES)
+        try:
+            before = tracemalloc.take_snapshot()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot()
+        finally:
+            if started:
+                tracemalloc.stop()
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        stats = after.filter_traces(own).compare_to(before.filter_traces(own), "lineno")
+        lines = [f"# Top {MEMORY_PROFILE_TOP} allocation changes over {seconds}s (tracemalloc)"]
+        lines.extend(str(stat) for stat in stats[:MEMORY_PROFILE_TOP])
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every app: a profile covers the whole process
+_wrapper_profiler = WrapperProfiler()
+
+
+# Container output kept in memory: the newest lines, up to a line count and
+# a byte total, each line cut to a maximum length
+OUTPUT_RING_LINES = 2000
+OUTPUT_RING_BYTES = 256 * 1024
+OUTPUT_LINE_MAX_CHARS = 4096
+
+# Lines of output quoted in the error when the backend exits during startup
+ERROR_OUTPUT_LINES = 40
+
+# Lines the logs endpoint sends before following, unless ?lines= says otherwise
+LOGS_TAIL_LINES = 100
+
+
+class OutputRing:
+    """The newest container output lines, bounded by count and size.
+
+    Every appended line gets the next sequence number, so a reader that
+    remembers where it stopped can ask for what came after with since()
+    and learn how many lines were evicted before it got to them.
+    """
+
+    def __init__(self, max_lines=OUTPUT_RING_LINES, max_bytes=OUTPUT_RING_BYTES):
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self._lines = deque()
+        self._bytes = 0
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def append(self, line):
+        if len(line) > OUTPUT_LINE_MAX_CHARS:
+            line = line[:OUTPUT_LINE_MAX_CHARS] + " [truncated]"
+        size = len(line.encode("utf-8", "replace")) + 1
+        with self._lock:
+            self._lines.append((line, size))
+            self._bytes += size
+            self._next_seq += 1
+            while len(self._lines) > self.max_lines or (
+                self._bytes > self.max_bytes and len(self._lines) > 1
+            ):
+                _line, evicted = self._lines.popleft()
+                self._bytes -= evicted
+
+    def since(self, seq):
+        """Return (lines after ``seq``, the seq to ask for next, lines missed)."""
+        with self._lock:
+            first = self._next_seq - len(self._lines)
+            missed = max(0, first - seq)
+            start = max(seq, first) - first
+            lines = [line for line, _size in list(self._lines)[start:]]
+            return lines, self._next_seq, missed
+
+    def tail(self, count):
+        """Return the last ``count`` lines."""
+        with self._lock:
+            if count <= 0:
+                return []
+            return [line for line, _size in list(self._lines)[-count:]]
+
+    @property
+    def next_seq(self):
+        return self._next_seq
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self.tail(len(self._lines)))
+
+    def __contains__(self, line):
+        return line in self.tail(len(self._lines))
+
+
+# Reasons the launcher gives for a prestart, as logged
+PRESTART_REASONS = ("hover", "focus", "warm", "hint")
+
+# Status event streams send a comment this often so proxies keep them open
+STATUS_STREAM_KEEPALIVE_SECONDS = 15
+
+# Most container output lines sent in one ``output`` event
+STATUS_STREAM_OUTPUT_LINES = 20
+
+
+class StatusEventStream:
+    """Server-Sent Events for one splash page watching the backend start.
+
+    Each poll() returns the SSE frames describing what changed since the
+    last call: ``starting`` once, ``output`` with new container lines, then
+    ``ready`` or ``error``, after which the stream is finished.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.finished = False
+        self._started = False
+        self._output = None
+        self._output_sent = 0
+
+    @staticmethod
+    def format_event(event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+    def poll(self):
+        app = self.app
+        frames = []
+        started = app.startup_start_time
+        elapsed = round(time.time() - started, 1) if started else 0
+        if not self._started:
+            self._started = True
+            frames.append(b"retry: 2000\n\n")
+            frames.append(self.format_event("starting", {"elapsed_seconds": elapsed}))
+
+        output = app.container_output
+        if output is not self._output:
+            # The backend restarted with a fresh output ring
+            self._output = output
+            self._output_sent = 0
+        lines, self._output_sent, _missed = output.since(self._output_sent)
+        if lines:
+            frames.append(self.format_event(
+                "output", {"lines": lines[-STATUS_STREAM_OUTPUT_LINES:]}
+            ))
+
+        if app.container_ready:
+            frames.append(self.format_event("ready", {"elapsed_seconds": elapsed}))
+            self.finished = True
+        elif app.container_error:
+            frames.append(self.format_event("error", {"error": app.container_error}))
+            self.finished = True
+        elif app.shutdown_event.is_set():
+            self.finished = True
+        return frames
+
+
+class OutputTailStream:
+    """Server-Sent Events following the container output, like ``tail -f``.
+
+    The first poll() sends the last ``lines`` lines, later ones whatever
+    was printed since, as ``output`` events whose ``missed`` field counts
+    lines that were evicted from the ring before they could be sent.  A
+    backend restart sends ``restart`` and carries on with the new output.
+    The stream lasts until the client goes away or the wrapper shuts down.
+    """
+
+    def __init__(self, app, lines=LOGS_TAIL_LINES):
+        self.app = app
+        self.lines = lines
+        self.finished = False
+        self._output = None
+        self._output_sent = 0
+
+    def poll(self):
+        frames = []
+        output = self.app.container_output
+        if self._output is None:
+            frames.append(b"retry: 2000\n\n")
+            self._output_sent = max(0, output.next_seq - self.lines)
+        elif output is not self._output:
+            frames.append(StatusEventStream.format_event("restart", {}))
+            self._output_sent = 0
+        self._output = output
+
+        lines, self._output_sent, missed = output.since(self._output_sent)
+        if lines or missed:
+            frames.append(StatusEventStream.format_event(
+                "output", {"lines": lines, "missed": missed}
+            ))
+        if self.app.shutdown_event.is_set():
+            self.finished = True
+        return frames
+
+
+def build_path_rewrite_map(path_rewrites, base_path):
+    """Build byte rewrite pairs for backend paths embedded in text responses."""
+    rewrite_map = []
+    base_bytes = base_path.encode('utf-8')
+
+    for rewrite in path_rewrites or []:
+        if isinstance(rewrite, str):
+            if rewrite:
+                rewrite_map.append((rewrite.encode('utf-8'), base_bytes))
+            continue
+
+        if not isinstance(rewrite, dict):
+            continue
+
+        source = rewrite.get("from")
+        target = rewrite.get("to", "${base_path}")
+        if not isinstance(source, str) or not source:
+            continue
+        if not isinstance(target, str):
+            continue
+
+        target = target.replace("${base_path}", base_path)
+        target = target.replace("$base_path", base_path)
+        rewrite_map.append((source.encode('utf-8'), target.encode('utf-8')))
+
+    return rewrite_map
+
+
+class PathRewriter:
+    """Multi-pattern path rewriter built once per rewrite map.
+
+    Matching is leftmost-longest and never rewrites replacement text again.
+    Each pattern is located with ``bytes.find`` (a C substring search) and
+    its next occurrence is cached, so a scan costs one pass per pattern plus
+    a few Python operations per match.  See RewriteStream for chunked bodies.
+    """
+
+    def __init__(self, rewrite_map):
+        rewrite_map = sorted(rewrite_map, key=lambda item: len(item[0]), reverse=True)
+        self.replacements = {old: new for old, new in rewrite_map}
+        # Longest first, so the first pattern found at a position wins ties
+        self.patterns = list(dict.fromkeys(old for old, _ in rewrite_map))
+        self.max_pattern_len = max((len(old) for old in self.patterns), default=0)
+
+    def scan(self, data, start, stop, segments):
+        """Rewrite matches that start in ``data[start:stop]``.
+
+        Appends the literal slices (as memoryviews) and replacements up to
+        the end of the last match to ``segments`` and returns that offset.
+        Matches may extend past ``stop``.
+        """
+        view = memoryview(data)
+        replacements = self.replacements
+        patterns = self.patterns
+        find = data.find
+        next_at = [find(pattern, start) for pattern in patterns]
+        pos = start
+        while True:
+            best = -1
+            best_pattern = None
+            for index, pattern in enumerate(patterns):
+                at = next_at[index]
+                if 0 <= at < pos:
+                    at = next_at[index] = find(pattern, pos)
+                if at == -1 or at >= stop:
+                    continue
+                if best_pattern is None or at < best:
+                    best = at
+                    best_pattern = pattern
+            if best_pattern is None:
+                return pos
+            if best > pos:
+                segments.append(view[pos:best])
+            segments.append(replacements[best_pattern])
+            pos = best + len(best_pattern)
+
+    def rewrite(self, data):
+        """Rewrite a complete buffer."""
+        if not self.patterns:
+            return data
+        segments = []
+        end = self.scan(data, 0, len(data), segments)
+        segments.append(memoryview(data)[end:])
+        return b"".join(segments)
+
+    def stream(self):
+        return RewriteStream(self)
+
+
+class RewriteStream:
+    """Incremental rewriting of one body with match state kept across chunks.
+
+    Only the undecided tail of each chunk is carried over: the bytes from
+    which some pattern could still match once more data arrives, at most
+    ``max_pattern_len - 1`` of them.  Everything before that is emitted as
+    memoryview slices of the original chunk plus replacement bytes, so a
+    chunk is never concatenated with its predecessor or copied whole.
+    """
+
+    def __init__(self, rewriter):
+        self.rewriter = rewriter
+        self._hold = max(rewriter.max_pattern_len - 1, 0)
+        self._carry = b""
+
+    def feed(self, chunk):
+        """Consume one chunk; return the list of output segments now final."""
+        rewriter = self.rewriter
+        if not rewriter.patterns:
+            return [chunk] if chunk else []
+
+        hold = self._hold
+        segments = []
+        data = chunk
+        start = 0
+
+        if self._carry:
+            carry = self._carry
+            self._carry = b""
+            if len(chunk) < hold:
+                # Tiny chunk: joining it costs less than another window scan
+                data = carry + chunk
+            else:
+                # Settle matches starting inside the carried tail.  ``hold``
+                # bytes of the new chunk are enough for any pattern starting
+                # there to be seen in full.
+                window = carry + chunk[:hold]
+                last = rewriter.scan(window, 0, len(carry), segments)
+                if last < len(carry):
+                    segments.append(carry[last:])
+                start = max(0, last - len(carry))
+
+        # A match starting before ``cut`` is final: every pattern starting
+        # there fits inside this chunk, so more data cannot change the choice.
+        cut = len(data) - hold
+        last = rewriter.scan(data, start, cut, segments)
+        keep_from = max(last, cut)
+        if keep_from > last:
+            segments.append(memoryview(data)[last:keep_from])
+        self._carry = data[keep_from:]
+        return segments
+
+    def flush(self):
+        """Return the rewritten carried tail once the body has ended."""
+        if not self._carry:
+            return []
+        carry = self._carry
+        self._carry = b""
+        return [self.rewriter.rewrite(carry)]
+
+
+@functools.lru_cache(maxsize=64)
+def _compiled_path_rewriter(rewrite_pairs):
+    return PathRewriter(rewrite_pairs)
+
+
+def get_path_rewriter(path_rewrites, base_path):
+    """Return the cached PathRewriter for this app's rewrites and base path."""
+    rewrite_pairs = tuple(build_path_rewrite_map(path_rewrites, base_path))
+    return _compiled_path_rewriter(rewrite_pairs)
+
+
+def apply_path_rewrites(data, rewrite_map):
+    """Apply path rewrites without rewriting replacement text again."""
+    if not rewrite_map:
+        return data
+    return _compiled_path_rewriter(tuple(rewrite_map)).rewrite(data)
+
+
+# Content codings we can decode and re-encode, in order of preference
+CONTENT_ENCODINGS = ("br", "gzip", "deflate") if brotli is not None else ("gzip", "deflate")
+
+# Lower than the zlib default: bodies are compressed per request.  Brotli
+# runs one quality step below the zlib level, which costs about as much CPU.
+GZIP_COMPRESS_LEVEL = 6
+
+
+def normalize_content_encoding(value):
+    """Return a Content-Encoding value in lower case, with identity as None."""
+    encoding = (value or "").strip().lower()
+    if encoding in ("", "identity"):
+        return None
+    if encoding == "x-gzip":
+        return "gzip"
+    return encoding
+
+
+def choose_content_encoding(accept_encoding):
+    """Pick the best coding from an Accept-Encoding header, or None for identity."""
+    qualities = {}
+    for item in (accept_encoding or "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities["gzip" if coding == "x-gzip" else coding] = quality
+
+    wildcard = qualities.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for coding in CONTENT_ENCODINGS:
+        quality = qualities.get(coding, wildcard)
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+class ContentDecoder:
+    """Incremental gzip/deflate/br decoder for a response body."""
+
+    def __init__(self, encoding):
+        if encoding not in CONTENT_ENCODINGS:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+        self.encoding = encoding
+        self._first_chunk = True
+        if encoding == "br":
+            self._decoder = brotli.Decompressor()
+        elif encoding == "gzip":
+            self._decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        else:
+            self._decoder = zlib.decompressobj()
+
+    def decompress(self, chunk):
+        if self.encoding == "br":
+            return self._decoder.process(chunk)
+        if self.encoding == "deflate" and self._first_chunk:
+            self._first_chunk = False
+            try:
+                return self._decoder.decompress(chunk)
+            except zlib.error:
+                # Some servers send raw deflate without the zlib wrapper
+                self._decoder = zlib.decompressobj(-zlib.MAX_WBITS)
+        data = self._decoder.decompress(chunk)
+        # Concatenated gzip members each start a new stream
+        while self.encoding == "gzip" and self._decoder.unused_data:
+            unused = self._decoder.unused_data
+            self._decoder = zlib.decompressobj(zlib.MAX_WBITS | 16)
+            data += self._decoder.decompress(unused)
+        return data
+
+    def flush(self):
+        if self.encoding == "br":
+            return b""
+        return self._decoder.flush()
+
+
+class ContentEncoder:
+    """Incremental gzip/deflate/br encoder that flushes output per chunk.
+
+    Each ``compress()`` call ends on a flush point so the browser can start
+    parsing a rewritten page before the backend has sent all of it.
+    """
+
+    def __init__(self, encoding, level=GZIP_COMPRESS_LEVEL):
+        if encoding not in CONTENT_ENCODINGS:
+            raise ValueError(f"Unsupported content encoding: {encoding}")
+        self.encoding = encoding
+        if encoding == "br":
+            self._encoder = brotli.Compressor(quality=max(level - 1, 0))
+        elif encoding == "gzip":
+            self._encoder = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        else:
+            self._encoder = zlib.compressobj(level)
+
+    def compress(self, segments, final=False):
+        """Encode a list of segments and return the bytes ready to send."""
+        if self.encoding == "br":
+            output = [self._encoder.process(bytes(segment)) for segment in segments]
+            output.append(self._encoder.finish() if final else self._encoder.flush())
+        else:
+            output = [self._encoder.compress(segment) for segment in segments]
+            output.append(self._encoder.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH))
+        return b"".join(output)
+
+
+# Media types worth compressing besides text/*.  Event streams are left
+# alone: every event has to reach the browser as soon as it is written.
+COMPRESSIBLE_MEDIA_TYPES = frozenset((
+    "application/javascript", "application/x-javascript", "application/json",
+    "application/manifest+json", "application/xml", "application/wasm", "image/svg+xml",
+))
+# Process CPU use is averaged over windows of this many seconds
+CPU_SAMPLE_SECONDS = 1.0
+
+
+def is_compressible_content_type(content_type):
+    """Whether a body of this Content-Type shrinks enough to be worth compressing."""
+    media_type = (content_type or "").split(";", 1)[0].strip().lower()
+    if media_type == "text/event-stream":
+        return False
+    return (
+        media_type.startswith("text/")
+        or media_type in COMPRESSIBLE_MEDIA_TYPES
+        or media_type.endswith(("+json", "+xml"))
+    )
+
+
+class ProcessCpuMonitor:
+    """Share of one CPU core the wrapper process used recently.
+
+    Sampled on demand: the first call after CPU_SAMPLE_SECONDS takes a new
+    reading of the process CPU time, covering every thread.
+    """
+
+    def __init__(self, window=CPU_SAMPLE_SECONDS, clock=time.monotonic, cpu_clock=time.process_time):
+        self.window = window
+        self._clock = clock
+        self._cpu_clock = cpu_clock
+        self._sampled_at = clock()
+        self._cpu_at = cpu_clock()
+        self._usage = 0.0
+        self._lock = threading.Lock()
+
+    def usage(self):
+        now = self._clock()
+        with self._lock:
+            elapsed = now - self._sampled_at
+            if elapsed >= self.window:
+                cpu = self._cpu_clock()
+                self._usage = (cpu - self._cpu_at) / elapsed
+                self._sampled_at, self._cpu_at = now, cpu
+            return self._usage
+
+
+# Shared by every app: they all compress on the process's CPU time
+_process_cpu = ProcessCpuMonitor()
+
+
+class ResponseCompressor:
+    """Picks the uncompressed backend responses one app compresses on the fly.
+
+    Text-like ``200`` bodies of at least ``min_bytes`` (or of unknown
+    length) qualify.  While the process has used more than ``cpu_budget``
+    of a core over the last sample, new responses go out uncompressed so
+    compression cannot starve the proxy.
+    """
+
+    def __init__(self, level, min_bytes, cpu_budget, cpu_monitor=None):
+        self.level = level
+        self.min_bytes = min_bytes
+        self.cpu_budget = cpu_budget
+        self.cpu_monitor = cpu_monitor if cpu_monitor is not None else _process_cpu
+
+    def applies(self, response):
+        """Whether the wrapper may compress this response's body."""
+        headers = response.headers
+        if response.status_code != 200 or normalize_content_encoding(headers.get("content-encoding")):
+            return False
+        if "content-range" in headers or "no-transform" in headers.get("cache-control", "").lower():
+            return False
+        if not is_compressible_content_type(headers.get("content-type")):
+            return False
+        length = headers.get("content-length", "")
+        return not (length.isdigit() and int(length) < self.min_bytes)
+
+    def over_budget(self):
+        """Whether the process is too busy to compress another response."""
+        return self.cpu_budget > 0 and self.cpu_monitor.usage() > self.cpu_budget
+
+
+class TextResponseTransformer:
+    """Incremental path rewriting and <head> injection for one text response.
+
+    Both serving engines feed it body chunks and send the returned segment
+    lists as chunked-encoding frames, so the rewrite rules live in one place.
+
+    Patterns that span chunk boundaries are handled by RewriteStream.  When
+    ``inject_bytes`` is given, the start of the body is buffered until
+    ``<head>`` is seen (or HEAD_BUFFER_LIMIT bytes have arrived) and the
+    script is inserted right after it.  A ``decoder`` undoes the backend's
+    Content-Encoding before rewriting and an ``encoder`` applies the one
+    chosen for the browser afterwards.
+    """
+
+    HEAD_BUFFER_LIMIT = 4096
+
+    def __init__(self, rewriter, inject_bytes=None, decoder=None, encoder=None):
+        self.rewriter = rewriter
+        self.inject_bytes = inject_bytes
+        self.decoder = decoder
+        self.encoder = encoder
+        self.content_encoding = encoder.encoding if encoder is not None else None
+        self._stream = rewriter.stream()
+        self._head_buffer = b"" if inject_bytes is not None else None
+
+    def _flush_head(self):
+        head_buffer = self.rewriter.rewrite(self._head_buffer)
+        self._head_buffer = None
+        if b'<head>' in head_buffer:
+            head_buffer = head_buffer.replace(b'<head>', b'<head>' + self.inject_bytes, 1)
+        elif b'<HEAD>' in head_buffer:
+            head_buffer = head_buffer.replace(b'<HEAD>', b'<HEAD>' + self.inject_bytes, 1)
+        return [head_buffer]
+
+    def _transform(self, chunk):
+        if self._head_buffer is not None:
+            self._head_buffer += chunk
+            if (
+                b'<head>' in self._head_buffer
+                or b'<HEAD>' in self._head_buffer
+                or len(self._head_buffer) >= self.HEAD_BUFFER_LIMIT
+            ):
+                return self._flush_head()
+            return []
+        return self._stream.feed(chunk)
+
+    def _encode(self, segments, final=False):
+        if self.encoder is None:
+            return segments
+        if not segments and not final:
+            return []
+        data = self.encoder.compress(segments, final)
+        return [data] if data else []
+
+    def feed(self, chunk):
+        """Consume one body chunk and return the segments ready to send."""
+        if self.decoder is not None:
+            chunk = self.decoder.decompress(chunk)
+            if not chunk:
+                return []
+        return self._encode(self._transform(chunk))
+
+    def close(self):
+        """Return everything still held back once the body has ended."""
+        segments = []
+        if self.decoder is not None:
+            tail = self.decoder.flush()
+            if tail:
+                segments = self._transform(tail)
+        if self._head_buffer is not None:
+            segments += self._flush_head()
+        return self._encode(segments + self._stream.flush(), final=True)
+
+
+# How long a request waits for a concurrent fetch of the same asset
+ASSET_FILL_WAIT_SECONDS = 30
+
+# Our own ETags carry this prefix so they are never confused with upstream ones
+ASSET_ETAG_PREFIX = '"ndw-'
+
+# Response headers that describe the upstream bytes or the connection, not
+# the rewritten asset we store
+_ASSET_CACHE_SKIP_HEADERS = {
+    "connection", "keep-alive", "transfer-encoding", "content-length", "etag", "set-cookie",
+    "date", "server",
+}
+
+# Requests for these are coalesced: concurrent misses share one backend fetch
+STATIC_ASSET_SUFFIXES = (".js", ".mjs", ".css")
+
+
+def private_directory(path):
+    """Create ``path`` owner-only unless it exists; raise unless it is ours.
+
+    The directory must be a real directory owned by this user that nobody
+    else can write to.
+    """
+    path = Path(path)
+    path.mkdir(mode=0o700, parents=True, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise PermissionError(f"{path} is not a directory private to this user")
+    return path
+
+
+def open_private_file(path):
+    """Open ``path`` for reading; raise unless it is a regular file of ours.
+
+    Symlinks are not followed, and files others can write to are refused.
+    """
+    fd = os.open(path, os.O_RDONLY | os.O_NOFOLLOW | os.O_CLOEXEC)
+    info = os.fstat(fd)
+    if not stat.S_ISREG(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o022:
+        os.close(fd)
+        raise PermissionError(f"{path} is not a file private to this user")
+    return os.fdopen(fd, "rb")
+
+
+class AssetCacheEntry:
+    """A rewritten asset stored on disk, with the upstream validators it came from."""
+
+    def __init__(self, path, size, etag, headers, upstream_etag, upstream_last_modified):
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.headers = headers
+        self.upstream_etag = upstream_etag
+        self.upstream_last_modified = upstream_last_modified
+
+
+class AssetCacheLookup:
+    """Result of AssetCache.lookup() for one request."""
+
+    def __init__(self, cache, key, entry, leader, fill_done):
+        self.cache = cache
+        self.key = key
+        self.entry = entry
+        self.leader = leader
+        self.fill_done = fill_done
+
+    @property
+    def following(self):
+        """True when another request is already fetching this asset."""
+        return self.fill_done is not None and not self.leader
+
+    def wait_for_fill(self, timeout=ASSET_FILL_WAIT_SECONDS):
+        """Wait for the concurrent fetch and return the entry it stored, if any."""
+        self.fill_done.wait(timeout)
+        self.entry = self.cache.get(self.key)
+        return self.entry
+
+    def conditional_headers(self, proxy_headers):
+        """Revalidate against the upstream validators of the cached entry.
+
+        The browser's own conditionals refer to our ETag, which the backend
+        has never seen, so they are replaced rather than forwarded.
+        """
+        if self.entry is None:
+            return proxy_headers
+        headers = [
+            (h, v) for h, v in proxy_headers
+            if h.lower() not in ("if-none-match", "if-modified-since")
+        ]
+        if self.entry.upstream_etag:
+            headers.append(("If-None-Match", self.entry.upstream_etag))
+        if self.entry.upstream_last_modified:
+            headers.append(("If-Modified-Since", self.entry.upstream_last_modified))
+        return headers
+
+    def release(self):
+        if self.leader:
+            self.cache.release_fill(self.key)
+            self.leader = False
+
+
+class AssetCacheWriter:
+    """Tee for one rewritten response body on its way into the cache."""
+
+    def __init__(self, cache, key):
+        self.cache = cache
+        self.key = key
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._temp_path = cache.directory / f"{key}.{id(self)}.tmp"
+        self._file = open(self._temp_path, "wb")
+
+    def write(self, segments):
+        if self._file is None:
+            return
+        for segment in segments:
+            self._file.write(segment)
+            self._digest.update(segment)
+            self.size += len(segment)
+        if self.size > self.cache.max_entry_bytes:
+            self.abort()
+
+    def commit(self, response, content_encoding=None):
+        """Store the finished body under a strong ETag derived from its bytes.
+
+        ``content_encoding`` is the coding the stored bytes were sent with,
+        which may differ from the backend's.
+        """
+        if self._file is None:
+            return None
+        self._file.close()
+        self._file = None
+        headers = [
+            (h, v) for h, v in response.headers.multi_items()
+            if h.lower() not in _ASSET_CACHE_SKIP_HEADERS and h.lower() != "content-encoding"
+        ]
+        if content_encoding is not None:
+            headers.append(("Content-Encoding", content_encoding))
+        etag = f'{ASSET_ETAG_PREFIX}{self._digest.hexdigest()[:32]}"'
+        return self.cache.store(
+            self.key, self._temp_path, self.size, etag, headers,
+            response.headers.get("etag"), response.headers.get("last-modified"),
+        )
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            self._temp_path.unlink()
+        except OSError:
+            pass
+
+
+class AssetCache:
+    """Per-app on-disk cache of rewritten text assets.
+
+    Entries are keyed by backend URL and rewrite variant (the browser-facing
+    base path) and remember the upstream ETag/Last-Modified they were built
+    from, so a warm load costs one conditional backend request and no
+    rewriting.  Each entry carries a strong ETag of its own so browsers can
+    revalidate with If-None-Match.  Total size is capped with LRU eviction,
+    and concurrent misses for the same asset share one backend fetch.
+    """
+
+    def __init__(self, directory, max_bytes, version, log=log):
+        self.directory = Path(directory)
+        self.log = log
+        self.max_bytes = max_bytes
+        # A single asset may use at most a quarter of the cache
+        self.max_entry_bytes = max_bytes // 4
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._size = 0
+        self._fills = {}
+        self._lock = threading.Lock()
+        # Served files must be ours: another user who owned the directory
+        # (or its parent) could swap them for their own
+        private_directory(self.directory.parent)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        private_directory(self.directory)
+
+    @staticmethod
+    def key_for(url, variant):
+        return hashlib.sha256(f"{url}\0{variant}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def lookup(self, url, variant, coalesce):
+        """Find the entry for a request; on a miss, claim or join its fetch.
+
+        Only requests for static assets should ``coalesce``: an API GET that
+        long-polls must never wait behind another request to the same URL.
+        """
+        key = self.key_for(url, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return AssetCacheLookup(self, key, entry, False, None)
+            if not coalesce:
+                return AssetCacheLookup(self, key, None, False, None)
+            fill_done = self._fills.get(key)
+            if fill_done is not None:
+                return AssetCacheLookup(self, key, None, False, fill_done)
+            fill_done = self._fills[key] = threading.Event()
+            return AssetCacheLookup(self, key, None, True, fill_done)
+
+    def release_fill(self, key):
+        with self._lock:
+            fill_done = self._fills.pop(key, None)
+        if fill_done is not None:
+            fill_done.set()
+
+    def record_hit(self):
+        with self._lock:
+            self.hits += 1
+
+    def open_writer(self, key):
+        """Start storing a freshly rewritten response; counts as a miss."""
+        with self._lock:
+            self.misses += 1
+        try:
+            return AssetCacheWriter(self, key)
+        except OSError as e:
+            self.log(f"Asset cache write failed: {e}")
+            return None
+
+    def store(self, key, temp_path, size, etag, headers, upstream_etag, upstream_last_modified):
+        path = self.directory / f"{key}-{etag.strip(chr(34))}"
+        try:
+            os.replace(temp_path, path)
+        except OSError as e:
+            self.log(f"Asset cache write failed: {e}")
+            return None
+        entry = AssetCacheEntry(path, size, etag, headers, upstream_etag, upstream_last_modified)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous.size
+                if previous.path != path:
+                    self._unlink(previous.path)
+            self._entries[key] = entry
+            self._size += size
+            while self._size > self.max_bytes and self._entries:
+                _key, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.size
+                self._unlink(evicted.path)
+        return entry
+
+    @staticmethod
+    def _unlink(path):
+        # Readers that already opened the file keep their descriptor
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            for entry in self._entries.values():
+                self._unlink(entry.path)
+            self._entries.clear()
+            self._size = 0
+
+    def clear_if_version_changed(self, version):
+        """Drop every entry if the backend build changed; True if it did."""
+        if version == self.version:
+            return False
+        self.clear()
+        self.version = version
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+def is_cacheable_asset_response(response):
+    """True for a 200 response we may store and later serve without rewriting."""
+    headers = response.headers
+    if response.status_code != 200:
+        return False
+    if not (headers.get("etag") or headers.get("last-modified")):
+        return False
+    if "set-cookie" in headers or "no-store" in headers.get("cache-control", "").lower():
+        return False
+    vary = {token.strip().lower() for token in headers.get("vary", "").split(",") if token.strip()}
+    return vary <= {"accept-encoding"}
+
+
+def process_group_exists(pgid):
+    """Check whether a process group still exists."""
+    if pgid is None:
+        return False
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _find_session_pids(sid):
+    """Find all PIDs belonging to the given session, excluding ourselves.
+
+    When start_new_session=True is used, the child becomes the session
+    leader (SID == PID).  All descendants inherit this SID even if they
+    create their own process groups, so scanning by SID catches processes
+    that escape the PGID-based kill.
+    """
+    pids = []
+    my_pid = os.getpid()
+    try:
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            pid = int(entry)
+            if pid == my_pid:
+                continue
+            try:
+                with open(f'/proc/{pid}/stat') as f:
+                    stat_line = f.read()
+                # Format: pid (comm) state ppid pgrp session ...
+                # comm can contain spaces/parens, so find the LAST ')'.
+                close_paren = stat_line.rindex(')')
+                fields = stat_line[close_paren + 2:].split()
+                # fields: 0=state, 1=ppid, 2=pgrp, 3=session
+                proc_sid = int(fields[3])
+                if proc_sid == sid:
+                    pids.append(pid)
+            except (FileNotFoundError, ValueError, PermissionError, IndexError):
+                continue
+    except FileNotFoundError:
+        pass
+    return pids
+
+
+def _kill_orphan_processes(sid, log=log):
+    """Kill any descendant processes that escaped the PGID-based kill.
+
+    This handles the case where Apptainer/Singularity child processes
+    (e.g. rserver forks, fuse handlers) create their own process groups
+    and survive os.killpg().  We find them by session ID and SIGKILL them.
+    """
+    if sid is None:
+        return
+
+    remaining = _find_session_pids(sid)
+    if not remaining:
+        return
+
+    log(f"Found {len(remaining)} orphan process(es) in session {sid}: {remaining}")
+    for pid in remaining:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            log(f"Killed orphan PID {pid}")
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    # Give the kernel a moment to reap the killed processes
+    time.sleep(0.5)
+
+    # Check if any survived even SIGKILL (e.g. stuck in uninterruptible I/O)
+    still_alive = _find_session_pids(sid)
+    if still_alive:
+        log(f"Warning: {len(still_alive)} process(es) survived SIGKILL: {still_alive}")
+
+
+def _kill_processes_on_port(port, log=log):
+    """Kill any process still listening on the target port.
+
+    Safety net for processes that escaped both the PGID and SID kills
+    (e.g. Apptainer child that called setsid()).  Parses /proc/net/tcp
+    to find socket inodes bound to the port, then matches them against
+    /proc/*/fd to identify owning PIDs.
+    """
+    if port is None:
+        return
+
+    hex_port = f'{port:04X}'
+    target_inodes = set()
+    try:
+        with open('/proc/net/tcp') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) < 10:
+                    continue
+                # local_address format: hex_ip:hex_port
+                local_addr = parts[1]
+                if local_addr.endswith(f':{hex_port}'):
+                    inode = parts[9]
+                    if inode != '0':
+                        target_inodes.add(inode)
+    except (FileNotFoundError, PermissionError):
+        return
+
+    if not target_inodes:
+        return
+
+    my_pid = os.getpid()
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        pid = int(entry)
+        if pid == my_pid:
+            continue
+        try:
+            fd_dir = f'/proc/{pid}/fd'
+            for fd in os.listdir(fd_dir):
+                try:
+                    link = os.readlink(f'{fd_dir}/{fd}')
+                    if link.startswith('socket:['):
+                        inode = link[8:-1]
+                        if inode in target_inodes:
+                            log(f"Killing PID {pid} still bound to port {port}")
+                            os.kill(pid, signal.SIGKILL)
+                            break
+                except (FileNotFoundError, PermissionError):
+                    continue
+        except (FileNotFoundError, PermissionError):
+            continue
+
+
+# CVMFS repository the modules are published in; its catalog revision is
+# part of every launch plan's key
+CVMFS_REPOSITORY = "/cvmfs/neurodesk.ardc.edu.au"
+
+# Variables a launch plan never records: they change from start to start
+LAUNCH_PLAN_VOLATILE_ENV = frozenset({
+    "NEURODESK_WEBAPP_PORT", "APPTAINERENV_NEURODESK_WEBAPP_PORT",
+    "LISTEN_FDS", "LISTEN_FDNAMES", "LISTEN_PID",
+    "APPTAINERENV_LISTEN_FDS", "APPTAINERENV_LISTEN_FDNAMES", "APPTAINERENV_LISTEN_PID",
+    "SHLVL", "_", "PWD", "OLDPWD",
+})
+
+
+def cvmfs_revision(repository=CVMFS_REPOSITORY):
+    """Catalog revision of a mounted CVMFS repository, or None."""
+    try:
+        return os.getxattr(repository, "user.revision").decode().strip()
+    except (AttributeError, OSError):
+        return None
+
+
+def module_file_stamps(paths):
+    """Map each module file to [mtime_ns, size]; None if one is missing."""
+    stamps = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        stamps[path] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
+
+
+def read_env_dump(path):
+    """Parse the NUL-separated output of ``env -0``."""
+    env = {}
+    with open_private_file(path) as f:
+        for entry in f.read().split(b"\0"):
+            name, sep, value = entry.decode("utf-8", "surrogateescape").partition("=")
+            if sep and name:
+                env[name] = value
+    return env
+
+
+class LaunchPlanStore:
+    """The resolved launch plan of a module-based backend.
+
+    Loading a module runs Lmod and the environment scripts on every start.
+    The first start that becomes ready dumps the environment the module
+    load produced; the variables it set or removed, the module files Lmod
+    read and the CVMFS revision are saved as the plan.  Later starts apply
+    those variables and run the startup command directly.  A plan is
+    dropped when the module spec, a module file or the revision changes,
+    and when a start from it fails.  Plans and environment dumps are
+    only trusted when they are files of this user's that nobody else can
+    write, kept in an owner-only directory.
+    """
+
+    def __init__(self, path, log=log, revision=cvmfs_revision):
+        self.path = path
+        self.capture_path = f"{path}.env"
+        self.log = log
+        self.revision = revision
+
+    def load(self, module_spec):
+        """Return the saved plan for ``module_spec`` if it still holds, else None."""
+        try:
+            with open_private_file(self.path) as f:
+                plan = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            self.invalidate(f"unreadable ({e})")
+            return None
+
+        module_files = plan.get("module_files") if isinstance(plan, dict) else None
+        if not module_files or not isinstance(module_files, dict):
+            # record() never writes a plan without module files
+            reason = "no module files recorded"
+        elif plan.get("module_spec") != module_spec:
+            reason = f"module changed from {plan.get('module_spec')} to {module_spec}"
+        elif plan.get("revision") != self.revision():
+            reason = f"CVMFS revision changed from {plan.get('revision')} to {self.revision()}"
+        elif module_file_stamps(module_files) != module_files:
+            reason = "module file changed"
+        else:
+            return plan
+        self.invalidate(reason)
+        return None
+
+    def capture_command(self):
+        """Shell command that dumps the loaded module's environment for record()."""
+        try:
+            private_directory(Path(self.path).parent)
+        except OSError as e:
+            self.log(f"Launch plan not captured: {e}")
+            return ""
+        self._remove(self.capture_path)
+        # The dump holds the whole environment, tokens included: owner-only,
+        # and noclobber makes the shell create it with O_EXCL rather than
+        # write through a file someone else put there
+        return f"(umask 077; set -C; env -0 > {shlex.quote(self.capture_path)}) 2>/dev/null"
+
+    def record(self, module_spec, base_env, startup_seconds):
+        """Save the plan from the environment dumped during a successful start."""
+        try:
+            loaded_env = read_env_dump(self.capture_path)
+        except OSError as e:
+            self.log(f"Launch plan not recorded: {e}")
+            return None
+        finally:
+            self._remove(self.capture_path)
+
+        module_files = [path for path in loaded_env.get("_LMFILES_", "").split(":") if path]
+        stamps = module_file_stamps(module_files)
+        if not stamps:
+            self.log(f"Launch plan not recorded: {module_spec} did not load")
+            return None
+
+        plan = {
+            "module_spec": module_spec,
+            "revision": self.revision(),
+            "module_files": stamps,
+            "set_env": {
+                name: value for name, value in loaded_env.items()
+                if name not in LAUNCH_PLAN_VOLATILE_ENV and base_env.get(name) != value
+            },
+            "unset_env": sorted(
+                name for name in base_env
+                if name not in LAUNCH_PLAN_VOLATILE_ENV and name not in loaded_env
+            ),
+            "startup_seconds": round(startup_seconds, 3),
+            "recorded_at": time.time(),
+        }
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        self._remove(temp_path)
+        try:
+            private_directory(Path(self.path).parent)
+            with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "w") as f:
+                json.dump(plan, f)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            self._remove(temp_path)
+            self.log(f"Launch plan not recorded: {e}")
+            return None
+        binds = plan["set_env"].get("APPTAINER_BINDPATH") or plan["set_env"].get("SINGULARITY_BINDPATH")
+        self.log(
+            f"Recorded launch plan for {module_spec} (CVMFS revision {plan['revision']}, "
+            f"{len(plan['set_env'])} variables, binds: {binds or 'none'})"
+        )
+        return plan
+
+    @staticmethod
+    def apply(plan, env):
+        """Return ``env`` with the plan's variables set and removed."""
+        env = dict(env)
+        for name in plan["unset_env"]:
+            env.pop(name, None)
+        for name, value in plan["set_env"].items():
+            if name not in LAUNCH_PLAN_VOLATILE_ENV:
+                env[name] = value
+        return env
+
+    def invalidate(self, reason):
+        if os.path.exists(self.path):
+            self.log(f"Discarding launch plan: {reason}")
+        self._remove(self.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+# apptainer options for local test images, for exec and instance start alike:
+# a throwaway writable overlay plus the user's storage and home directories
+LOCAL_SIF_OPTIONS = (
+    "--writable-tmpfs",
+    "-B", "/neurodesktop-storage:/neurodesktop-storage",
+    "-B", "/home/jovyan:/home/jovyan",
+)
+# Seconds an apptainer instance start, list or stop may take
+INSTANCE_COMMAND_TIMEOUT = 60
+
+
+class ApptainerInstance:
+    """A named ``apptainer instance`` that backend starts exec into.
+
+    Starting the instance mounts the image and sets up its overlay and
+    namespaces once; each backend start then only runs ``apptainer exec
+    instance://<name>``.  Stopping the backend leaves the instance running.
+    The instance is restarted when its image file changes.
+    """
+
+    def __init__(self, name, image, options=LOCAL_SIF_OPTIONS, log=log, run=subprocess.run):
+        self.name = name
+        self.image = image
+        self.options = list(options)
+        self.log = log
+        self._run = run
+        self.image_stamp = None  # [mtime_ns, size] of the image it was started from
+        self._lock = threading.Lock()
+
+    @property
+    def uri(self):
+        return f"instance://{self.name}"
+
+    @property
+    def active(self):
+        """Whether this wrapper started the instance and has not stopped it."""
+        return self.image_stamp is not None
+
+    def _apptainer(self, *args):
+        """Run an apptainer command; return its output, or None if it failed."""
+        try:
+            result = self._run(
+                ["apptainer", *args], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, timeout=INSTANCE_COMMAND_TIMEOUT,
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            self.log(f"apptainer {' '.join(args[:2])} failed: {e}")
+            return None
+        if result.returncode != 0:
+            self.log(f"apptainer {' '.join(args[:2])} failed: {result.stdout.strip()}")
+            return None
+        return result.stdout
+
+    def is_running(self):
+        output = self._apptainer("instance", "list", "--json", self.name)
+        try:
+            instances = json.loads(output)["instances"] if output else []
+        except (ValueError, KeyError, TypeError):
+            return False
+        return any(item.get("instance") == self.name for item in instances)
+
+    def ensure_running(self):
+        """Start the instance unless it already runs from the current image.
+
+        Returns False when it cannot be started; the caller then falls back
+        to a plain ``apptainer exec``.
+        """
+        stamps = module_file_stamps([self.image])
+        if stamps is None:
+            return False
+        stamp = stamps[self.image]
+        with self._lock:
+            if self.image_stamp == stamp and self.is_running():
+                self.log(f"Reusing apptainer instance {self.name}")
+                return True
+            if self.image_stamp is not None and self.image_stamp != stamp:
+                self.log(f"Image {self.image} changed; restarting apptainer instance {self.name}")
+            # Also clears one left behind by a wrapper that did not exit cleanly
+            if self.is_running():
+                self._apptainer("instance", "stop", self.name)
+            self.image_stamp = None
+            started = time.perf_counter()
+            if self._apptainer("instance", "start", *self.options, self.image, self.name) is None:
+                return False
+            self.image_stamp = stamp
+            self.log(f"Started apptainer instance {self.name} in {time.perf_counter() - started:.1f}s")
+            return True
+
+    def stop(self, reason):
+        """Stop the instance if this wrapper started it."""
+        with self._lock:
+            if self.image_stamp is None:
+                return
+            self.image_stamp = None
+            self.log(f"Stopping apptainer instance {self.name} ({reason})")
+            self._apptainer("instance", "stop", self.name)
+
+
+# Launches older than this do not count towards the warm set
+WARM_SET_WINDOW_DAYS = 30
+
+
+class LaunchHistory:
+    """Per-user launch counts and the warm set of apps to start early.
+
+    Each app opened in the browser bumps its count and last-launch time
+    in a JSON file in the user's home.  The file also holds ``warm_set``:
+    the ``warm_set_size`` apps launched most often in the last
+    WARM_SET_WINDOW_DAYS days, which the launcher prestarts once
+    JupyterLab has loaded.
+    """
+
+    def __init__(self, path, warm_set_size, clock=time.time):
+        self.path = Path(path)
+        self.warm_set_size = warm_set_size
+        self.clock = clock
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            history = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+        launches = history.get("launches") if isinstance(history, dict) else None
+        return launches if isinstance(launches, dict) else {}
+
+    def warm_set(self, launches):
+        cutoff = self.clock() - WARM_SET_WINDOW_DAYS * 86400
+        recent = [
+            (entry.get("count", 0), entry.get("last", 0), name)
+            for name, entry in launches.items()
+            if isinstance(entry, dict) and entry.get("last", 0) >= cutoff
+        ]
+        recent.sort(reverse=True)
+        return [name for _count, _last, name in recent[:self.warm_set_size]]
+
+    def record(self, app_name):
+        """Count one launch of ``app_name`` and rewrite the warm set."""
+        with self._lock:
+            launches = self.load()
+            entry = launches.get(app_name)
+            if not isinstance(entry, dict):
+                entry = {}
+            launches[app_name] = {
+                "count": int(entry.get("count", 0)) + 1,
+                "last": round(self.clock(), 3),
+            }
+            history = {"launches": launches, "warm_set": self.warm_set(launches)}
+            temp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                temp_path.write_text(json.dumps(history, indent=2, sort_keys=True) + "\n")
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                log(f"Cannot record launch of {app_name}: {e}")
+                temp_path.unlink(missing_ok=True)
+
+    def record_async(self, app_name):
+        """record() off the request path; the home directory may be slow."""
+        threading.Thread(target=self.record, args=(app_name,), daemon=True).start()
+
+
+def create_launch_history():
+    """The user's launch history, or None while the warm set is disabled."""
+    size = get_default_warm_set_size()
+    if size <= 0:
+        return None
+    return LaunchHistory(LAUNCH_HISTORY_PATH, size)
+
+
+class WebappApp:
+    """Runtime state and backend lifecycle of one webapp.
+
+    The single-app wrapper holds one of these; the daemon holds one per
+    webapp and hands each Unix socket's server the app it serves.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.container_ready = False
+        self.container_error = None
+        self.container_process = None
+        self.container_pgid = None
+        self.container_listen_socket = None  # Socket-activation listener until the app accepts
+        self.container_cgroup = None  # BackendCgroup holding the backend, when delegated
+        self.resource_monitor = None  # BackendResourceMonitor for container_cgroup
+        self.container_frozen_by = None  # "cgroup" or "sigstop" while frozen on idle
+        self.container_frozen_at = None
+        self.container_output = OutputRing()  # Recent output from container process
+        self.startup_start_time = None
+        self.container_start_thread = None
+        self.last_client_activity = 0.0
+        self.active_client_requests = 0
+        self.attachments = 0  # Launchers attached through the daemon
+        self.prestarted = False  # Started from a launcher hint and not opened yet
+        self.launch_recorded = False  # A client request has used this backend
+        self.launch_history = None  # LaunchHistory, when the warm set is enabled
+        self.next_idle_check = 0.0
+        self.httpd_server = None
+        self.asset_cache = None
+        self.launch_plans = None  # LaunchPlanStore, once the app is served
+        self.lanes = None  # ProxyLanes, once the app is served
+        self.compressor = None  # ResponseCompressor, once the app is served
+        self.profiler = None  # WrapperProfiler, when profiling is enabled
+        self.container_instance = None  # ApptainerInstance, in instance launch mode
+        self.metrics = WrapperMetrics()
+        self.access_logfile = None  # JSON access records, once the app is served
+        self.shutdown_event = threading.Event()
+        self.lock = threading.Lock()
+        # Notified whenever the backend becomes ready, fails or prints output
+        self.container_state_changed = threading.Condition()
+        self.container_state_version = 0
+        # Callbacks run on every notification (the asyncio engine wakes its loop)
+        self.container_state_watchers = []
+
+    def log(self, message):
+        """Log message to the app's wrapper log."""
+        log(message, self.config.logfile)
+
+    def notify_container_state(self):
+        """Wake everything waiting in wait_for_container_state()."""
+        with self.container_state_changed:
+            self.container_state_version += 1
+            self.container_state_changed.notify_all()
+            watchers = list(self.container_state_watchers)
+        for watcher in watchers:
+            watcher()
+
+    def wait_for_container_state(self, seen_version, timeout):
+        """Block until the state version moves past ``seen_version`` or timeout.
+
+        Returns the current version, to pass in on the next call.
+        """
+        with self.container_state_changed:
+            self.container_state_changed.wait_for(
+                lambda: self.container_state_version != seen_version, timeout
+            )
+            return self.container_state_version
+
+    def wait_for_container_ready(self, timeout):
+        """Wait up to ``timeout`` seconds for the backend to become ready.
+
+        Returns at once on readiness, a startup error or shutdown, so a request
+        that arrives during startup is proxied the moment the backend is up.
+        """
+        deadline = time.time() + timeout
+        with self.container_state_changed:
+            while True:
+                if self.container_ready or self.container_error or self.shutdown_event.is_set():
+                    return self.container_ready
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.container_state_changed.wait(remaining)
+
+    def drain_process_output(self, proc):
+        """Read and store process output to prevent pipe buffer from blocking."""
+        try:
+            while True:
+                line = proc.stdout.readline()
+                if not line and proc.poll() is not None:
+                    break
+                if line:
+                    self.container_output.append(line.rstrip())
+                    self.log(f"Container output: {line.rstrip()}")
+                    self.notify_container_state()
+        except Exception as e:
+            self.log(f"Error draining output: {e}")
+        # Let the readiness loop notice the exit without waiting out its backoff
+        self.notify_container_state()
+
+    def check_app_ready(self):
+        """Check if the webapp is responding on its expected port.
+
+        Checks the dynamic port first. If the container hasn't been updated to
+        read NEURODESK_WEBAPP_PORT, it will still listen on its default port,
+        so we fall back to checking that as well.
+        """
+        config = self.config
+        # Check dynamic port first (container supports NEURODESK_WEBAPP_PORT)
+        if check_port(config.target_port):
+            return True
+
+        # Fallback: check the default port from the recipe config.
+        # This handles containers that haven't been rebuilt yet and still
+        # use a hardcoded port. Once all containers are updated, this
+        # fallback is never triggered.
+        if config.default_port != config.target_port and check_port(config.default_port):
+            self.log(f"App listening on default port {config.default_port} instead of "
+                     f"dynamic port {config.target_port} — container likely needs rebuild "
+                     f"to support NEURODESK_WEBAPP_PORT")
+            config.target_port = config.default_port
+            for i, (prefix, port) in enumerate(config.routes):
+                if prefix == f"/{config.app_name}":
+                    config.routes[i] = (prefix, config.default_port)
+                    break
+            return True
+
+        return False
+
+    def close_container_listen_socket(self):
+        """Drop the wrapper's copy of the listener; the app keeps its own."""
+        sock, self.container_listen_socket = self.container_listen_socket, None
+        if sock is not None:
+            sock.close()
+
+    def get_backend_version(self):
+        """Identify the backend build whose assets the cache holds."""
+        config = self.config
+        version = f"{config.module}/{config.version}"
+        try:
+            stat = os.stat(config.local_sif)
+        except OSError:
+            return version
+        return f"{version}@{stat.st_mtime_ns}:{stat.st_size}"
+
+    def create_asset_cache(self):
+        """Create the app's asset cache, or None when it is disabled."""
+        config = self.config
+        if config.asset_cache_mb <= 0:
+            return None
+        try:
+            return AssetCache(
+                config.asset_cache_dir, config.asset_cache_mb * 1024 * 1024,
+                self.get_backend_version(), log=self.log,
+            )
+        except OSError as e:
+            self.log(f"Asset cache disabled: {e}")
+            return None
+
+    def create_launch_plan_store(self):
+        """Create the app's launch plan store, or None when plans are disabled."""
+        if not self.config.launch_plan:
+            return None
+        return LaunchPlanStore(self.config.launch_plan_file, log=self.log)
+
+    def create_response_compressor(self):
+        """Create the app's on-the-fly compressor, or None when it is disabled."""
+        config = self.config
+        if config.compression_level <= 0:
+            return None
+        return ResponseCompressor(
+            config.compression_level, config.compression_min_bytes, config.compression_cpu_percent / 100
+        )
+
+    def get_container_instance(self):
+        """Return the app's apptainer instance, or None in exec launch mode."""
+        config = self.config
+        if config.launch_mode != "instance":
+            return None
+        if self.container_instance is None:
+            self.container_instance = ApptainerInstance(
+                f"neurodesk-webapp-{config.app_name}", config.local_sif, log=self.log
+            )
+        return self.container_instance
+
+    def stop_idle_instance(self, idle_for):
+        """Stop the kept instance once the app has had no traffic for instance_timeout."""
+        instance = self.container_instance
+        if instance is None or not instance.active:
+            return
+        timeout = self.config.instance_timeout
+        if timeout <= 0 or idle_for < timeout:
+            return
+        with self.lock:
+            starting = self.container_start_thread is not None and self.container_start_thread.is_alive()
+            if self.container_ready or starting:
+                return
+        instance.stop(f"no traffic for {idle_for:.0f}s")
+
+    def shutdown_backend(self):
+        """Stop the backend and the apptainer instance kept for it."""
+        self.stop_container_processes()
+        if self.container_instance is not None:
+            self.container_instance.stop("wrapper shutdown")
+
+    def create_proxy_lanes(self):
+        """Create the app's interactive and bulk request lanes."""
+        config = self.config
+        return ProxyLanes(
+            config.bulk_max_connections,
+            config.bulk_threshold_mb * 1024 * 1024,
+            config.bulk_rate_mb * 1024 * 1024,
+        )
+
+    def mark_client_activity(self):
+        """Update last-seen timestamp for browser activity."""
+        self.last_client_activity = time.time()
+
+    def begin_client_request(self):
+        """Track in-flight client requests and activity."""
+        with self.lock:
+            self.active_client_requests += 1
+            first_use = not self.launch_recorded
+            self.launch_recorded = True
+            prestart_hit = self.prestarted
+            self.prestarted = False
+        self.mark_client_activity()
+        if prestart_hit:
+            self.metrics.add("prestarts_total", label='outcome="hit"')
+            self.log("Prestarted backend opened")
+        if first_use and self.launch_history is not None:
+            self.launch_history.record_async(self.config.app_name)
+
+    def prestart(self, reason):
+        """Start the backend ahead of a likely launch.
+
+        Returns False when the app is already in use, frozen or shutting
+        down; those backends keep their normal idle handling.
+        """
+        with self.lock:
+            if self.shutdown_event.is_set() or self.launch_recorded or self.container_frozen_by is not None:
+                return False
+            first_hint = not self.prestarted
+            self.prestarted = True
+        if first_hint:
+            self.metrics.add("prestarts_total", label='outcome="started"')
+        self.mark_client_activity()
+        self.ensure_container_starting(f"prestart: {reason}")
+        return True
+
+    def end_client_request(self):
+        """Update request counters after handling a client request.
+
+        Does NOT mark activity — only begin_client_request() does that.
+        A response completing just means the proxy finished; the browser
+        may already be gone (e.g. a long-poll returning after tab close).
+        """
+        with self.lock:
+            self.active_client_requests = max(0, self.active_client_requests - 1)
+
+    def stop_backend_cgroup(self, cgroup):
+        """Stop every process in the backend's cgroup and remove it.
+
+        SIGTERM to all members, then cgroup.kill after stop_timeout; each
+        wait ends as soon as cgroup.events reports populated 0.  No /proc
+        scanning is needed because nothing can leave the cgroup unnoticed.
+        """
+        stop_timeout = self.config.stop_timeout
+        self.log(f"Stopping cgroup {cgroup.path} for {self.config.app_name}")
+        cgroup.signal_all(signal.SIGTERM)
+        if not cgroup.wait_for_event("populated", 0, stop_timeout):
+            self.log(f"Cgroup {cgroup.path} still populated after {stop_timeout}s; killing it")
+            cgroup.kill()
+            if not cgroup.wait_for_event("populated", 0, 5):
+                self.log(f"Warning: process(es) survived cgroup.kill: {cgroup.pids()}")
+                return
+        cgroup.remove()
+
+    def stop_container_processes(self):
+        """Stop the started container/app process group and all descendants."""
+        config = self.config
+
+        # Frozen processes cannot act on SIGTERM
+        self.thaw_backend("stopping backend")
+
+        cgroup = self.container_cgroup
+        if cgroup is not None and cgroup.is_populated():
+            self.stop_backend_cgroup(cgroup)
+            self.container_pgid = None
+            self.container_cgroup = None
+            self.resource_monitor = None
+            return
+
+        # Without a populated cgroup fall back to the process group, then scan
+        # /proc for session members and port owners that escaped it
+        pgid = self.container_pgid
+        if pgid is None and self.container_process is not None:
+            try:
+                pgid = os.getpgid(self.container_process.pid)
+            except (ProcessLookupError, PermissionError):
+                pgid = None
+
+        if pgid is None or not process_group_exists(pgid):
+            self.container_pgid = None
+            # Process group gone, but children may have escaped to their own group
+            _kill_processes_on_port(config.target_port, self.log)
+            return
+
+        # SID == PGID for the session leader (start_new_session=True)
+        sid = pgid
+
+        self.log(f"Stopping process group {pgid} for {config.app_name}")
+
+        try:
+            os.killpg(pgid, signal.SIGTERM)
+        except ProcessLookupError:
+            self.container_pgid = None
+            _kill_orphan_processes(sid, self.log)
+            _kill_processes_on_port(config.target_port, self.log)
+            return
+
+        deadline = time.time() + config.stop_timeout
+        while time.time() < deadline:
+            if not process_group_exists(pgid):
+                self.container_pgid = None
+                _kill_orphan_processes(sid, self.log)
+                _kill_processes_on_port(config.target_port, self.log)
+                return
+            time.sleep(0.2)
+
+        self.log(f"Process group {pgid} did not exit after {config.stop_timeout}s; sending SIGKILL")
+        try:
+            os.killpg(pgid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        self.container_pgid = None
+
+        # Wait briefly for SIGKILL to take effect before scanning for orphans
+        time.sleep(0.5)
+        _kill_orphan_processes(sid, self.log)
+        _kill_processes_on_port(config.target_port, self.log)
+
+    def reset_container_runtime_state(self, clear_error=True):
+        """Reset runtime state after stopping or before restarting the backend."""
+        self.container_ready = False
+        self.container_process = None
+        self.container_output = OutputRing()
+        self.startup_start_time = None
+        if clear_error:
+            self.container_error = None
+        self.close_container_listen_socket()
+        self.clear_freeze_state()
+        self.notify_container_state()
+
+    def set_container_ready(self):
+        self.container_ready = True
+        if self.prestarted:
+            # The prestart timeout runs from readiness, not from the hint
+            self.mark_client_activity()
+        self.close_container_listen_socket()
+        self.notify_container_state()
+
+    def set_container_error(self, message):
+        self.container_error = message
+        self.log(message)
+        self.close_container_listen_socket()
+        self.notify_container_state()
+
+    def ensure_container_starting(self, reason="request"):
+        """Start the backend container if it is not already ready/starting."""
+        with self.lock:
+            if self.shutdown_event.is_set():
+                return
+            if self.container_ready:
+                return
+            if self.container_start_thread is not None and self.container_start_thread.is_alive():
+                return
+
+            # Clear previous errors for fresh restart attempts.
+            self.reset_container_runtime_state(clear_error=True)
+            self.container_start_thread = threading.Thread(target=self.start_container, daemon=True)
+            self.container_start_thread.start()
+            self.log(f"Starting backend launch thread ({reason})")
+
+    def close_backend_connections(self):
+        """Close pooled TCP connections to the backend.
+
+        httpx's pool only reaps expired connections when a new request arrives.
+        When the user closes all tabs and no requests follow, idle connections
+        linger until the OS times them out.  Closing them now means TCP
+        sessions don't outlive the backend process; connections to other
+        apps sharing the pool are left alone.
+        """
+        ports = {port for _prefix, port in self.config.routes}
+        ports.add(self.config.target_port)
+        close_idle_connections(_http_client, ports)
+        close_idle_connections(_bulk_http_client, ports)
+
+        if isinstance(self.httpd_server, AsyncUnixSocketHTTPServer):
+            self.httpd_server.recycle_http_client()
+
+    def clear_freeze_state(self):
+        self.container_frozen_by = None
+        self.container_frozen_at = None
+
+    def freeze_backend_for_idle(self, idle_for):
+        """Suspend an idle, ready backend in place; False if it cannot be frozen.
+
+        Uses the backend's cgroup freezer when available, otherwise SIGSTOP on
+        its process group.  The next request thaws it in milliseconds instead
+        of paying a cold start.
+        """
+        with self.lock:
+            if not self.container_ready or self.container_frozen_by is not None:
+                return False
+            pgid = self.container_pgid
+            cgroup = self.container_cgroup
+
+        if cgroup is not None and cgroup.pids() and cgroup.freeze():
+            frozen_by = "cgroup"
+        elif process_group_exists(pgid):
+            try:
+                os.killpg(pgid, signal.SIGSTOP)
+            except (ProcessLookupError, PermissionError) as e:
+                self.log(f"Cannot freeze process group {pgid}: {e}")
+                return False
+            frozen_by = "sigstop"
+        else:
+            return False
+
+        with self.lock:
+            self.container_frozen_by = frozen_by
+            self.container_frozen_at = time.time()
+        self.log(f"Idle timeout reached after {idle_for:.1f}s; froze backend ({frozen_by})")
+        return True
+
+    def thaw_backend(self, reason):
+        """Resume a frozen backend and log how long the resume took."""
+        with self.lock:
+            frozen_by = self.container_frozen_by
+            frozen_at = self.container_frozen_at
+            if frozen_by is None:
+                return
+            self.clear_freeze_state()
+            pgid = self.container_pgid
+            cgroup = self.container_cgroup
+
+        started = time.perf_counter()
+        if frozen_by == "cgroup":
+            cgroup.thaw()
+            cgroup.wait_for_event("frozen", 0, timeout=1.0)
+        else:
+            try:
+                os.killpg(pgid, signal.SIGCONT)
+            except (ProcessLookupError, PermissionError, TypeError):
+                pass
+        resume_ms = (time.perf_counter() - started) * 1000
+        self.log(
+            f"Thawed backend ({reason}) in {resume_ms:.1f} ms "
+            f"after {time.time() - frozen_at:.0f}s frozen"
+        )
+
+    def stop_backend(self, message):
+        """Stop only the backend app, keeping the wrapper serving its socket.
+
+        Returns False when there was no backend to stop.
+        """
+        with self.lock:
+            backend_running = process_group_exists(self.container_pgid) or (
+                self.container_cgroup is not None and self.container_cgroup.is_populated()
+            )
+            was_ready = self.container_ready
+
+        if not backend_running and not was_ready:
+            return False
+
+        self.log(message)
+        self.stop_container_processes()
+        with self.lock:
+            self.reset_container_runtime_state(clear_error=True)
+            self.mark_client_activity()
+            self.prestarted = False
+            self.launch_recorded = False
+        self.close_backend_connections()
+        cache = self.asset_cache
+        if cache is not None and cache.clear_if_version_changed(self.get_backend_version()):
+            self.log("Backend version changed; cleared rewritten asset cache")
+        return True
+
+    def stop_backend_for_idle(self, idle_for):
+        """Stop only the backend app after inactivity, keeping wrapper alive."""
+        if self.stop_backend(
+            f"Idle timeout reached after {idle_for:.1f}s; stopping backend and waiting for next launch"
+        ):
+            self.metrics.add("idle_stops_total")
+
+    def attach(self):
+        """A launcher attached through the daemon; start the backend."""
+        with self.lock:
+            self.attachments += 1
+        self.mark_client_activity()
+        self.ensure_container_starting("launcher attached")
+
+    def detach(self):
+        """A launcher went away; the last one to leave stops the backend."""
+        with self.lock:
+            self.attachments = max(0, self.attachments - 1)
+            if self.attachments or self.shutdown_event.is_set():
+                return
+        self.stop_backend("Last launcher detached; stopping backend")
+
+    def log_idle_settings(self):
+        config = self.config
+        if config.idle_timeout <= 0:
+            self.log("Idle timeout disabled (idle_timeout <= 0)")
+            return
+        self.log(
+            f"Idle timeout enabled: {config.idle_timeout}s "
+            f"(check interval: {config.idle_check_interval}s, heartbeat: {config.heartbeat_interval}s)"
+        )
+        if config.idle_action == "freeze":
+            self.log(f"Idle backends are frozen; stopped after {config.idle_kill_timeout}s idle "
+                     f"(0 = never)")
+
+    def apply_cgroup_limits(self, cgroup):
+        """Write the webapp's cgroup limits, logging any the hierarchy refuses."""
+        limits = self.config.cgroup_limits
+        errors = cgroup.apply_limits(limits)
+        applied = [f"{name}={value}" for name, value in limits.items() if name not in errors]
+        if applied:
+            self.log(f"Backend limits: {', '.join(applied)}")
+        for name, error in errors.items():
+            self.log(f"Cannot set {name}={limits[name]}: {error}")
+
+    def check_idle(self):
+        """Freeze or stop the backend when the browser is gone and requests stop.
+
+        Called every idle_check_interval by the shared idle scheduler, which
+        also samples the backend's resource use here.
+        """
+        config = self.config
+        monitor = self.resource_monitor
+        if monitor is not None:
+            monitor.check()
+        if config.idle_timeout <= 0:
+            return
+        with self.lock:
+            inflight = self.active_client_requests
 
         if inflight > 0:
-            continue
+            return
+
+        idle_for = time.time() - self.last_client_activity
+        self.stop_idle_instance(idle_for)
+        if self.prestarted:
+            # Never opened: stop rather than freeze, once it has had its chance
+            if self.container_ready and idle_for >= config.prestart_idle_timeout:
+                self.metrics.add("prestarts_total", label='outcome="miss"')
+                self.stop_backend(f"Prestarted backend not opened within {idle_for:.1f}s; stopping it")
+        elif config.idle_action == "freeze" and self.container_frozen_by is not None:
+            # Already frozen: reclaim its memory after the longer timeout
+            if config.idle_kill_timeout > 0 and idle_for >= config.idle_kill_timeout:
+                self.stop_backend_for_idle(idle_for)
+        elif idle_for >= config.idle_timeout:
+            if config.idle_action == "freeze" and self.freeze_backend_for_idle(idle_for):
+                self.metrics.add("idle_freezes_total")
+                return
+            self.stop_backend_for_idle(idle_for)
+
+    def render_splash_template(self):
+        """Render the splash page template with app-specific values."""
+        config = self.config
+        try:
+            with open(SPLASH_TEMPLATE_PATH, 'r') as f:
+                template = Template(f.read())
+
+            return template.safe_substitute(
+                app_name=config.app_name,
+                app_title=config.title,
+                app_description=config.description or f"Loading {config.title}...",
+                status_endpoint=config.status_endpoint,
+                logs_endpoint=config.logs_endpoint,
+                output_lines=OUTPUT_RING_LINES,
+            ).encode('utf-8')
+        except FileNotFoundError:
+            # Fallback if template is missing
+            return f"""<!DOCTYPE html>
+<html><head><title>Loading {config.title}...</title></head>
+<body style="font-family: sans-serif; display: flex; justify-content: center; align-items: center; height: 100vh; margin: 0; background: #1a1a2e; color: white;">
+<div style="text-align: center;">
+<h1>{config.title}</h1>
+<p>Loading...</p>
+<script>setTimeout(() => location.reload(), 3000)</script>
+</div></body></html>""".encode('utf-8')
 
-        idle_for = time.time() - last_client_activity
-        if idle_for >= config.idle_timeout:
-            stop_backend_for_idle(idle_for)
+    def start_container(self):
+        """Start the webapp container in background."""
+        config = self.config
+        self.startup_start_time = time.time()
+        self.metrics.add("backend_starts_total")
+        self.log(f"Starting {config.app_name} container...")
 
+        try:
+            if config.socket_activation:
+                # Bind and listen now so connections queue in the kernel backlog
+                # from the start, with no window for another process to take it
+                self.container_listen_socket = create_listen_socket()
+                dynamic_port = self.container_listen_socket.getsockname()[1]
+                self.log(f"Listening on port {dynamic_port} for socket activation "
+                    f"(default was {config.target_port})")
+            else:
+                # Dynamically allocate a free port so multiple webapps never conflict
+                dynamic_port = find_free_port()
+                self.log(f"Allocated dynamic port {dynamic_port} (default was {config.target_port})")
+
+            # Update config to use the dynamic port
+            config.target_port = dynamic_port
+            for i, (prefix, port) in enumerate(config.routes):
+                if prefix == f"/{config.app_name}":
+                    config.routes[i] = (prefix, dynamic_port)
+                    break
 
-def start_container():
-    """Start the webapp container in background."""
-    global container_ready, container_error, container_process, container_pgid, startup_start_time
+            # Build environment with the dynamic port for the container
+            env = os.environ.copy()
+            env['NEURODESK_WEBAPP_PORT'] = str(dynamic_port)
+            # APPTAINERENV_ prefix ensures the var passes through --cleanenv
+            # (used by transparent-singularity when loading modules)
+            env['APPTAINERENV_NEURODESK_WEBAPP_PORT'] = str(dynamic_port)
+
+            # Check for local test image first (mounted via build_and_run.sh)
+            local_sif = config.local_sif
+            module_spec = None
+            launch_plan = None
+            plan_base_env = None
+
+            if os.path.exists(local_sif):
+                self.log(f"Using local test image: {local_sif}")
+                self.log(f"Startup command: {config.startup_command}")
+                instance = self.get_container_instance()
+                if instance is not None and instance.ensure_running():
+                    # Image mount and overlay are already set up
+                    cmd = ["apptainer", "exec", instance.uri, config.startup_command]
+                else:
+                    if instance is not None:
+                        self.log("Falling back to apptainer exec")
+                    # Bind mount storage and home directories so apps can access user files
+                    cmd = ["apptainer", "exec", *LOCAL_SIF_OPTIONS, local_sif, config.startup_command]
+                self.log(f"Full command: {cmd}")
+            else:
+                self.log("Using CVMFS module system")
+                # Build module spec with version if available
+                module_spec = f"{config.module}/{config.version}" if config.version else config.module
+                if self.launch_plans is not None:
+                    launch_plan = self.launch_plans.load(module_spec)
+                if launch_plan is not None:
+                    # The module was resolved before; skip Lmod and run directly
+                    self.log(f"Using cached launch plan for {module_spec}")
+                    env = LaunchPlanStore.apply(launch_plan, env)
+                    cmd = ["bash", "-c", config.startup_command]
+                else:
+                    self.log(f"Loading module: {module_spec}")
+                    capture = ""
+                    if self.launch_plans is not None:
+                        plan_base_env = dict(env)
+                        capture = self.launch_plans.capture_command()
+                    # Create a shell script to handle module loading
+                    cmd = [
+                        "bash", "-c",
+                        f"""
+                        source /usr/share/module.sh 2>/dev/null
+                        source /opt/neurodesktop/environment_variables.sh 2>/dev/null
+                        export neurodesk_singularity_opts=" --writable-tmpfs "
+                        ml {module_spec} 2>/dev/null
+                        {capture}
+                        {config.startup_command}
+                        """
+                    ]
+
+            # A dedicated cgroup tracks every process the backend forks, so it
+            # can be frozen on idle and torn down without scanning /proc
+            self.container_cgroup = BackendCgroup.create(f"neurodesk-webapp-{config.app_name}")
+            if self.container_cgroup is not None:
+                self.log(f"Backend cgroup: {self.container_cgroup.path}")
+                if self.container_cgroup.is_populated():
+                    # Left behind by a wrapper that did not shut down cleanly
+                    self.log(f"Killing leftover processes in {self.container_cgroup.path}: {self.container_cgroup.pids()}")
+                    self.container_cgroup.kill()
+                    self.container_cgroup.wait_for_event("populated", 0, 5)
+                if config.cgroup_limits:
+                    self.apply_cgroup_limits(self.container_cgroup)
+                self.resource_monitor = BackendResourceMonitor(self.container_cgroup, log=self.log)
+            elif config.cgroup_limits:
+                self.log(f"No writable cgroup v2 hierarchy; not applying limits {config.cgroup_limits}")
+
+            listen_fd = None
+            pass_fds = ()
+            if self.container_listen_socket is not None:
+                listen_fd = self.container_listen_socket.fileno()
+                for name, value in (("LISTEN_FDS", "1"), ("LISTEN_FDNAMES", "http")):
+                    env[name] = value
+                    env[f"APPTAINERENV_{name}"] = value
+                pass_fds = (listen_fd,)
+            cmd = backend_launch_command(cmd, listen_fd, self.container_cgroup)
+
+            self.container_process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                env=env,
+                start_new_session=True,
+                pass_fds=pass_fds,
+            )
+            self.container_pgid = os.getpgid(self.container_process.pid)
+            self.log(f"Started process PID {self.container_process.pid} (PGID {self.container_pgid})")
+
+            # Start a thread to drain output and prevent pipe buffer from blocking
+            output_thread = threading.Thread(
+                target=self.drain_process_output,
+                args=(self.container_process,),
+                daemon=True
+            )
+            output_thread.start()
+
+            # Probe until ready.  Output lines and process exit wake the loop
+            # early, otherwise probes back off exponentially with jitter.
+            probes = create_ready_probes(config.ready_probes, self)
+            self.log(f"Readiness probes: {', '.join(str(probe) for probe in probes)}")
+            backoff = ReadinessBackoff()
+            deadline = time.time() + config.startup_timeout
+            exit_deadline = None
+            state_version = self.container_state_version
+
+            while True:
+                # Check if app is ready FIRST (rserver may fork and parent exits)
+                if all(probe.check() for probe in probes):
+                    self.set_container_ready()
+                    elapsed = time.time() - self.startup_start_time
+                    self.metrics.observe("cold_start_seconds", elapsed)
+                    if exit_deadline is not None:
+                        self.log(f"{config.app_name} is ready! (process exited but app responding) Startup took {elapsed:.1f}s")
+                    else:
+                        self.log(f"{config.app_name} is ready! Startup took {elapsed:.1f}s")
+                    if launch_plan is not None:
+                        saved = launch_plan["startup_seconds"] - elapsed
+                        self.log(f"Launch plan saved {saved:.1f}s against the "
+                            f"{launch_plan['startup_seconds']:.1f}s start that recorded it")
+                    elif plan_base_env is not None:
+                        self.launch_plans.record(module_spec, plan_base_env, elapsed)
+                    return
 
-    startup_start_time = time.time()
-    log(f"Starting {config.app_name} container...")
+                poll_result = self.container_process.poll()
+                if poll_result is not None and exit_deadline is None:
+                    self.log(f"Process exited with code: {poll_result}, checking if app started anyway...")
+                    exit_deadline = time.time() + PROCESS_EXIT_READY_GRACE
+
+                now = time.time()
+                if exit_deadline is not None and now >= exit_deadline:
+                    # Process exited and app not ready after retries - get collected output
+                    output = "\n".join(self.container_output.tail(ERROR_OUTPUT_LINES)) or "(no output)"
+                    self.set_container_error(f"Container exited unexpectedly: {output}")
+                    if launch_plan is not None:
+                        self.launch_plans.invalidate("start from the plan failed")
+                    return
+                if now >= deadline:
+                    self.set_container_error(f"Timeout waiting for {config.app_name} to start")
+                    if launch_plan is not None:
+                        self.launch_plans.invalidate("start from the plan timed out")
+                    return
 
-    try:
-        # Dynamically allocate a free port so multiple webapps never conflict
-        dynamic_port = find_free_port()
-        log(f"Allocated dynamic port {dynamic_port} (default was {config.target_port})")
-
-        # Update config to use the dynamic port
-        config.target_port = dynamic_port
-        for i, (prefix, port) in enumerate(config.routes):
-            if prefix == f"/{config.app_name}":
-                config.routes[i] = (prefix, dynamic_port)
-                break
+                wait = min(backoff.next_delay(), deadline - now)
+                if exit_deadline is not None:
+                    wait = min(wait, exit_deadline - now)
+                state_version = self.wait_for_container_state(state_version, wait)
 
-        # Build environment with the dynamic port for the container
-        env = os.environ.copy()
-        env['NEURODESK_WEBAPP_PORT'] = str(dynamic_port)
-        # APPTAINERENV_ prefix ensures the var passes through --cleanenv
-        # (used by transparent-singularity when loading modules)
-        env['APPTAINERENV_NEURODESK_WEBAPP_PORT'] = str(dynamic_port)
-
-        # Check for local test image first (mounted via build_and_run.sh)
-        local_sif = f"/opt/neurodesktop-test-webapps/{config.app_name}/{config.app_name}.sif"
-
-        if os.path.exists(local_sif):
-            log(f"Using local test image: {local_sif}")
-            log(f"Startup command: {config.startup_command}")
-            # Bind mount storage and home directories so apps can access user files
-            cmd = [
-                "apptainer", "exec", "--writable-tmpfs",
-                "-B", "/neurodesktop-storage:/neurodesktop-storage",
-                "-B", "/home/jovyan:/home/jovyan",
-                local_sif, config.startup_command
-            ]
-            log(f"Full command: {cmd}")
+        except Exception as e:
+            self.log(f"Error starting container: {e}")
+            self.set_container_error(str(e))
+
+
+class _TunnelDirection:
+    """One direction of a tunnel: bytes read from ``src`` are sent to ``dst``.
+
+    Uses os.splice() through a kernel pipe so payloads never enter Python;
+    falls back to a userspace buffer where splice is unavailable or the
+    kernel refuses it for these sockets.
+    """
+
+    SPLICE_FLAGS = getattr(os, "SPLICE_F_MOVE", 0) | getattr(os, "SPLICE_F_NONBLOCK", 0)
+
+    def __init__(self, src, dst, use_splice):
+        self.src = src
+        self.dst = dst
+        self.bytes = 0
+        self.pipe = None
+        self.buffer = None
+        self.pending = 0
+        self.hung_up = False  # ``src`` hung up; the rest of its bytes are still to be read
+        if use_splice:
+            try:
+                self.pipe = os.pipe2(os.O_NONBLOCK | os.O_CLOEXEC)
+            except OSError:
+                self.pipe = None
+
+    def _fall_back_to_buffer(self):
+        if self.pipe is None:
+            return
+        data = os.read(self.pipe[0], self.pending) if self.pending else b""
+        self.buffer = memoryview(data) if data else None
+        self.close()
+
+    def fill(self):
+        """Read from ``src`` into the pipe/buffer; False once it hit EOF."""
+        if self.pipe is not None:
+            try:
+                count = os.splice(self.src.fileno(), self.pipe[1], STREAM_CHUNK_SIZE,
+                                  flags=self.SPLICE_FLAGS)
+            except BlockingIOError:
+                return True
+            except OSError as e:
+                if e.errno != errno.EINVAL:
+                    raise
+                self._fall_back_to_buffer()
+                return self.fill()
         else:
-            log("Using CVMFS module system")
-            # Build module spec with version if available
-            module_spec = f"{config.module}/{config.version}" if config.version else config.module
-            log(f"Loading module: {module_spec}")
-            # Create a shell script to handle module loading
-            cmd = [
-                "bash", "-c",
-                f"""
-                source /usr/share/module.sh 2>/dev/null
-                source /opt/neurodesktop/environment_variables.sh 2>/dev/null
-                export neurodesk_singularity_opts=" --writable-tmpfs "
-                ml {module_spec} 2>/dev/null
-                {config.startup_command}
-                """
-            ]
+            try:
+                data = self.src.recv(STREAM_CHUNK_SIZE)
+            except BlockingIOError:
+                return True
+            count = len(data)
+            if count:
+                self.buffer = memoryview(data)
+
+        if count == 0:
+            return False
+        self.pending += count
+        self.bytes += count
+        return True
 
-        container_process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            env=env,
-            start_new_session=True,
-        )
-        container_pgid = os.getpgid(container_process.pid)
-        log(f"Started process PID {container_process.pid} (PGID {container_pgid})")
-
-        # Start a thread to drain output and prevent pipe buffer from blocking
-        output_thread = threading.Thread(
-            target=drain_process_output,
-            args=(container_process,),
-            daemon=True
-        )
-        output_thread.start()
+    def flush(self):
+        """Send pending bytes to ``dst``; False if it would block."""
+        while self.pending:
+            try:
+                if self.pipe is not None:
+                    try:
+                        sent = os.splice(self.pipe[0], self.dst.fileno(), self.pending,
+                                         flags=self.SPLICE_FLAGS)
+                    except OSError as e:
+                        if e.errno != errno.EINVAL:
+                            raise
+                        self._fall_back_to_buffer()
+                        continue
+                else:
+                    sent = self.dst.send(self.buffer)
+                    self.buffer = self.buffer[sent:]
+            except BlockingIOError:
+                return False
+            self.pending -= sent
+        self.buffer = None
+        return True
 
-        # Wait for container to be ready (with timeout)
-        start_time = time.time()
+    def close(self):
+        if self.pipe is not None:
+            for fd in self.pipe:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+            self.pipe = None
+
+
+class _Tunnel:
+    """An upgraded client connection paired with its backend socket."""
+
+    def __init__(self, client, upstream, label, use_splice, app=None):
+        self.client = client
+        self.upstream = upstream
+        self.label = label
+        self.app = app
+        self.opened_at = time.time()
+        self.up = _TunnelDirection(client, upstream, use_splice)
+        self.down = _TunnelDirection(upstream, client, use_splice)
+
+    def interest(self, sock):
+        """epoll event mask for one of the two sockets; None to stop polling it."""
+        outgoing, incoming = (self.up, self.down) if sock is self.client else (self.down, self.up)
+        if outgoing.hung_up and outgoing.pending:
+            # epoll reports a hang-up on every poll whatever the mask, so the
+            # socket is only polled again once its earlier bytes are flushed;
+            # then the rest is read and the tunnel closes at EOF
+            return None
+        mask = 0
+        # Stop reading while earlier bytes are still waiting for the peer
+        if not outgoing.pending:
+            mask |= select.EPOLLIN
+        if incoming.pending:
+            mask |= select.EPOLLOUT
+        return mask
+
+    def handle(self, sock, events):
+        """Process epoll events for ``sock``; False when the tunnel is done."""
+        outgoing, incoming = (self.up, self.down) if sock is self.client else (self.down, self.up)
+        if events & select.EPOLLERR:
+            return False
+        if events & select.EPOLLHUP:
+            outgoing.hung_up = True
+        if events & select.EPOLLOUT:
+            incoming.flush()
+        if events & (select.EPOLLIN | select.EPOLLHUP | select.EPOLLERR) and not outgoing.pending:
+            if not outgoing.fill():
+                return False
+            outgoing.flush()
+        return True
 
-        while time.time() - start_time < config.startup_timeout:
-            # Check if app is ready FIRST (rserver may fork and parent exits)
-            if check_app_ready():
-                container_ready = True
-                elapsed = time.time() - startup_start_time
-                log(f"{config.app_name} is ready! Startup took {elapsed:.1f}s")
-                return
+    def stats(self):
+        return {
+            "path": self.label,
+            "bytes_up": self.up.bytes,
+            "bytes_down": self.down.bytes,
+            "age_seconds": round(time.time() - self.opened_at, 1),
+        }
 
-            poll_result = container_process.poll()
-            if poll_result is not None:
-                # Process exited - but check multiple times if app is ready
-                # (some apps like rserver fork and the parent exits immediately)
-                log(f"Process exited with code: {poll_result}, checking if app started anyway...")
-                retry_delays = [0.2, 0.2, 0.5, 0.5, 1, 1, 1, 2, 2, 2]
-                for retry, delay in enumerate(retry_delays):
-                    time.sleep(delay)
-                    if check_app_ready():
-                        container_ready = True
-                        elapsed = time.time() - startup_start_time
-                        log(f"{config.app_name} is ready! (process exited but app responding) Startup took {elapsed:.1f}s")
-                        return
-                    log(f"Retry {retry + 1}/{len(retry_delays)}: app not ready yet")
-                # Process exited and app not ready after retries - get collected output
-                output = "\n".join(container_output) if container_output else "(no output)"
-                container_error = f"Container exited unexpectedly: {output}"
-                log(container_error)
+    def close(self):
+        for direction in (self.up, self.down):
+            direction.close()
+        for sock in (self.client, self.upstream):
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+
+class TunnelMultiplexer:
+    """Forward every upgraded (WebSocket) connection from one epoll thread.
+
+    Handler threads return as soon as a tunnel is registered, so an idle
+    WebSocket costs two file descriptors and a kernel pipe rather than a
+    blocked thread.
+    """
+
+    def __init__(self, use_splice=None):
+        if use_splice is None:
+            use_splice = hasattr(os, "splice")
+        self.use_splice = use_splice
+        self._epoll = select.epoll()
+        self._sockets = {}  # fd -> (tunnel, socket)
+        self._polled = set()  # fds registered with the epoll object
+        self._tunnels = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="tunnel-mux", daemon=True)
+        self._thread.start()
+
+    def add(self, client, upstream, label, app=None):
+        """Take ownership of both sockets and forward bytes between them."""
+        client.setblocking(False)
+        upstream.setblocking(False)
+        tunnel = _Tunnel(client, upstream, label, self.use_splice, app)
+        with self._lock:
+            self._tunnels.add(tunnel)
+            for sock in (client, upstream):
+                self._sockets[sock.fileno()] = (tunnel, sock)
+                self._watch(sock.fileno(), tunnel.interest(sock))
+        return tunnel
+
+    def _watch(self, fd, mask):
+        """Poll ``fd`` for ``mask``, or not at all when it is None (lock held)."""
+        if mask is None:
+            if fd in self._polled:
+                self._polled.discard(fd)
+                self._epoll.unregister(fd)
+        elif fd in self._polled:
+            self._epoll.modify(fd, mask)
+        else:
+            self._epoll.register(fd, mask)
+            self._polled.add(fd)
+
+    def stats(self, app=None):
+        """Per-tunnel byte counters for the status endpoint (one app's, if given)."""
+        with self._lock:
+            return [
+                tunnel.stats() for tunnel in self._tunnels
+                if app is None or tunnel.app is app
+            ]
+
+    def _close(self, tunnel):
+        with self._lock:
+            if tunnel not in self._tunnels:
                 return
+            self._tunnels.discard(tunnel)
+            for sock in (tunnel.client, tunnel.upstream):
+                fd = sock.fileno()
+                self._sockets.pop(fd, None)
+                self._polled.discard(fd)
+                try:
+                    self._epoll.unregister(fd)
+                except (OSError, ValueError):
+                    pass
+        stats = tunnel.stats()
+        tunnel.close()
+        if tunnel.app is not None:
+            metrics = tunnel.app.metrics
+            metrics.add("tunnels_open", -1)
+            metrics.add("tunnel_bytes_total", stats["bytes_up"], 'direction="up"')
+            metrics.add("tunnel_bytes_total", stats["bytes_down"], 'direction="down"')
+        (tunnel.app.log if tunnel.app is not None else log)(
+            f"Tunnel {stats['path']} closed after {stats['age_seconds']}s: "
+            f"{stats['bytes_up']} bytes up, {stats['bytes_down']} bytes down"
+        )
 
-            time.sleep(0.3)
+    def _run(self):
+        while True:
+            try:
+                events = self._epoll.poll()
+            except InterruptedError:
+                continue
+            for fd, mask in events:
+                entry = self._sockets.get(fd)
+                if entry is None:
+                    continue
+                tunnel, sock = entry
+                try:
+                    keep_open = tunnel.handle(sock, mask)
+                except OSError:
+                    keep_open = False
+                if not keep_open:
+                    self._close(tunnel)
+                    continue
+                with self._lock:
+                    if tunnel not in self._tunnels:
+                        continue
+                    for tunnel_sock in (tunnel.client, tunnel.upstream):
+                        self._watch(tunnel_sock.fileno(), tunnel.interest(tunnel_sock))
 
-        container_error = f"Timeout waiting for {config.app_name} to start"
-        log(container_error)
 
-    except Exception as e:
-        container_error = str(e)
-        log(f"Error starting container: {e}")
+_tunnel_multiplexer = None
+_tunnel_multiplexer_lock = threading.Lock()
 
 
-def render_splash_template():
-    """Render the splash page template with app-specific values."""
-    try:
-        with open(SPLASH_TEMPLATE_PATH, 'r') as f:
-            template = Template(f.read())
-
-        return template.safe_substitute(
-            app_name=config.app_name,
-            app_title=config.title,
-            app_description=config.description or f"Loading {config.title}...",
-            status_endpoint=config.status_endpoint
-        ).encode('utf-8')
-    except FileNotFoundError:
-        # Fallback if template is missing
-        return f"""<!DOCTYPE html>
-<html><head><title>Loading {config.title}...</title></head>
-<body style="font-family: sans-serif; display: flex; justify-content: center; align-items: center; height: 100vh; margin: 0; background: #1a1a2e; color: white;">
-<div style="text-align: center;">
-<h1>{config.title}</h1>
-<p>Loading...</p>
-<script>setTimeout(() => location.reload(), 3000)</script>
-</div></body></html>""".encode('utf-8')
+def get_tunnel_multiplexer():
+    """Return the shared tunnel thread, starting it on first use."""
+    global _tunnel_multiplexer
+    with _tunnel_multiplexer_lock:
+        if _tunnel_multiplexer is None:
+            _tunnel_multiplexer = TunnelMultiplexer()
+        return _tunnel_multiplexer
 
 
 class WebappHandler(http.server.BaseHTTPRequestHandler):
@@ -763,9 +4308,129 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
     # after every response, so no data is left stuck in the buffer.
     wbufsize = -1
 
+    # Persistent connections: every response is framed with Content-Length
+    # or chunked encoding unless the connection closes after it
+    protocol_version = "HTTP/1.1"
+
+    # Per-request keep-alive state, reset by _begin_request()
+    requests_handled = 0
+    _close_after_response = False
+    _close_announced = False
+    _response_started = False
+    _request_body_remaining = 0
+    _chunked_body_pending = False
+    _chunked = True
+    _lane = None  # ProxyLane held while the request is proxied
+    _request_kind = None  # How the request was served, for the metrics
+    _request_started = 0.0
+    _response_status = None
+    _response_bytes = 0
+    _upstream_ttfb = None
+
+    def setup(self):
+        # The server is bound to one app; in daemon mode each socket has its own
+        self.app = self.server.app
+        super().setup()
+
+    def handle_one_request(self):
+        # Wait at most keepalive_timeout for the next request on this
+        # connection; peek() leaves pipelined bytes in rfile
+        self.connection.settimeout(self.app.config.keepalive_timeout)
+        try:
+            if not self.rfile.peek(1):
+                self.close_connection = True
+                return
+        except OSError:
+            self.close_connection = True
+            return
+        finally:
+            self.connection.settimeout(None)
+        super().handle_one_request()
+
+    def send_response(self, code, message=None):
+        self._close_announced = False
+        self._response_status = code
+        super().send_response(code, message)
+        self._response_started = True
+        if self._close_after_response or self.close_connection or self._chunked_body_pending:
+            # Also sets close_connection
+            self.send_header("Connection", "close")
+
+    def send_header(self, keyword, value):
+        # send_error() and _send_body_framing() may announce the close again
+        if keyword.lower() == "connection" and value.lower() == "close":
+            if self._close_announced:
+                return
+            self._close_announced = True
+        super().send_header(keyword, value)
+
+    def _begin_request(self):
+        """Reset per-request state and decide whether the connection stays open."""
+        self.requests_handled += 1
+        self._request_started = time.perf_counter()
+        self._request_kind = None
+        self._response_status = None
+        self._response_bytes = 0
+        self._upstream_ttfb = None
+        self._response_started = False
+        self._request_body_remaining = 0
+        self._chunked_body_pending = False
+        self._chunked = self.request_version == "HTTP/1.1"
+        # HTTP/1.0 clients get close-delimited responses
+        self._close_after_response = (
+            not self._chunked
+            or self.requests_handled >= self.app.config.keepalive_max_requests
+        )
+        if self.headers.get("Transfer-Encoding"):
+            # Cleared once the body is decoded to its end; a response sent
+            # before that closes the connection
+            self._chunked_body_pending = True
+            return
+        try:
+            self._request_body_remaining = self._get_request_content_length() or 0
+        except ValueError:
+            self._close_after_response = True
+
+    def _finish_request_body(self):
+        """Read what the response left of the request body off the connection.
+
+        The next request on a persistent connection starts after it.  Large
+        leftovers close the connection instead.
+        """
+        remaining = self._request_body_remaining
+        if self._chunked_body_pending:
+            self.close_connection = True
+        if not remaining or self.close_connection:
+            return
+        if remaining > KEEPALIVE_DRAIN_LIMIT:
+            self.close_connection = True
+            return
+        try:
+            if len(self.rfile.read(remaining)) < remaining:
+                self.close_connection = True
+        except OSError:
+            self.close_connection = True
+        self._request_body_remaining = 0
+
+    def _response_has_body(self, status_code):
+        """Whether a response with this status to this request carries a body."""
+        return self.command != "HEAD" and status_code >= 200 and status_code not in (204, 304)
+
+    def _send_body_framing(self):
+        """Send the header that delimits a body of unknown length.
+
+        HTTP/1.1 clients get chunked encoding; others get a body that ends
+        when the connection closes.  _write_chunk() and _end_chunked() follow
+        the choice.
+        """
+        if self._chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
+
     def log_message(self, format, *args):
         """Override to log to file instead of stderr."""
-        log(f"HTTP: {format % args}")
+        self.app.log(f"HTTP: {format % args}")
 
     def do_GET(self):
         self._handle_request("GET")
@@ -791,7 +4456,45 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
     def _is_status_endpoint(self):
         """Check if request targets the wrapper status/heartbeat endpoint."""
         parsed_path = urllib.parse.urlparse(self.path).path
-        return parsed_path.endswith(f"/{config.status_endpoint}")
+        return parsed_path.endswith(f"/{self.app.config.status_endpoint}")
+
+    def _is_metrics_endpoint(self):
+        """Check if request targets the wrapper's Prometheus metrics endpoint."""
+        parsed_path = urllib.parse.urlparse(self.path).path
+        return parsed_path.endswith(f"/{self.app.config.metrics_endpoint}")
+
+    def _is_logs_endpoint(self):
+        """Check if request targets the wrapper's container output endpoint."""
+        parsed_path = urllib.parse.urlparse(self.path).path
+        return parsed_path.endswith(f"/{self.app.config.logs_endpoint}")
+
+    def _is_prestart_endpoint(self):
+        """Check if request targets the wrapper's launcher prestart hint."""
+        parsed_path = urllib.parse.urlparse(self.path).path
+        return parsed_path.endswith(f"/{self.app.config.prestart_endpoint}")
+
+    def _is_profile_endpoint(self):
+        """Check if request targets the wrapper's profiling endpoint, when enabled."""
+        if self.app.profiler is None:
+            return False
+        parsed_path = urllib.parse.urlparse(self.path).path
+        return parsed_path.endswith(f"/{self.app.config.profile_endpoint}")
+
+    def _is_status_stream_request(self, method):
+        """Check if the splash page opened the status endpoint as an EventSource."""
+        return method == "GET" and "text/event-stream" in self.headers.get("Accept", "")
+
+    def _is_logs_stream_request(self, method):
+        """Check if the logs endpoint should follow new output (EventSource or ?follow=1)."""
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        return self._is_status_stream_request(method) or (
+            method == "GET" and query.get("follow", [""])[0] in ("1", "true")
+        )
+
+    def _logs_tail_lines(self):
+        """Number of lines the logs endpoint starts with (?lines=N)."""
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        return parse_int(query.get("lines", [None])[0], LOGS_TAIL_LINES, minimum=0)
 
     def _is_close_beacon(self):
         """Check if this is a tab-close beacon (?closing=1 on status endpoint)."""
@@ -799,6 +4502,42 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         return "closing=1" in query
 
     def _handle_request(self, method):
+        self._begin_request()
+        try:
+            self._dispatch_request(method)
+        finally:
+            self._finish_request_body()
+            self._record_request()
+
+    def _record_request(self):
+        """Record the request just served in the metrics and the access log."""
+        duration = time.perf_counter() - self._request_started
+        if self._request_kind is not None:
+            self.app.metrics.observe(
+                "request_duration_seconds", duration, f'kind="{self._request_kind}"'
+            )
+        if self.app.access_logfile is None:
+            return
+        # The query string is left out: it can carry tokens
+        record = {
+            "time": round(time.time(), 3),
+            "method": self.command,
+            "path": urllib.parse.urlparse(self.path).path,
+            "status": self._response_status,
+            "bytes": self._response_bytes,
+            "ttfb_ms": None if self._upstream_ttfb is None else round(self._upstream_ttfb * 1000, 1),
+            "duration_ms": round(duration * 1000, 1),
+            "kind": self._request_kind,
+            "rewritten": self._request_kind == "rewritten",
+        }
+        _log_writer.write(self.app.access_logfile, json.dumps(record) + "\n")
+
+    def log_request(self, code="-", size="-"):
+        # Requests go to the access log instead, when there is one
+        if self.app.access_logfile is None:
+            super().log_request(code, size)
+
+    def _dispatch_request(self, method):
         # Close beacons must NOT reset the idle timer — otherwise every tab
         # close extends the backend lifetime by a full idle_timeout period.
         # They also cannot safely trigger immediate shutdown: browsers fire
@@ -807,20 +4546,52 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
             self._send_status(method, is_close=True)
             return
 
-        begin_client_request()
+        # Scrapes are not browser activity and must not start the backend
+        if self._is_metrics_endpoint() and method in ("GET", "HEAD"):
+            self._send_metrics(method)
+            return
+
+        # Launcher hints start the backend but are not a launch themselves
+        if self._is_prestart_endpoint() and method == "POST":
+            self._send_prestart()
+            return
+
+        # Neither is watching the container output
+        if self._is_logs_endpoint() and method in ("GET", "HEAD"):
+            if self._is_logs_stream_request(method):
+                self._send_event_stream(OutputTailStream(self.app, self._logs_tail_lines()))
+            else:
+                self._send_logs(method)
+            return
+
+        # Nor profiling the wrapper
+        if self._is_profile_endpoint() and method == "GET":
+            profile = self._profile_request()
+            if profile is not None:
+                self._send_profile(self.app.profiler.run(*profile))
+            return
+
+        self.app.begin_client_request()
 
         try:
             # Status endpoint for splash page polling / browser heartbeat
             if self._is_status_endpoint():
-                self._send_status(method)
+                if self._is_status_stream_request(method):
+                    self._send_event_stream(StatusEventStream(self.app))
+                else:
+                    self._send_status(method)
                 return
 
+            # A backend frozen on idle resumes for any real request
+            if self.app.container_frozen_by is not None:
+                self.app.thaw_backend("incoming web request")
+
             # Ensure backend is running when a user is actively opening the app.
-            if not container_ready:
-                ensure_container_starting("incoming web request")
+            if not self.app.container_ready:
+                self.app.ensure_container_starting("incoming web request")
 
             # If container is ready, proxy all requests
-            if container_ready:
+            if self.app.container_ready:
                 self._proxy_request(method)
                 return
 
@@ -829,17 +4600,30 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
                 self._serve_splash()
                 return
 
+            # Other requests are held briefly and proxied as soon as the
+            # backend reports ready
+            if self.app.wait_for_container_ready(REQUEST_READY_WAIT_SECONDS):
+                self._proxy_request(method)
+                return
+
             # For other requests while loading, return 503
-            self.send_response(503)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Retry-After", "5")
-            self.end_headers()
-            self.wfile.write(json.dumps({
-                "error": f"{config.title} is still starting up",
-                "status": "loading"
-            }).encode())
+            self._send_loading_response()
         finally:
-            end_client_request()
+            self.app.end_client_request()
+
+    def _send_loading_response(self):
+        """Answer a non-splash request that arrived while the backend starts."""
+        content = json.dumps({
+            "error": f"{self.app.config.title} is still starting up",
+            "status": "loading"
+        }).encode()
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Retry-After", "5")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
 
     def _get_normalized_path(self):
         """
@@ -854,7 +4638,7 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         parsed_path = urllib.parse.urlparse(self.path).path
 
         # Look for the app name in the path and extract from there
-        app_marker = f"/{config.app_name}"
+        app_marker = f"/{self.app.config.app_name}"
         idx = parsed_path.find(app_marker)
         if idx != -1:
             # Found app name - return path starting from there
@@ -866,12 +4650,12 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
     def _is_root_path(self):
         """Check if path is a root-like path for the app."""
         path = self._get_normalized_path().rstrip("/")
-        return path == "" or path == "/" or path == f"/{config.app_name}"
+        return path == "" or path == "/" or path == f"/{self.app.config.app_name}"
 
     def _is_main_app_html(self):
         """Check if this is a request for the main app HTML page."""
         path = self._get_normalized_path().rstrip("/")
-        return path == f"/{config.app_name}" or path == f"/{config.app_name}/index.html"
+        return path == f"/{self.app.config.app_name}" or path == f"/{self.app.config.app_name}/index.html"
 
     def _get_base_path(self):
         """
@@ -883,13 +4667,13 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         Returns the path ending with a trailing slash.
         """
         parsed_path = urllib.parse.urlparse(self.path).path
-        app_marker = f"/{config.app_name}"
+        app_marker = f"/{self.app.config.app_name}"
         idx = parsed_path.find(app_marker)
         if idx != -1:
             # Return everything up to and including the app name, plus trailing slash
             return parsed_path[:idx + len(app_marker)] + "/"
         # Fallback to just the app name
-        return f"/{config.app_name}/"
+        return f"/{self.app.config.app_name}/"
 
     def _rewrite_location(self, location, target_port):
         """Rewrite Location header to go through proxy instead of direct port access."""
@@ -925,26 +4709,163 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
             self.send_header("Cache-Control", "no-cache")
             self.end_headers()
             if is_close:
-                log("Close beacon received; backend will stop after normal idle timeout")
+                self.app.log("Close beacon received; backend will stop after normal idle timeout")
             return
 
-        elapsed = time.time() - startup_start_time if startup_start_time else 0
+        elapsed = time.time() - self.app.startup_start_time if self.app.startup_start_time else 0
 
         status = {
-            "ready": container_ready,
-            "error": container_error,
-            "elapsed_seconds": round(elapsed, 1)
+            "ready": self.app.container_ready,
+            "error": self.app.container_error,
+            "elapsed_seconds": round(elapsed, 1),
+            "frozen": self.app.container_frozen_by is not None,
         }
+        if _tunnel_multiplexer is not None:
+            status["tunnels"] = _tunnel_multiplexer.stats(self.app)
+        if self.app.asset_cache is not None:
+            status["asset_cache"] = self.app.asset_cache.stats()
+        if self.app.lanes is not None:
+            status["lanes"] = self.app.lanes.stats()
+        monitor = self.app.resource_monitor
+        if monitor is not None:
+            status["resources"] = monitor.usage()
+
+        content = json.dumps(status).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(content)
 
+    def _backend_clients(self):
+        """The interactive and bulk backend clients this engine proxies with."""
+        return {"interactive": _http_client, "bulk": _bulk_http_client}
+
+    def _send_metrics(self, method):
+        """Send the app's metrics in Prometheus text exposition format."""
+        app = self.app
+        gauges = {
+            ("backend_ready", None): int(bool(app.container_ready)),
+            ("requests_in_flight", None): app.active_client_requests,
+            ("log_records_dropped_total", None): _log_writer.dropped,
+        }
+        for pool, client in self._backend_clients().items():
+            active, idle = pool_connection_counts(client)
+            gauges["backend_pool_connections", f'pool="{pool}",state="active"'] = active
+            gauges["backend_pool_connections", f'pool="{pool}",state="idle"'] = idle
+        if app.lanes is not None:
+            for lane, stats in app.lanes.stats().items():
+                gauges["lane_requests", f'lane="{lane}",state="active"'] = stats["active"]
+                gauges["lane_requests", f'lane="{lane}",state="queued"'] = stats["queued"]
+
+        content = app.metrics.render(app.config.app_name, gauges)
         self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(content)
+
+    def _send_prestart(self):
+        """Start the backend on a launcher hint (tile hover or the warm set)."""
+        app = self.app
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        reason = query.get("reason", ["hint"])[0]
+        if reason not in PRESTART_REASONS:
+            reason = "hint"
+        prestarted = app.config.prestart and app.prestart(reason)
+        content = json.dumps({
+            "prestarted": prestarted,
+            "ready": bool(app.container_ready),
+        }).encode()
+        self.send_response(202 if prestarted else 200)
         self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _send_logs(self, method):
+        """Send the tail of the container output as plain text."""
+        lines = self.app.container_output.tail(self._logs_tail_lines())
+        content = "".join(f"{line}\n" for line in lines).encode("utf-8", "replace")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if method != "HEAD":
+            self.wfile.write(content)
+
+    def _send_text(self, status, text):
+        content = text.encode("utf-8", "replace")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _peer_socket(self):
+        return self.connection
+
+    def _profile_request(self):
+        """The (kind, seconds) of a profile request, or None once refused.
+
+        The wrapper socket is open to every local user, so profiles are only
+        taken for a client running as the wrapper's own user.
+        """
+        if peer_uid(self._peer_socket()) != os.getuid():
+            self._send_text(403, "Profiles are only served to the wrapper's user\n")
+            return None
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        seconds = min(
+            parse_int(query.get("seconds", [None])[0], PROFILE_DEFAULT_SECONDS, minimum=1),
+            PROFILE_MAX_SECONDS,
+        )
+        kind = "memory" if query.get("mem", [""])[0] in ("1", "true") else "cpu"
+        self.app.log(f"Taking a {seconds}s {kind} profile of the wrapper")
+        return kind, seconds
+
+    def _send_profile(self, profile):
+        if profile is None:
+            self._send_text(409, "A profile is already being taken\n")
+        else:
+            self._send_text(200, profile)
+
+    def _begin_event_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
         self.send_header("Cache-Control", "no-cache")
+        # Stop nginx-style proxies from buffering the stream
+        self.send_header("X-Accel-Buffering", "no")
+        # The stream ends only when the connection closes
+        self.send_header("Connection", "close")
         self.end_headers()
-        self.wfile.write(json.dumps(status).encode())
+
+    def _send_event_stream(self, stream):
+        """Push a StatusEventStream or OutputTailStream's events as they happen."""
+        self._begin_event_stream()
+        version = self.app.container_state_version
+        try:
+            while True:
+                frames = stream.poll()
+                self.wfile.write(b"".join(frames) or b": keepalive\n\n")
+                self.wfile.flush()
+                if stream.finished:
+                    return
+                version = self.app.wait_for_container_state(version, STATUS_STREAM_KEEPALIVE_SECONDS)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
 
     def _serve_splash(self):
         """Serve the splash page."""
-        content = render_splash_template()
+        content = self.app.render_splash_template()
+        self._request_kind = "splash"
+        self._count_response_bytes(len(content))
         self.send_response(200)
         self.send_header("Content-Type", "text/html; charset=utf-8")
         self.send_header("Content-Length", len(content))
@@ -953,15 +4874,46 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         self.wfile.write(content)
 
     def _write_chunk(self, data):
-        """Write one HTTP chunked-encoding frame."""
-        if data:
-            self.wfile.write(f"{len(data):x}\r\n".encode())
-            self.wfile.write(data)
-            self.wfile.write(b"\r\n")
+        """Write one HTTP chunked-encoding frame from bytes or a segment list.
+
+        Without chunked framing (see _send_body_framing) the bytes are
+        written as they are.
+        """
+        segments = data if isinstance(data, list) else [data]
+        if not self._chunked:
+            self._write_segments(segments)
+            return
+        size = sum(len(segment) for segment in segments)
+        if size:
+            self._write_segments([f"{size:x}\r\n".encode(), *segments, b"\r\n"])
+
+    def _write_segments(self, segments):
+        """Write byte segments to the client in order.
+
+        Small writes are coalesced in the wfile buffer.  From
+        SENDMSG_MIN_PAYLOAD bytes on the buffer is flushed and the segments
+        are gathered by sendmsg() from memoryviews, so a large payload is
+        neither copied nor split from its chunk framing.
+        """
+        sendmsg = getattr(self.connection, "sendmsg", None)
+        if sendmsg is None or sum(len(segment) for segment in segments) < SENDMSG_MIN_PAYLOAD:
+            for segment in segments:
+                self.wfile.write(segment)
+            return
+        self.wfile.flush()
+        views = [memoryview(segment) for segment in segments if segment]
+        while views:
+            sent = sendmsg(views[:SENDMSG_MAX_SEGMENTS])
+            # Drop what went out; a partial send resumes mid-segment
+            while sent and sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            if sent:
+                views[0] = views[0][sent:]
 
     def _end_chunked(self):
         """Terminate chunked transfer encoding."""
-        self.wfile.write(b"0\r\n\r\n")
+        if self._chunked:
+            self.wfile.write(b"0\r\n\r\n")
 
     def _build_inject_script(self, base_path):
         """Build the <base href> + heartbeat JS to inject after <head>."""
@@ -974,8 +4926,8 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
 <script>
 (function() {{
   var basePath = '{base_path.rstrip("/")}';
-  var statusUrl = basePath + '/{config.status_endpoint}';
-  var heartbeatIntervalMs = {config.heartbeat_interval * 1000};
+  var statusUrl = basePath + '/{self.app.config.status_endpoint}';
+  var heartbeatIntervalMs = {self.app.config.heartbeat_interval * 1000};
   var origReplace = History.prototype.replaceState;
 
   // Strip base path from current URL so router sees correct path
@@ -1048,8 +5000,8 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         """
         inject_script = f'''<script>
 (function() {{
-  var statusUrl = '{base_path.rstrip("/")}/{config.status_endpoint}';
-  var heartbeatIntervalMs = {config.heartbeat_interval * 1000};
+  var statusUrl = '{base_path.rstrip("/")}/{self.app.config.status_endpoint}';
+  var heartbeatIntervalMs = {self.app.config.heartbeat_interval * 1000};
 
   function sendHeartbeat() {{
     fetch(statusUrl, {{
@@ -1097,14 +5049,16 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         return inject_script.encode('utf-8')
 
     def _send_response_headers(self, response, target_port, omit_content_length=False,
-                               omit_content_encoding=False):
+                               omit_content_encoding=False, omit_etag=False):
         """Send HTTP status and headers from upstream httpx response."""
         self.send_response(response.status_code)
-        skip = {"transfer-encoding", "connection"}
+        skip = {"transfer-encoding", "connection", "keep-alive"}
         if omit_content_length:
             skip.add("content-length")
         if omit_content_encoding:
             skip.add("content-encoding")
+        if omit_etag:
+            skip.add("etag")
         for header, value in response.headers.multi_items():
             if header.lower() not in skip:
                 if header.lower() == "location":
@@ -1118,105 +5072,267 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         Content-Encoding like gzip) so the forwarded Content-Encoding
         header stays correct for the browser.
         """
-        self._send_response_headers(response, target_port)
-        self.end_headers()
+        framed = self._begin_streamed_response(response, target_port)
+        if not self._response_has_body(response.status_code):
+            return
         for chunk in response.iter_raw(STREAM_CHUNK_SIZE):
-            self.wfile.write(chunk)
-
-    def _send_streamed_text_response(self, response, target_port, is_main_html):
-        """Stream text response with path rewriting and optional script injection.
+            if framed:
+                self._write_segments([chunk])
+            else:
+                self._write_chunk(chunk)
+            self._count_response_bytes(len(chunk))
+            delay = self._bulk_delay(len(chunk))
+            if delay:
+                self.wfile.flush()
+                time.sleep(delay)
+        if not framed:
+            self._end_chunked()
+
+    def _send_compressed_response(self, response, target_port):
+        """Stream an uncompressed text body compressed for the browser.
+
+        Every chunk ends on a flush point, so long-polls and slowly
+        generated bodies reach the browser as promptly as uncompressed.
+        """
+        encoder = self._begin_compressed_response(response, target_port)
+        for chunk in response.iter_raw(STREAM_CHUNK_SIZE):
+            data = encoder.compress([chunk])
+            self._write_chunk(data)
+            self._count_compressed_bytes(len(chunk), len(data))
+            delay = self._bulk_delay(len(data))
+            if delay:
+                self.wfile.flush()
+                time.sleep(delay)
+        data = encoder.compress([], final=True)
+        self._write_chunk(data)
+        self._count_compressed_bytes(0, len(data))
+        self._end_chunked()
 
-        Uses a sliding-window overlap buffer so that rewrite patterns spanning
-        chunk boundaries are still matched correctly.
+    def _begin_compressed_response(self, response, target_port):
+        """Send the headers of a body compressed on the fly; return its encoder.
 
-        For main HTML pages from compressed backends (gzip/br), we decompress
-        via iter_bytes() and inject a heartbeat-only script (no base-href or
-        replaceState — those break apps like RStudio that read window.location).
-        For uncompressed main HTML, we inject the full script (base-href +
-        replaceState + heartbeat) using iter_raw(), preserving the old behavior
-        that apps like dicompare depend on.
+        The backend's length no longer applies, and its ETag is weakened
+        because the bytes sent differ from the ones it describes.
+        """
+        encoding = self._get_output_encoding()
+        self._send_response_headers(response, target_port, omit_content_length=True, omit_etag=True)
+        etag = response.headers.get("etag")
+        if etag:
+            self.send_header("ETag", etag if etag.startswith("W/") else f"W/{etag}")
+        self._send_content_encoding(response, encoding)
+        self._send_body_framing()
+        self.end_headers()
+        return ContentEncoder(encoding, self.app.compressor.level)
+
+    def _count_compressed_bytes(self, raw_size, size):
+        self._count_response_bytes(size)
+        metrics = self.app.metrics
+        metrics.add("compression_input_bytes_total", raw_size)
+        metrics.add("compression_output_bytes_total", size)
+
+    def _bulk_delay(self, size):
+        """Seconds to hold back the next write of a bulk body (see ProxyLanes.pace)."""
+        lanes = self.app.lanes
+        if lanes is None or self._lane is not lanes.bulk:
+            return 0.0
+        return lanes.pace(size)
+
+    def _begin_streamed_response(self, response, target_port):
+        """Send a raw response's headers; False if the body needs chunk framing."""
+        self._send_response_headers(response, target_port)
+        framed = "content-length" in response.headers or not self._response_has_body(response.status_code)
+        if not framed:
+            self._send_body_framing()
+        self.end_headers()
+        return framed
+
+    def _get_output_encoding(self):
+        """Content-Encoding to use for rewritten bodies sent to this browser."""
+        return choose_content_encoding(self.headers.get("Accept-Encoding"))
+
+    def _compression_encoding(self, response):
+        """Coding to compress an uncompressed backend body with, or None."""
+        compressor = self.app.compressor
+        if compressor is None or not compressor.applies(response):
+            return None
+        encoding = self._get_output_encoding()
+        if encoding is None:
+            return None
+        if compressor.over_budget():
+            self.app.metrics.add("compression_skipped_total")
+            return None
+        return encoding
+
+    def _send_content_encoding(self, response, encoding):
+        """Send the Content-Encoding the wrapper chose, and Vary on it."""
+        self.send_header("Content-Encoding", encoding)
+        if "accept-encoding" not in response.headers.get("vary", "").lower():
+            self.send_header("Vary", "Accept-Encoding")
+
+    def _begin_text_response(self, response, target_port, is_main_html, omit_etag=False):
+        """Send headers for a rewritten text response and set up its body.
+
+        Compressed bodies are decoded before rewriting and re-encoded with
+        the best coding the browser accepts, so rewrites apply and the
+        compression savings survive the proxy hop.  Uncompressed ones are
+        compressed when the app's ResponseCompressor allows it.  For compressed main HTML
+        a heartbeat-only script is injected (no base-href or replaceState —
+        those break apps like RStudio that read window.location).  For
+        uncompressed main HTML, the full script (base-href + replaceState +
+        heartbeat) is injected, preserving the old behavior that apps like
+        dicompare depend on.
+
+        Returns a TextResponseTransformer to feed the ``iter_raw()`` body
+        through.  ``omit_etag`` drops the upstream ETag, which does not
+        describe the rewritten bytes, when the response is being stored in
+        the asset cache.
         """
         base_path = self._get_base_path()
-        is_compressed = bool(response.headers.get("content-encoding"))
-
-        # Build rewrite map: list of (old_bytes, new_bytes) tuples
-        rewrite_map = build_path_rewrite_map(config.path_rewrites, base_path)
-
-        # Overlap buffer size: max pattern length - 1 to catch boundary crossings
-        max_pattern_len = max((len(old) for old, _ in rewrite_map), default=0)
-        overlap_size = max(max_pattern_len - 1, 0)
-
-        # For compressed main HTML: decompress (iter_bytes) so we can find
-        # <head> and inject the heartbeat script.  Strip Content-Encoding
-        # since we're sending decompressed bytes.
-        # For everything else: iter_raw preserves original encoding.
-        if is_main_html and is_compressed:
-            omit_ce = True
-            chunk_iter = response.iter_bytes(STREAM_CHUNK_SIZE)
+        upstream_encoding = normalize_content_encoding(response.headers.get("content-encoding"))
+        is_compressed = upstream_encoding is not None
+
+        # Compiled once per (path_rewrites, base_path) and cached
+        rewriter = get_path_rewriter(self.app.config.path_rewrites, base_path)
+
+        decoder = encoder = None
+        if is_compressed:
+            decoder = ContentDecoder(upstream_encoding)
+            output_encoding = self._get_output_encoding()
         else:
-            omit_ce = False
-            chunk_iter = response.iter_raw(STREAM_CHUNK_SIZE)
+            output_encoding = self._compression_encoding(response)
+        if output_encoding is not None:
+            compressor = self.app.compressor
+            encoder = ContentEncoder(
+                output_encoding, compressor.level if compressor is not None else GZIP_COMPRESS_LEVEL
+            )
 
         self._send_response_headers(response, target_port,
                                     omit_content_length=True,
-                                    omit_content_encoding=omit_ce)
-        self.send_header("Transfer-Encoding", "chunked")
+                                    omit_content_encoding=is_compressed,
+                                    omit_etag=omit_etag)
+        if encoder is not None:
+            self._send_content_encoding(response, encoder.encoding)
+        self._send_body_framing()
         self.end_headers()
 
-        def rewrite(data):
-            return apply_path_rewrites(data, rewrite_map)
-
-        def stream_with_overlap(iterator):
-            """Stream chunks with overlap rewriting."""
-            overlap = b""
-            for chunk in iterator:
-                data = overlap + chunk
-                if overlap_size > 0 and len(data) > overlap_size:
-                    to_send = data[:-overlap_size]
-                    overlap = data[-overlap_size:]
-                elif overlap_size > 0:
-                    overlap = data
-                    continue
-                else:
-                    to_send = data
-                    overlap = b""
-                self._write_chunk(rewrite(to_send))
-            if overlap:
-                self._write_chunk(rewrite(overlap))
-
+        inject_bytes = None
         if is_main_html:
-            # Buffer initial data to find <head> and inject script
-            head_buffer = b""
-            HEAD_BUFFER_LIMIT = 4096
-            for chunk in chunk_iter:
-                head_buffer += chunk
-                if b'<head>' in head_buffer or b'<HEAD>' in head_buffer:
-                    break
-                if len(head_buffer) >= HEAD_BUFFER_LIMIT:
-                    break
-
             # Choose injection: full script (base-href + replaceState + heartbeat)
             # for uncompressed content; heartbeat-only for compressed content
             # (replaceState breaks apps like RStudio that read window.location).
-            head_buffer = rewrite(head_buffer)
             if is_compressed:
                 inject_bytes = self._build_heartbeat_only_script(base_path)
             else:
                 inject_bytes = self._build_inject_script(base_path)
-            if b'<head>' in head_buffer:
-                head_buffer = head_buffer.replace(b'<head>', b'<head>' + inject_bytes, 1)
-            elif b'<HEAD>' in head_buffer:
-                head_buffer = head_buffer.replace(b'<HEAD>', b'<HEAD>' + inject_bytes, 1)
 
-            self._write_chunk(head_buffer)
+        return TextResponseTransformer(rewriter, inject_bytes, decoder, encoder)
 
-            # Stream remainder with overlap rewriting
-            stream_with_overlap(chunk_iter)
-        else:
-            # Non-HTML text (JS/CSS): stream with overlap rewriting
-            stream_with_overlap(chunk_iter)
+    def _send_streamed_text_response(self, response, target_port, is_main_html,
+                                     cache_lookup=None):
+        """Stream text response with path rewriting and optional script injection.
 
-        self._end_chunked()
+        With a ``cache_lookup`` the rewritten body is also stored in the
+        asset cache when the response is cacheable.
+        """
+        cache_writer = self._open_asset_cache_writer(response, is_main_html, cache_lookup)
+        transformer = self._begin_text_response(
+            response, target_port, is_main_html, omit_etag=cache_writer is not None
+        )
+
+        rewrite_time = 0.0
+        try:
+            for chunk in response.iter_raw(STREAM_CHUNK_SIZE):
+                started = time.thread_time()
+                segments = transformer.feed(chunk)
+                rewrite_time += time.thread_time() - started
+                self._write_chunk(segments)
+                self._count_response_bytes(sum(len(segment) for segment in segments))
+                if cache_writer is not None:
+                    cache_writer.write(segments)
+            started = time.thread_time()
+            segments = transformer.close()
+            rewrite_time += time.thread_time() - started
+            self._write_chunk(segments)
+            self._count_response_bytes(sum(len(segment) for segment in segments))
+            self._end_chunked()
+        except BaseException:
+            if cache_writer is not None:
+                cache_writer.abort()
+            raise
+        finally:
+            self.app.metrics.add("rewrite_cpu_seconds_total", rewrite_time)
+        if cache_writer is not None:
+            cache_writer.write(segments)
+            cache_writer.commit(response, transformer.content_encoding)
+
+    def _count_response_bytes(self, size):
+        self._response_bytes += size
+        self.app.metrics.add("response_body_bytes_total", size)
+
+    def _lookup_asset_cache(self, method, path, target_url):
+        """Return the asset cache lookup for this request, or None if uncacheable."""
+        if self.app.asset_cache is None or method != "GET" or not self.app.config.path_rewrites:
+            return None
+        if self.headers.get("Range"):
+            return None
+        # Stored bytes are rewritten for one base path and encoded for one coding
+        variant = f"{self._get_base_path()}\0{self._get_output_encoding() or 'identity'}"
+        return self.app.asset_cache.lookup(target_url, variant, path.endswith(STATIC_ASSET_SUFFIXES))
+
+    def _open_asset_cache_writer(self, response, is_main_html, cache_lookup):
+        """Start storing this rewritten response, if it may be cached."""
+        # Main HTML carries the per-request injected script; never cache it
+        if cache_lookup is None or is_main_html or not is_cacheable_asset_response(response):
+            return None
+        return self.app.asset_cache.open_writer(cache_lookup.key)
+
+    def _browser_has_cached_asset(self, entry):
+        """True if the browser's conditional headers match the cached entry."""
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = {tag.strip() for tag in if_none_match.split(",")}
+            return "*" in tags or entry.etag in tags or f"W/{entry.etag}" in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        return bool(if_modified_since) and if_modified_since == entry.upstream_last_modified
+
+    def _begin_cached_asset(self, entry):
+        """Send the headers for a cached asset.
+
+        Returns the open asset file for a 200 response, or None when the
+        browser's copy is current and a 304 was sent instead.
+        """
+        self.app.asset_cache.record_hit()
+        self._request_kind = "cached"
+        if self._browser_has_cached_asset(entry):
+            self.send_response(304)
+            for header, value in entry.headers:
+                if header.lower() in ("cache-control", "expires", "last-modified", "vary"):
+                    self.send_header(header, value)
+            self.send_header("ETag", entry.etag)
+            self.end_headers()
+            return None
+
+        # Open before sending headers so an evicted entry becomes a 502, not
+        # a truncated 200
+        asset_file = open(entry.path, "rb")
+        self.send_response(200)
+        for header, value in entry.headers:
+            self.send_header(header, value)
+        self.send_header("Content-Length", str(entry.size))
+        self.send_header("ETag", entry.etag)
+        self.end_headers()
+        self._count_response_bytes(entry.size)
+        return asset_file
+
+    def _send_cached_asset(self, entry):
+        """Serve a rewritten asset from the cache without touching the backend body."""
+        asset_file = self._begin_cached_asset(entry)
+        if asset_file is None:
+            return
+        with asset_file:
+            # wfile is buffered; the headers must reach the socket first
+            self.wfile.flush()
+            self.connection.sendfile(asset_file)
 
     def _resolve_proxy_target(self):
         """Resolve the current wrapper request to a backend path and port."""
@@ -1226,8 +5342,8 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         query_string = f"?{parsed_url.query}" if parsed_url.query else ""
 
         path = normalized_path
-        target_port = config.target_port
-        for prefix, port in config.routes:
+        target_port = self.app.config.target_port
+        for prefix, port in self.app.config.routes:
             if normalized_path.startswith(prefix):
                 path = normalized_path[len(prefix):] or "/"
                 target_port = port
@@ -1253,33 +5369,108 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         """
         target_path = f"{path}{query_string}"
         try:
-            with socket.create_connection(("localhost", target_port), timeout=10) as upstream:
-                upstream.settimeout(None)
-                self.close_connection = True
+            upstream = socket.create_connection(("localhost", target_port), timeout=10)
+        except OSError as e:
+            self.app.log(f"Upgrade proxy error on port {target_port}: {e}")
+            try:
+                self._send_bad_gateway(b"Backend upgrade unavailable")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+
+        self.close_connection = True
+        try:
+            upstream.settimeout(None)
+            upstream.sendall(self._build_upgrade_request_head(target_path, target_port))
+        except OSError as e:
+            upstream.close()
+            self.app.log(f"Upgrade proxy error on port {target_port}: {e}")
+            return
+        self._tunnel_sockets(upstream, target_path)
+
+    def _send_bad_request(self, body):
+        """Reject a request whose body cannot be read; the connection closes."""
+        self._close_after_response = True
+        if self._response_started:
+            self.close_connection = True
+            return
+        try:
+            self.send_response(400)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def _send_lane_busy_response(self, lane):
+        """Answer a request that gave up waiting for a slot in ``lane``."""
+        self.app.log(f"No {lane.name} lane slot after {LANE_WAIT_SECONDS}s; returning 503")
+        content = json.dumps({
+            "error": f"{self.app.config.title} is busy",
+            "status": "busy",
+        }).encode()
+        self.send_response(503)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("Retry-After", "5")
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    def _send_bad_gateway(self, body):
+        """Send a plain-text 502 response.
+
+        Once a response has started the connection is closed instead, since
+        its framing can no longer be trusted.
+        """
+        if self._response_started:
+            self.close_connection = True
+            return
+        self.send_response(502)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _build_upgrade_request_head(self, target_path, target_port):
+        """Serialize the client's Upgrade request for the backend socket."""
+        request_lines = [
+            f"{self.command} {target_path} {self.request_version}",
+            f"Host: localhost:{target_port}",
+        ]
+        for header, value in self.headers.items():
+            if header.lower() in ("host", "content-length"):
+                continue
+            request_lines.append(f"{header}: {value}")
+        request_lines.append("")
+        request_lines.append("")
+        return "\r\n".join(request_lines).encode("iso-8859-1")
 
-                request_lines = [
-                    f"{self.command} {target_path} {self.request_version}",
-                    f"Host: localhost:{target_port}",
-                ]
-                for header, value in self.headers.items():
-                    if header.lower() in ("host", "content-length"):
-                        continue
-                    request_lines.append(f"{header}: {value}")
-                request_lines.append("")
-                request_lines.append("")
-                upstream.sendall("\r\n".join(request_lines).encode("iso-8859-1"))
-                self._tunnel_sockets(upstream)
-        except OSError as e:
-            log(f"Upgrade proxy error on port {target_port}: {e}")
+    def _tunnel_sockets(self, upstream, label=""):
+        """Hand the client connection and backend socket to the tunnel thread.
+
+        The handler thread returns immediately; the shared TunnelMultiplexer
+        owns both sockets from here on.  Servers that cannot detach a request
+        socket fall back to copying in this thread.
+        """
+        detach_request = getattr(self.server, "detach_request", None)
+        self.app.metrics.add("tunnels_open")
+        if detach_request is None or not hasattr(select, "epoll"):
             try:
-                self.send_response(502)
-                self.send_header("Content-Type", "text/plain")
-                self.end_headers()
-                self.wfile.write(b"Backend upgrade unavailable")
-            except (BrokenPipeError, ConnectionResetError):
-                pass
+                self._copy_sockets_blocking(upstream)
+            finally:
+                self.app.metrics.add("tunnels_open", -1)
+                upstream.close()
+            return
+
+        self.wfile.flush()
+        client = self.connection.dup()
+        detach_request(self.connection)
+        # The multiplexer counts the tunnel and its bytes out when it closes
+        get_tunnel_multiplexer().add(client, upstream, label, self.app)
 
-    def _tunnel_sockets(self, upstream):
+    def _copy_sockets_blocking(self, upstream):
         """Copy raw bytes between the client connection and backend socket."""
         sockets = [self.connection, upstream]
 
@@ -1306,11 +5497,13 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
                     destination.sendall(data)
                 except (BrokenPipeError, ConnectionResetError, OSError):
                     return
+                direction = 'direction="up"' if source is self.connection else 'direction="down"'
+                self.app.metrics.add("tunnel_bytes_total", len(data), direction)
 
     def _is_jamovi_config_request(self):
         return (
-            config.app_name == "jamovi"
-            and self._get_normalized_path() == f"/{config.app_name}/config.js"
+            self.app.config.app_name == "jamovi"
+            and self._get_normalized_path() == f"/{self.app.config.app_name}/config.js"
         )
 
     def _build_jamovi_config_js(self):
@@ -1343,20 +5536,149 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
         while remaining:
             chunk = self.rfile.read(min(STREAM_CHUNK_SIZE, remaining))
             if not chunk:
+                self.close_connection = True
                 raise ConnectionError(
                     f"Client request body ended with {remaining} bytes remaining"
                 )
             remaining -= len(chunk)
+            self._request_body_remaining = remaining
+            yield chunk
+
+    def _iter_chunked_request_body(self):
+        """Yield the decoded bytes of a chunked request body in bounded chunks.
+
+        Chunk extensions and trailer fields are read and dropped; malformed
+        framing raises RequestFramingError.
+        """
+        while True:
+            size = parse_chunk_size_line(self.rfile.readline(CHUNK_LINE_LIMIT + 1))
+            if size == 0:
+                break
+            while size:
+                chunk = self.rfile.read(min(STREAM_CHUNK_SIZE, size))
+                if not chunk:
+                    self.close_connection = True
+                    raise ConnectionError(f"Client request body ended with {size} chunk bytes remaining")
+                size -= len(chunk)
+                yield chunk
+            if self.rfile.read(2) != b"\r\n":
+                raise RequestFramingError("Chunk data is not followed by CRLF")
+
+        for _ in range(CHUNK_TRAILER_LIMIT + 1):
+            if is_last_trailer_line(self.rfile.readline(CHUNK_LINE_LIMIT + 1)):
+                self._chunked_body_pending = False
+                return
+        raise RequestFramingError("Too many trailer fields")
+
+    def _get_request_body(self):
+        """Return ``(content_length, body)`` for streaming the request body on.
+
+        A chunked body is decoded and sent on chunked (content_length None);
+        a fixed-length one keeps its length.  body is None without either.
+        """
+        transfer_encoding = self.headers.get("Transfer-Encoding")
+        if transfer_encoding is not None and is_chunked_transfer_encoding(transfer_encoding):
+            return None, self._count_request_body(self._iter_chunked_request_body())
+        content_length = self._get_request_content_length()
+        if content_length is None:
+            return None, None
+        return content_length, self._count_request_body(self._iter_request_body(content_length))
+
+    def _count_request_body(self, body):
+        metrics = self.app.metrics
+        for chunk in body:
+            metrics.add("request_body_bytes_total", len(chunk))
             yield chunk
 
+    def _get_request_content_length(self):
+        """Return the validated request Content-Length, or None if absent."""
+        content_length_header = self.headers.get("Content-Length")
+        if content_length_header is None:
+            return None
+        content_length = int(content_length_header)
+        if content_length < 0:
+            raise ValueError("Content-Length must not be negative")
+        return content_length
+
+    def _build_proxy_headers(self, content_length):
+        """Copy relevant headers for the backend (preserve duplicates like Cookie)."""
+        proxy_headers = [
+            (h, v) for h, v in self.headers.items()
+            if h.lower() not in ("host", "content-length", "transfer-encoding")
+        ]
+        if content_length is not None:
+            # An iterable request body would otherwise make httpx use
+            # chunked transfer encoding. Preserve the browser's validated
+            # length so backends that require fixed-length uploads work.
+            proxy_headers.append(("Content-Length", str(content_length)))
+        return proxy_headers
+
+    def _select_response_handling(self, response, is_main_html):
+        """Decide how a backend response is sent on to the browser.
+
+        Returns "jamovi_config", "main_html" (path rewriting plus base href
+        injection), "text" (path rewriting only), "compressed" (compression
+        on the fly) or "raw".
+        """
+        content_type = response.headers.get("content-type", "")
+
+        # Determine what processing is needed:
+        # - Path rewriting: for text responses that may contain hard-coded paths
+        # - Base href injection: for main HTML page
+        needs_path_rewrite = (
+            self.app.config.path_rewrites and
+            any(ct in content_type for ct in ["text/html", "text/javascript", "application/javascript", "text/css"])
+        )
+        needs_base_href = is_main_html and "text/html" in content_type
+
+        if self._is_jamovi_config_request() and response.status_code == 200:
+            return "jamovi_config"
+        if not self._response_has_body(response.status_code):
+            return "raw"
+        # Bodies in a coding we cannot decode (zstd, or br without the
+        # brotli module) are passed through untouched rather than corrupted
+        encoding = normalize_content_encoding(response.headers.get("content-encoding"))
+        if encoding is not None and encoding not in CONTENT_ENCODINGS:
+            return "raw"
+        if needs_base_href:
+            return "main_html"
+        if needs_path_rewrite:
+            return "text"
+        if self._compression_encoding(response) is not None:
+            return "compressed"
+        return "raw"
+
+    def _choose_lane(self, method, path):
+        """Return the lane this request waits in, or None without lanes."""
+        if self.app.lanes is None:
+            return None
+        return self.app.lanes.classify(method, path, self.headers)
+
+    def _settle_lane(self, path, response):
+        """Move the request to the bulk lane if its response turned out bulk."""
+        if self._lane is not None:
+            self._lane = self.app.lanes.settle(self._lane, path, response.headers)
+
+    def _record_upstream_response(self, sent_at):
+        """Add the backend's time to response headers to the TTFB histogram."""
+        self._upstream_ttfb = time.perf_counter() - sent_at
+        self.app.metrics.observe("upstream_ttfb_seconds", self._upstream_ttfb)
+
+    def _release_lane(self):
+        lane, self._lane = self._lane, None
+        if lane is not None:
+            self.app.lanes.release(lane)
+
     def _proxy_request(self, method):
         """Proxy request to the actual webapp server."""
-        target_port = config.target_port
+        target_port = self.app.config.target_port
+        cache_lookup = None
         try:
             path, query_string, target_port = self._resolve_proxy_target()
             is_main_html = self._is_main_app_html()
 
             if self._is_upgrade_request():
+                self._request_kind = "upgrade"
                 self._proxy_upgrade_request(path, query_string, target_port)
                 return
 
@@ -1365,88 +5687,987 @@ class WebappHandler(http.server.BaseHTTPRequestHandler):
 
             # Stream request bodies to the backend instead of buffering the
             # complete upload in the wrapper process.
-            content_length_header = self.headers.get("Content-Length")
-            content_length = None
-            body = None
-            if content_length_header is not None:
-                content_length = int(content_length_header)
-                if content_length < 0:
-                    raise ValueError("Content-Length must not be negative")
-                body = self._iter_request_body(content_length)
-
-            # Copy relevant headers (preserve duplicates like Cookie)
-            proxy_headers = [
-                (h, v) for h, v in self.headers.items()
-                if h.lower() not in ("host", "content-length")
-            ]
-            if content_length is not None:
-                # An iterable request body would otherwise make httpx use
-                # chunked transfer encoding. Preserve the browser's validated
-                # length so backends that require fixed-length uploads work.
-                proxy_headers.append(("Content-Length", str(content_length)))
+            content_length, body = self._get_request_body()
+            proxy_headers = self._build_proxy_headers(content_length)
+
+            # Rewritten assets are served from the on-disk cache after a
+            # conditional request to the backend; a request racing another
+            # fetch of the same static asset waits for it instead.
+            cache_lookup = self._lookup_asset_cache(method, path, target_url)
+            if cache_lookup is not None:
+                if cache_lookup.following and cache_lookup.wait_for_fill() is not None:
+                    self._send_cached_asset(cache_lookup.entry)
+                    return
+                proxy_headers = cache_lookup.conditional_headers(proxy_headers)
+
+            # Wait for a slot in the request's lane; bulk transfers use
+            # their own backend pool
+            lane = self._choose_lane(method, path)
+            if lane is not None:
+                if not lane.acquire(LANE_WAIT_SECONDS):
+                    self._send_lane_busy_response(lane)
+                    return
+                self._lane = lane
+            if lane is not None and lane is self.app.lanes.bulk:
+                client = _bulk_http_client
+            else:
+                client = _http_client
 
             # As a transparent proxy we must only forward the browser's cookies
             # (already in proxy_headers), not cookies httpx accumulated from
             # previous backend responses.  Clear the jar before each request.
-            _http_client.cookies.clear()
+            client.cookies.clear()
 
             # httpx returns 3xx directly (no exception), simplifying redirect handling
-            with _http_client.stream(method, target_url, headers=proxy_headers, content=body) as response:
-                content_type = response.headers.get("content-type", "")
-
-                # Determine what processing is needed:
-                # - Path rewriting: for text responses that may contain hard-coded paths
-                # - Base href injection: for main HTML page
-                needs_path_rewrite = (
-                    config.path_rewrites and
-                    any(ct in content_type for ct in ["text/html", "text/javascript", "application/javascript", "text/css"])
+            sent_at = time.perf_counter()
+            with client.stream(method, target_url, headers=proxy_headers, content=body) as response:
+                self._record_upstream_response(sent_at)
+                self._settle_lane(path, response)
+                if cache_lookup is not None and cache_lookup.entry is not None and response.status_code == 304:
+                    self._send_cached_asset(cache_lookup.entry)
+                    return
+                handling = self._select_response_handling(response, is_main_html)
+                self._request_kind = "proxied" if handling in ("raw", "compressed") else "rewritten"
+                if handling == "jamovi_config":
+                    self._send_jamovi_config_response(response, target_port)
+                elif handling == "main_html":
+                    self._send_streamed_text_response(response, target_port, True)
+                elif handling == "text":
+                    self._send_streamed_text_response(response, target_port, False, cache_lookup)
+                elif handling == "compressed":
+                    self._send_compressed_response(response, target_port)
+                else:
+                    self._send_streamed_response(response, target_port)
+
+        except RequestFramingError as e:
+            self.app.log(f"Rejected request body: {e}")
+            self._send_bad_request(str(e).encode())
+        except httpx.ConnectError:
+            self.app.log(f"Cannot connect to backend on port {target_port}")
+            try:
+                self._send_bad_gateway(b"Backend unavailable")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        except (BrokenPipeError, ConnectionResetError):
+            self.app.log("Client disconnected during proxying")
+            self.close_connection = True
+        except Exception as e:
+            self.app.log(f"Proxy error: {e}")
+            try:
+                self._send_bad_gateway(f"Proxy error: {e}".encode())
+            except (BrokenPipeError, ConnectionResetError):
+                self.app.log("Client disconnected before error response could be sent")
+        finally:
+            self._release_lane()
+            if cache_lookup is not None:
+                cache_lookup.release()
+
+
+class _TransportWriter:
+    """File-like ``wfile`` that writes into an asyncio transport buffer.
+
+    Lets AsyncWebappHandler reuse the synchronous send_response/end_headers
+    helpers of BaseHTTPRequestHandler; the async paths await ``drain()``
+    on the underlying StreamWriter for backpressure.
+    """
+
+    def __init__(self, writer):
+        self._writer = writer
+
+    def write(self, data):
+        self._writer.write(data)
+        return len(data)
+
+    def writelines(self, segments):
+        self._writer.writelines(segments)
+
+    def flush(self):
+        pass
+
+
+class AsyncWebappHandler(WebappHandler):
+    """asyncio counterpart of WebappHandler for ``server_mode: asyncio``.
+
+    Request parsing, routing, status, splash, header and rewrite helpers are
+    inherited unchanged; only the paths that block on the network (body
+    streaming, backend requests and WebSocket tunnels) have async versions.
+    """
+
+    # Request line and header block limits (mirror http.server/http.client)
+    MAX_REQUEST_LINE = 65536
+    MAX_HEADER_LINES = 100
+
+    def __init__(self, reader, writer, server):
+        # BaseHTTPRequestHandler.__init__ would run the blocking handle()
+        # loop, so set up only the attributes the shared helpers use.
+        self.reader = reader
+        self.writer = writer
+        self.server = server
+        self.app = server.app
+        self.client_address = ("", 0)
+        self.wfile = _TransportWriter(writer)
+        self.close_connection = True
+
+    async def _drain(self):
+        await self.writer.drain()
+
+    def _write_segments(self, segments):
+        # The transport gathers the segments itself when it sends them
+        self.wfile.writelines(segments)
+
+    def _peer_socket(self):
+        return self.writer.get_extra_info("socket")
+
+    def _backend_clients(self):
+        return {"interactive": self.server.http_client, "bulk": self.server.bulk_http_client}
+
+    async def _read_request_head(self):
+        """Read the request line and headers; False if the client went away.
+
+        Waits at most keepalive_timeout for the request line and headers
+        together, so a client trickling header lines cannot hold the
+        connection open indefinitely.
+        """
+        try:
+            return await asyncio.wait_for(self._receive_request_head(), self.app.config.keepalive_timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def _receive_request_head(self):
+        self.raw_requestline = await self.reader.readline()
+        if not self.raw_requestline:
+            return False
+        if len(self.raw_requestline) > self.MAX_REQUEST_LINE:
+            self.requestline = ""
+            self.request_version = ""
+            self.command = ""
+            self.send_error(414)
+            return False
+
+        header_lines = []
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                return False
+            header_lines.append(line)
+            if line in (b"\r\n", b"\n"):
+                break
+            if len(header_lines) > self.MAX_HEADER_LINES:
+                self.send_error(431, "Too many headers")
+                return False
+
+        # parse_request() reads headers from rfile with http.client, so hand
+        # it the block that has already been received.
+        self.rfile = io.BytesIO(b"".join(header_lines))
+        return self.parse_request()
+
+    async def handle_connection(self):
+        """Serve requests on this connection until either side closes it."""
+        try:
+            while True:
+                if not await self._read_request_head():
+                    return
+                method = self.command
+                if not hasattr(self, f"do_{method}"):
+                    self.send_error(501, f"Unsupported method ({method!r})")
+                    return
+                self._begin_request()
+                try:
+                    await self._handle_request_async(method)
+                finally:
+                    await self._finish_request_body_async()
+                    self._record_request()
+                await self._drain()
+                if self.close_connection:
+                    return
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+
+    async def _finish_request_body_async(self):
+        """Event-loop version of _finish_request_body()."""
+        remaining = self._request_body_remaining
+        if self._chunked_body_pending:
+            self.close_connection = True
+        if not remaining or self.close_connection:
+            return
+        if remaining > KEEPALIVE_DRAIN_LIMIT:
+            self.close_connection = True
+            return
+        try:
+            await self.reader.readexactly(remaining)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            self.close_connection = True
+        self._request_body_remaining = 0
+
+    async def _handle_request_async(self, method):
+        # Same flow as WebappHandler._dispatch_request.
+        if self._is_status_endpoint() and method == "POST" and self._is_close_beacon():
+            self._send_status(method, is_close=True)
+            return
+
+        if self._is_metrics_endpoint() and method in ("GET", "HEAD"):
+            self._send_metrics(method)
+            return
+
+        if self._is_prestart_endpoint() and method == "POST":
+            self._send_prestart()
+            return
+
+        if self._is_logs_endpoint() and method in ("GET", "HEAD"):
+            if self._is_logs_stream_request(method):
+                await self._send_event_stream_async(OutputTailStream(self.app, self._logs_tail_lines()))
+            else:
+                self._send_logs(method)
+            return
+
+        if self._is_profile_endpoint() and method == "GET":
+            profile = self._profile_request()
+            if profile is not None:
+                self._send_profile(await asyncio.to_thread(self.app.profiler.run, *profile))
+            return
+
+        self.app.begin_client_request()
+
+        try:
+            if self._is_status_endpoint():
+                if self._is_status_stream_request(method):
+                    await self._send_event_stream_async(StatusEventStream(self.app))
+                else:
+                    self._send_status(method)
+                return
+
+            if self.app.container_frozen_by is not None:
+                # Thawing a cgroup waits for the kernel to confirm; keep the loop serving
+                await asyncio.to_thread(self.app.thaw_backend, "incoming web request")
+
+            if not self.app.container_ready:
+                self.app.ensure_container_starting("incoming web request")
+
+            if self.app.container_ready:
+                await self._proxy_request_async(method)
+                return
+
+            if method == "GET" and self._is_root_path():
+                self._serve_splash()
+                return
+
+            if await self.server.wait_for_container_ready(REQUEST_READY_WAIT_SECONDS):
+                await self._proxy_request_async(method)
+                return
+
+            self._send_loading_response()
+        finally:
+            self.app.end_client_request()
+
+    async def _send_event_stream_async(self, stream):
+        """Event-loop version of _send_event_stream()."""
+        self._begin_event_stream()
+        try:
+            while True:
+                # Take the change event before polling so no notification is lost
+                changed = self.server.container_state_event
+                frames = stream.poll()
+                self.wfile.write(b"".join(frames) or b": keepalive\n\n")
+                await self._drain()
+                if stream.finished:
+                    return
+                try:
+                    await asyncio.wait_for(changed.wait(), STATUS_STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    async def _iter_request_body_async(self, content_length):
+        """Yield exactly ``content_length`` request bytes in bounded chunks."""
+        remaining = content_length
+        while remaining:
+            chunk = await self.reader.read(min(STREAM_CHUNK_SIZE, remaining))
+            if not chunk:
+                self.close_connection = True
+                raise ConnectionError(
+                    f"Client request body ended with {remaining} bytes remaining"
                 )
-                needs_base_href = is_main_html and "text/html" in content_type
+            remaining -= len(chunk)
+            self._request_body_remaining = remaining
+            yield chunk
+
+    async def _iter_chunked_request_body_async(self):
+        """Event-loop version of _iter_chunked_request_body()."""
+        while True:
+            size = parse_chunk_size_line(await self._read_body_line())
+            if size == 0:
+                break
+            while size:
+                chunk = await self.reader.read(min(STREAM_CHUNK_SIZE, size))
+                if not chunk:
+                    self.close_connection = True
+                    raise ConnectionError(f"Client request body ended with {size} chunk bytes remaining")
+                size -= len(chunk)
+                yield chunk
+            if await self._read_body_line() != b"\r\n":
+                raise RequestFramingError("Chunk data is not followed by CRLF")
+
+        for _ in range(CHUNK_TRAILER_LIMIT + 1):
+            if is_last_trailer_line(await self._read_body_line()):
+                self._chunked_body_pending = False
+                return
+        raise RequestFramingError("Too many trailer fields")
+
+    async def _read_body_line(self):
+        """Read one chunk-size or trailer line of a chunked request body."""
+        try:
+            return await self.reader.readuntil(b"\n")
+        except asyncio.IncompleteReadError as e:
+            return e.partial
+        except asyncio.LimitOverrunError:
+            raise RequestFramingError("Chunked body line is too long") from None
+
+    def _get_request_body_async(self):
+        """Event-loop version of _get_request_body()."""
+        transfer_encoding = self.headers.get("Transfer-Encoding")
+        if transfer_encoding is not None and is_chunked_transfer_encoding(transfer_encoding):
+            return None, self._count_request_body_async(self._iter_chunked_request_body_async())
+        content_length = self._get_request_content_length()
+        if content_length is None:
+            return None, None
+        return content_length, self._count_request_body_async(self._iter_request_body_async(content_length))
+
+    async def _count_request_body_async(self, body):
+        metrics = self.app.metrics
+        async for chunk in body:
+            metrics.add("request_body_bytes_total", len(chunk))
+            yield chunk
+
+    async def _send_streamed_response_async(self, response, target_port):
+        """Stream a binary/non-rewritable response, preserving its encoding."""
+        framed = self._begin_streamed_response(response, target_port)
+        if not self._response_has_body(response.status_code):
+            return
+        async for chunk in response.aiter_raw(STREAM_CHUNK_SIZE):
+            if framed:
+                self._write_segments([chunk])
+            else:
+                self._write_chunk(chunk)
+            self._count_response_bytes(len(chunk))
+            await self._drain()
+            delay = self._bulk_delay(len(chunk))
+            if delay:
+                await asyncio.sleep(delay)
+        if not framed:
+            self._end_chunked()
+
+    async def _send_compressed_response_async(self, response, target_port):
+        """Event-loop version of _send_compressed_response()."""
+        encoder = self._begin_compressed_response(response, target_port)
+        async for chunk in response.aiter_raw(STREAM_CHUNK_SIZE):
+            data = encoder.compress([chunk])
+            self._write_chunk(data)
+            self._count_compressed_bytes(len(chunk), len(data))
+            await self._drain()
+            delay = self._bulk_delay(len(data))
+            if delay:
+                await asyncio.sleep(delay)
+        data = encoder.compress([], final=True)
+        self._write_chunk(data)
+        self._count_compressed_bytes(0, len(data))
+        self._end_chunked()
+
+    async def _send_streamed_text_response_async(self, response, target_port, is_main_html,
+                                                 cache_lookup=None):
+        """Stream a text response with path rewriting and optional injection."""
+        cache_writer = self._open_asset_cache_writer(response, is_main_html, cache_lookup)
+        transformer = self._begin_text_response(
+            response, target_port, is_main_html, omit_etag=cache_writer is not None
+        )
+
+        rewrite_time = 0.0
+        try:
+            async for chunk in response.aiter_raw(STREAM_CHUNK_SIZE):
+                started = time.thread_time()
+                segments = transformer.feed(chunk)
+                rewrite_time += time.thread_time() - started
+                self._write_chunk(segments)
+                self._count_response_bytes(sum(len(segment) for segment in segments))
+                if cache_writer is not None:
+                    cache_writer.write(segments)
+                await self._drain()
+            started = time.thread_time()
+            segments = transformer.close()
+            rewrite_time += time.thread_time() - started
+            self._write_chunk(segments)
+            self._count_response_bytes(sum(len(segment) for segment in segments))
+            self._end_chunked()
+        except BaseException:
+            if cache_writer is not None:
+                cache_writer.abort()
+            raise
+        finally:
+            self.app.metrics.add("rewrite_cpu_seconds_total", rewrite_time)
+        if cache_writer is not None:
+            cache_writer.write(segments)
+            cache_writer.commit(response, transformer.content_encoding)
+
+    async def _send_cached_asset_async(self, entry):
+        """Serve a cached asset, letting the event loop sendfile() the body."""
+        asset_file = self._begin_cached_asset(entry)
+        if asset_file is None:
+            return
+        with asset_file:
+            await self._drain()
+            await asyncio.get_running_loop().sendfile(self.writer.transport, asset_file)
+
+    async def _proxy_upgrade_request_async(self, path, query_string, target_port):
+        """Tunnel an HTTP Upgrade request to the backend on the event loop."""
+        target_path = f"{path}{query_string}"
+        self.close_connection = True
+        try:
+            upstream_reader, upstream_writer = await asyncio.wait_for(
+                asyncio.open_connection("localhost", target_port), timeout=10
+            )
+        except (OSError, asyncio.TimeoutError) as e:
+            self.app.log(f"Upgrade proxy error on port {target_port}: {e}")
+            try:
+                self._send_bad_gateway(b"Backend upgrade unavailable")
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            return
+
+        try:
+            upstream_writer.write(self._build_upgrade_request_head(target_path, target_port))
+            await upstream_writer.drain()
+            await self._tunnel_sockets_async(upstream_reader, upstream_writer)
+        except OSError as e:
+            self.app.log(f"Upgrade proxy error on port {target_port}: {e}")
+        finally:
+            upstream_writer.close()
+
+    async def _tunnel_sockets_async(self, upstream_reader, upstream_writer):
+        """Copy raw bytes both ways until either side closes."""
+        metrics = self.app.metrics
+
+        async def pump(reader, writer, direction):
+            try:
+                while True:
+                    data = await reader.read(STREAM_CHUNK_SIZE)
+                    if not data:
+                        return
+                    writer.write(data)
+                    metrics.add("tunnel_bytes_total", len(data), direction)
+                    await writer.drain()
+            except (ConnectionError, OSError):
+                return
 
-                if self._is_jamovi_config_request() and response.status_code == 200:
+        pumps = [
+            asyncio.ensure_future(pump(self.reader, upstream_writer, 'direction="up"')),
+            asyncio.ensure_future(pump(upstream_reader, self.writer, 'direction="down"')),
+        ]
+        metrics.add("tunnels_open")
+        try:
+            await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            metrics.add("tunnels_open", -1)
+            for task in pumps:
+                task.cancel()
+            await asyncio.gather(*pumps, return_exceptions=True)
+
+    async def _proxy_request_async(self, method):
+        """Proxy request to the actual webapp server (asyncio engine)."""
+        target_port = self.app.config.target_port
+        cache_lookup = None
+        try:
+            path, query_string, target_port = self._resolve_proxy_target()
+            is_main_html = self._is_main_app_html()
+
+            if self._is_upgrade_request():
+                self._request_kind = "upgrade"
+                await self._proxy_upgrade_request_async(path, query_string, target_port)
+                return
+
+            target_url = f"http://localhost:{target_port}{path}{query_string}"
+
+            content_length, body = self._get_request_body_async()
+            proxy_headers = self._build_proxy_headers(content_length)
+
+            cache_lookup = self._lookup_asset_cache(method, path, target_url)
+            if cache_lookup is not None:
+                if cache_lookup.following and await asyncio.to_thread(cache_lookup.wait_for_fill):
+                    await self._send_cached_asset_async(cache_lookup.entry)
+                    return
+                proxy_headers = cache_lookup.conditional_headers(proxy_headers)
+
+            lane = self._choose_lane(method, path)
+            if lane is not None:
+                if not await lane.acquire_async(LANE_WAIT_SECONDS):
+                    self._send_lane_busy_response(lane)
+                    return
+                self._lane = lane
+            if lane is not None and lane is self.app.lanes.bulk:
+                client = self.server.bulk_http_client
+            else:
+                client = self.server.http_client
+            client.cookies.clear()
+
+            sent_at = time.perf_counter()
+            async with client.stream(method, target_url, headers=proxy_headers, content=body) as response:
+                self._record_upstream_response(sent_at)
+                self._settle_lane(path, response)
+                if cache_lookup is not None and cache_lookup.entry is not None and response.status_code == 304:
+                    await self._send_cached_asset_async(cache_lookup.entry)
+                    return
+                handling = self._select_response_handling(response, is_main_html)
+                self._request_kind = "proxied" if handling in ("raw", "compressed") else "rewritten"
+                if handling == "jamovi_config":
                     self._send_jamovi_config_response(response, target_port)
-                elif needs_path_rewrite or needs_base_href:
-                    self._send_streamed_text_response(response, target_port, needs_base_href)
+                elif handling == "main_html":
+                    await self._send_streamed_text_response_async(response, target_port, True)
+                elif handling == "text":
+                    await self._send_streamed_text_response_async(
+                        response, target_port, False, cache_lookup
+                    )
+                elif handling == "compressed":
+                    await self._send_compressed_response_async(response, target_port)
                 else:
-                    self._send_streamed_response(response, target_port)
+                    await self._send_streamed_response_async(response, target_port)
 
+        except RequestFramingError as e:
+            self.app.log(f"Rejected request body: {e}")
+            self._send_bad_request(str(e).encode())
         except httpx.ConnectError:
-            log(f"Cannot connect to backend on port {target_port}")
+            self.app.log(f"Cannot connect to backend on port {target_port}")
             try:
-                self.send_response(502)
-                self.send_header("Content-Type", "text/plain")
-                self.end_headers()
-                self.wfile.write(b"Backend unavailable")
+                self._send_bad_gateway(b"Backend unavailable")
             except (BrokenPipeError, ConnectionResetError):
                 pass
         except (BrokenPipeError, ConnectionResetError):
-            log("Client disconnected during proxying")
+            self.app.log("Client disconnected during proxying")
+            self.close_connection = True
         except Exception as e:
-            log(f"Proxy error: {e}")
+            self.app.log(f"Proxy error: {e}")
             try:
-                self.send_response(502)
-                self.send_header("Content-Type", "text/plain")
-                self.end_headers()
-                self.wfile.write(f"Proxy error: {e}".encode())
+                self._send_bad_gateway(f"Proxy error: {e}".encode())
             except (BrokenPipeError, ConnectionResetError):
-                log("Client disconnected before error response could be sent")
+                self.app.log("Client disconnected before error response could be sent")
+        finally:
+            self._release_lane()
+            if cache_lookup is not None:
+                cache_lookup.release()
+
+
+class AsyncUnixSocketHTTPServer:
+    """Unix-socket HTTP server running every connection on one event loop.
+
+    Exposes the serve_forever/shutdown/server_close surface of
+    socketserver so WebappDaemon drives both engines alike.  The socket is
+    bound on construction.
+    """
+
+    def __init__(self, socket_path, app, handler_class=AsyncWebappHandler):
+        self.socket_path = socket_path
+        self.app = app
+        self.handler_class = handler_class
+        self.loop = asyncio.new_event_loop()
+        self.http_client = None
+        self.bulk_http_client = None
+        self.container_state_event = None
+        self._stopped = None
+        self._server = self.loop.run_until_complete(self._start())
+        app.container_state_watchers.append(self._on_container_state)
+
+    async def _start(self):
+        self._stopped = asyncio.Event()
+        self.container_state_event = asyncio.Event()
+        self.http_client = _create_async_http_client()
+        self.bulk_http_client = _create_async_http_client(BULK_POOL_CONNECTIONS)
+        return await asyncio.start_unix_server(
+            self._handle_connection,
+            path=self.socket_path,
+            limit=AsyncWebappHandler.MAX_REQUEST_LINE + 2,
+        )
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            await self.handler_class(reader, writer, self).handle_connection()
+        except asyncio.CancelledError:
+            # server_close() cancels idle keep-alive connections; ending the
+            # task normally stops asyncio logging each one as an error
+            pass
+
+    def _on_container_state(self):
+        # Runs on whichever thread changed the state
+        try:
+            self.loop.call_soon_threadsafe(self._container_state_changed)
+        except RuntimeError:
+            pass  # Loop already closed
+
+    def _container_state_changed(self):
+        # Wake current waiters; later ones wait on a fresh event
+        changed = self.container_state_event
+        self.container_state_event = asyncio.Event()
+        changed.set()
+
+    async def wait_for_container_ready(self, timeout):
+        """Event-loop version of wait_for_container_ready()."""
+        app = self.app
+        deadline = self.loop.time() + timeout
+        while True:
+            changed = self.container_state_event
+            if app.container_ready or app.container_error or app.shutdown_event.is_set():
+                return app.container_ready
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                return False
+            try:
+                await asyncio.wait_for(changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                return app.container_ready
+
+    async def _serve(self):
+        async with self._server:
+            await self._stopped.wait()
+
+    def serve_forever(self):
+        self.loop.run_until_complete(self._serve())
+
+    def shutdown(self):
+        """Stop serve_forever(); safe to call from any thread."""
+        self.loop.call_soon_threadsafe(self._stopped.set)
+
+    def recycle_http_client(self):
+        """Swap the backend clients so idle pooled connections are closed."""
+        async def swap():
+            old_clients = (self.http_client, self.bulk_http_client)
+            self.http_client = _create_async_http_client()
+            self.bulk_http_client = _create_async_http_client(BULK_POOL_CONNECTIONS)
+            for old_client in old_clients:
+                await old_client.aclose()
+
+        if not self.loop.is_closed():
+            asyncio.run_coroutine_threadsafe(swap(), self.loop)
+
+    def server_close(self):
+        async def close():
+            self._server.close()
+            tasks = [
+                task for task in asyncio.all_tasks()
+                if task is not asyncio.current_task()
+            ]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.http_client.aclose()
+            await self.bulk_http_client.aclose()
+
+        if self.loop.is_closed():
+            return
+        watchers = self.app.container_state_watchers
+        if self._on_container_state in watchers:
+            watchers.remove(self._on_container_state)
+        self.loop.run_until_complete(close())
+        self.loop.close()
+
+
+class DaemonControlHandler(socketserver.StreamRequestHandler):
+    """One launcher attachment on the daemon's control socket.
+
+    The launcher sends ``attach <app>`` and gets ``ok`` or ``error <reason>``
+    back, then holds the connection open for as long as jupyter-server-proxy
+    keeps it running.  EOF detaches it.
+    """
+
+    def handle(self):
+        request = self.rfile.readline().decode("utf-8", "replace").split()
+        if len(request) != 2 or request[0] != "attach":
+            self.wfile.write(b"error expected: attach <app_name>\n")
+            return
+        try:
+            app = self.server.webapp_daemon.get_app(request[1])
+        except (FileNotFoundError, ValueError, OSError) as e:
+            self.wfile.write(f"error {e}\n".encode("utf-8"))
+            return
+
+        app.attach()
+        try:
+            self.wfile.write(b"ok\n")
+            while self.rfile.read(1024):
+                pass
+        except OSError:
+            pass
+        finally:
+            app.detach()
+
+
+class DaemonControlServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Control socket that launchers attach to; one thread per attachment."""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, webapp_daemon):
+        self.webapp_daemon = webapp_daemon
+        super().__init__(socket_path, DaemonControlHandler)
+
+
+class WebappDaemon:
+    """Serve one or more webapps from this process.
+
+    Each app's Unix socket gets its own server bound to the app's
+    WebappApp.  The backend HTTP client pool, the tunnel thread and the idle
+    scheduler are shared, so an extra app costs a few threads rather than a
+    Python process.  With a control socket, launchers attach to start an
+    app's backend and the last one to detach stops it.
+    """
+
+    def __init__(self, webapps=None, control_path=None):
+        self.webapps = webapps
+        self.control_path = control_path
+        self.apps = {}
+        self.shutdown_event = threading.Event()
+        self._apps_lock = threading.Lock()
+        self._threads = {}
+        self._control = None
+        self.launch_history = create_launch_history()
+
+    def _start_thread(self, key, target):
+        thread = threading.Thread(target=target, name=key, daemon=True)
+        self._threads[key] = thread
+        thread.start()
+
+    def add_app(self, config):
+        """Bind the app's socket and start serving it; returns its WebappApp."""
+        app = WebappApp(config)
+        app.log("=" * 50)
+        app.log(f"{config.title} Wrapper Server starting")
+        app.log(f"  Socket: {config.socket_path}")
+        app.log(f"  Target port: {config.target_port}")
+        app.log(f"  Start page: {config.start_page}")
+        app.log(f"  Idle timeout: {config.idle_timeout}s")
+        app.log(f"  Heartbeat interval: {config.heartbeat_interval}s")
+        app.log(f"  Server mode: {config.server_mode}")
+        app.log(f"  Idle action: {config.idle_action}")
+        app.log(f"  Launch mode: {config.launch_mode}")
+        app.log(f"  Asset cache: {config.asset_cache_mb} MiB")
+        app.log(f"  Compression: level {config.compression_level}, >= {config.compression_min_bytes} bytes, "
+                f"off above {config.compression_cpu_percent}% CPU")
+        app.log(f"  Bulk lane: {config.bulk_max_connections} connections, "
+                f">= {config.bulk_threshold_mb} MiB, paced to {config.bulk_rate_mb} MiB/s")
+        if config.idle_timeout > 0 and config.idle_timeout < config.heartbeat_interval:
+            app.log(f"  WARNING: idle_timeout ({config.idle_timeout}s) < heartbeat_interval "
+                    f"({config.heartbeat_interval}s); backend may stop between heartbeats")
+
+        app.asset_cache = app.create_asset_cache()
+        app.launch_plans = app.create_launch_plan_store()
+        app.lanes = app.create_proxy_lanes()
+        app.compressor = app.create_response_compressor()
+        app.profiler = _wrapper_profiler if config.profiling else None
+        app.access_logfile = config.access_logfile
+        app.launch_history = self.launch_history
+
+        # Remove existing socket file if present (needed to bind)
+        socket_path = config.socket_path
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        # Create and bind to socket
+        if config.server_mode == "asyncio":
+            httpd = AsyncUnixSocketHTTPServer(socket_path, app)
+        else:
+            httpd = UnixSocketHTTPServer(socket_path, WebappHandler, app=app)
+        app.httpd_server = httpd
+        os.chmod(socket_path, 0o666)
+        app.log(f"Bound to Unix socket: {socket_path}")
+        app.last_client_activity = time.time()
+        app.log_idle_settings()
+        app.next_idle_check = time.time() + config.idle_check_interval
+
+        self.apps[config.app_name] = app
+        self._start_thread(f"serve-{config.app_name}", httpd.serve_forever)
+        app.log(f"Serving on Unix socket: {socket_path}")
+        return app
+
+    def get_app(self, app_name):
+        """Return the named app, loading it from webapps.json on first use."""
+        with self._apps_lock:
+            app = self.apps.get(app_name)
+            if app is None:
+                if self.shutdown_event.is_set():
+                    raise ValueError("webapp daemon is shutting down")
+                app = self.add_app(WebappConfig(app_name))
+                log(f"Added webapp {app_name}")
+            return app
+
+    def start_control_socket(self):
+        private_directory(Path(self.control_path).parent)
+        if os.path.exists(self.control_path):
+            os.unlink(self.control_path)
+        # Owner-only from the moment bind() creates it, not just after the chmod
+        old_umask = os.umask(0o077)
+        try:
+            self._control = DaemonControlServer(self.control_path, self)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.control_path, 0o600)
+        self._start_thread("control", self._control.serve_forever)
+        log(f"Listening for launchers on {self.control_path}")
+
+    def run_idle_scheduler(self):
+        """Run every app's idle check on its own interval from one thread."""
+        while not self.shutdown_event.is_set():
+            now = time.time()
+            for app in list(self.apps.values()):
+                if app.next_idle_check <= now:
+                    app.next_idle_check = now + app.config.idle_check_interval
+                    app.check_idle()
+            due = [app.next_idle_check for app in list(self.apps.values())]
+            self.shutdown_event.wait(min(due) - time.time() if due else 1.0)
+
+    def shutdown(self, reason):
+        """Ask serve_forever() to stop; safe from signal handlers and threads."""
+        if not self.shutdown_event.is_set():
+            log(f"Initiating wrapper shutdown: {reason}")
+            self.shutdown_event.set()
+
+    def serve_forever(self):
+        self._start_thread("idle-scheduler", self.run_idle_scheduler)
+        try:
+            while not self.shutdown_event.wait(1.0):
+                pass
+        finally:
+            self.close()
+
+    def close(self):
+        """Stop every backend, close every socket and clean up."""
+        self.shutdown_event.set()
+        with self._apps_lock:
+            apps = list(self.apps.values())
+        for app in apps:
+            app.shutdown_event.set()
+            app.notify_container_state()
+
+        if self._control is not None:
+            self._control.shutdown()
+            self._control.server_close()
+            try:
+                os.unlink(self.control_path)
+            except OSError:
+                pass
+
+        # Backends can take stop_timeout each; stop them side by side
+        stoppers = [
+            threading.Thread(target=app.shutdown_backend, daemon=True) for app in apps
+        ]
+        for stopper in stoppers:
+            stopper.start()
+        for stopper in stoppers:
+            stopper.join()
+
+        for app in apps:
+            httpd = app.httpd_server
+            httpd.shutdown()
+            self._threads[f"serve-{app.config.app_name}"].join(5)
+            httpd.server_close()
+            if app.asset_cache is not None:
+                app.asset_cache.clear()
+            socket_path = app.config.socket_path
+            try:
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
+            except OSError as e:
+                app.log(f"Failed to remove socket file {socket_path}: {e}")
+            app.log("Wrapper server exited")
+        _http_client.close()
+        _bulk_http_client.close()
+        if self.control_path:
+            log("Webapp daemon exited")
+        flush_logs()
+
+
+def load_webapps():
+    """Read the ``webapps`` table from webapps.json."""
+    if not CONFIG_PATH.exists():
+        raise FileNotFoundError(f"Config not found: {CONFIG_PATH}")
+    with open(CONFIG_PATH) as f:
+        return json.load(f).get("webapps", {})
+
+
+def container_webapp_names(webapps):
+    """Names of the webapps the wrapper fronts (``direct_url`` ones open directly)."""
+    return [name for name, entry in webapps.items() if not entry.get("direct_url")]
+
+
+def get_daemon_socket_path():
+    return os.environ.get("NEURODESK_WEBAPP_DAEMON_SOCKET", DAEMON_SOCKET_PATH)
+
+
+def acquire_daemon_lock():
+    """Take the daemon's lock file; None if another daemon holds it."""
+    private_directory(Path(DAEMON_LOCK_PATH).parent)
+    fd = os.open(DAEMON_LOCK_PATH, os.O_WRONLY | os.O_CREAT | os.O_NOFOLLOW | os.O_CLOEXEC, 0o600)
+    lock_file = os.fdopen(fd, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+def run_daemon():
+    """Serve every container-backed webapp from one process."""
+    global process_logfile
+    process_logfile = DAEMON_LOGFILE
+
+    # Two launchers racing to start the daemon: the loser exits and both
+    # attach to the winner
+    lock_file = acquire_daemon_lock()
+    if lock_file is None:
+        print("Webapp daemon already running")
+        return
 
+    try:
+        webapps = load_webapps()
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    log("=" * 50)
+    log(f"Webapp daemon starting (PID {os.getpid()})")
+    daemon = WebappDaemon(webapps, get_daemon_socket_path())
+    signal.signal(signal.SIGINT, lambda _sig, _frame: daemon.shutdown("received shutdown signal"))
+    signal.signal(signal.SIGTERM, lambda _sig, _frame: daemon.shutdown("received shutdown signal"))
 
-def signal_handler(_sig, _frame):
-    """Handle shutdown signals."""
-    initiate_shutdown("received shutdown signal")
+    for app_name in container_webapp_names(webapps):
+        try:
+            daemon.add_app(WebappConfig(app_name, webapps))
+        except (OSError, ValueError) as e:
+            log(f"Cannot serve {app_name}: {e}")
+    log(f"Serving {len(daemon.apps)} webapps: {', '.join(daemon.apps)}")
+    daemon.start_control_socket()
+    with lock_file:
+        daemon.serve_forever()
 
 
 def main():
-    global config, httpd_server, last_client_activity
+    global process_logfile
 
     if len(sys.argv) != 2:
         print("Usage: webapp_wrapper.py <app_name>")
+        print("       webapp_wrapper.py --daemon")
         print()
-        print("Starts a wrapper server for the specified webapp.")
+        print("Starts a wrapper server for the specified webapp, or with --daemon")
+        print("one server for every webapp that launchers attach to.")
         print("Configuration is read from /opt/neurodesktop/webapps.json")
         sys.exit(1)
 
+    if sys.argv[1] == "--daemon":
+        run_daemon()
+        return
+
     app_name = sys.argv[1]
 
     try:
@@ -1454,55 +6675,19 @@ def main():
     except (FileNotFoundError, ValueError) as e:
         print(f"Error: {e}")
         sys.exit(1)
+    process_logfile = config.logfile
 
-    log("=" * 50)
-    log(f"{config.title} Wrapper Server starting")
-    log(f"  Socket: {config.socket_path}")
-    log(f"  Target port: {config.target_port}")
-    log(f"  Start page: {config.start_page}")
-    log(f"  Idle timeout: {config.idle_timeout}s")
-    log(f"  Heartbeat interval: {config.heartbeat_interval}s")
-    if config.idle_timeout > 0 and config.idle_timeout < config.heartbeat_interval:
-        log(f"  WARNING: idle_timeout ({config.idle_timeout}s) < heartbeat_interval "
-            f"({config.heartbeat_interval}s); backend may stop between heartbeats")
-
+    daemon = WebappDaemon()
     # Set up signal handlers early
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    signal.signal(signal.SIGINT, lambda _sig, _frame: daemon.shutdown("received shutdown signal"))
+    signal.signal(signal.SIGTERM, lambda _sig, _frame: daemon.shutdown("received shutdown signal"))
 
-    # Remove existing socket file if present (needed to bind)
-    socket_path = config.socket_path
-    if os.path.exists(socket_path):
-        os.unlink(socket_path)
-
-    # Create and bind to socket
-    httpd = UnixSocketHTTPServer(socket_path, WebappHandler)
-    httpd_server = httpd
-    os.chmod(socket_path, 0o666)
-    log(f"Bound to Unix socket: {socket_path}")
-    last_client_activity = time.time()
+    app = daemon.add_app(config)
 
     # Start backend immediately for first launch experience.
-    ensure_container_starting("initial startup")
-
-    idle_monitor_thread = threading.Thread(target=monitor_idle_timeout, daemon=True)
-    idle_monitor_thread.start()
+    app.ensure_container_starting("initial startup")
 
-    # Serve requests
-    log(f"Serving on Unix socket: {socket_path}")
-    try:
-        httpd.serve_forever()
-    finally:
-        shutdown_event.set()
-        stop_container_processes()
-        _http_client.close()
-        httpd.server_close()
-        try:
-            if os.path.exists(socket_path):
-                os.unlink(socket_path)
-        except OSError as e:
-            log(f"Failed to remove socket file {socket_path}: {e}")
-        log("Wrapper server exited")
+    daemon.serve_forever()
 
 
 if __name__ == "__main__":
@@ -365,6 +365,127 @@ const CATEGORY_ORDER: Record<string, number> = {
 };
 const DEFAULT_ORDER = 100;
 
+/**
+ * Launcher categories whose tiles are served by the webapp wrapper and
+ * accept a prestart hint. Entries with a direct URL open elsewhere.
+ */
+const PRESTART_CATEGORIES = new Set(['Webapps']);
+
+/** How long the pointer must rest on a tile before its backend is prestarted. */
+const HOVER_PRESTART_DELAY_MS = 300;
+
+/** Minimum time between two prestart hints for the same app. */
+const PRESTART_REPEAT_MS = 60000;
+
+/** Launch history the wrapper keeps when a warm set is configured. */
+const LAUNCH_HISTORY_PATH = '.config/neurodesk/webapp_launches.json';
+
+interface IPrestartTarget {
+  name: string;
+  pathInfo: string;
+}
+
+const lastPrestart = new Map<string, number>();
+
+/**
+ * Ask the webapp wrapper to start an app's backend before it is opened.
+ * Fire-and-forget: a failed hint only means the app starts on open.
+ */
+function prestartWebapp(
+  target: IPrestartTarget,
+  reason: string,
+  settings: ServerConnection.ISettings
+): void {
+  const now = Date.now();
+  if (now - (lastPrestart.get(target.name) ?? 0) < PRESTART_REPEAT_MS) {
+    return;
+  }
+  lastPrestart.set(target.name, now);
+
+  const url =
+    URLExt.join(
+      settings.baseUrl,
+      target.pathInfo,
+      `${target.name}-wrapper-prestart`
+    ) + `?reason=${reason}`;
+  void ServerConnection.makeRequest(url, { method: 'POST' }, settings).catch(
+    error => {
+      console.debug('neurodesk-launcher: prestart hint failed', error);
+    }
+  );
+}
+
+/**
+ * Prestart a tile's backend when the pointer rests on it or it gets focus.
+ * Tiles are matched through their title, which is the command label.
+ */
+function startLauncherPrestartHints(
+  targets: Map<string, IPrestartTarget>,
+  settings: ServerConnection.ISettings
+): void {
+  let hoverTimer: number | null = null;
+  const targetFor = (event: Event): IPrestartTarget | undefined => {
+    if (!(event.target instanceof Element)) {
+      return undefined;
+    }
+    const card = event.target.closest('.jp-LauncherCard');
+    const title = card?.getAttribute('title');
+    return title ? targets.get(title) : undefined;
+  };
+
+  document.body.addEventListener('pointerover', event => {
+    const target = targetFor(event);
+    if (hoverTimer !== null) {
+      window.clearTimeout(hoverTimer);
+      hoverTimer = null;
+    }
+    if (target) {
+      hoverTimer = window.setTimeout(() => {
+        hoverTimer = null;
+        prestartWebapp(target, 'hover', settings);
+      }, HOVER_PRESTART_DELAY_MS);
+    }
+  });
+  document.body.addEventListener('focusin', event => {
+    const target = targetFor(event);
+    if (target) {
+      prestartWebapp(target, 'focus', settings);
+    }
+  });
+}
+
+/** Prestart the apps in the wrapper's warm set, learned from launch history. */
+async function prestartWarmSet(
+  app: JupyterFrontEnd,
+  targets: Map<string, IPrestartTarget>,
+  settings: ServerConnection.ISettings
+): Promise<void> {
+  let warmSet: unknown;
+  try {
+    const model = await app.serviceManager.contents.get(LAUNCH_HISTORY_PATH, {
+      content: true,
+      format: 'text',
+      type: 'file'
+    });
+    warmSet = JSON.parse(model.content as string).warm_set;
+  } catch {
+    return; // No history yet, or the warm set is disabled
+  }
+  if (!Array.isArray(warmSet)) {
+    return;
+  }
+
+  const byName = new Map(
+    [...targets.values()].map(target => [target.name, target])
+  );
+  for (const name of warmSet) {
+    const target = byName.get(name);
+    if (target) {
+      prestartWebapp(target, 'warm', settings);
+    }
+  }
+}
+
 /** Categories to hide from the launcher. */
 const HIDDEN_CATEGORIES = new Set(['HPC Tools']);
 
@@ -561,6 +682,8 @@ const plugin: JupyterFrontEndPlugin<void> = {
       }))
     );
 
+    const prestartTargets = new Map<string, IPrestartTarget>();
+
     for (const { process: sp, iconSvg } of launcherProcesses) {
       const { launcher_entry: entry, name, new_browser_tab: newTab } = sp;
       const title = entry.title || name;
@@ -568,6 +691,10 @@ const plugin: JupyterFrontEndPlugin<void> = {
       const pathInfo = entry.path_info || name;
       const url = entry.url || URLExt.join(settings.baseUrl, pathInfo) + '/';
 
+      if (!entry.url && PRESTART_CATEGORIES.has(category)) {
+        prestartTargets.set(title, { name, pathInfo });
+      }
+
       let icon: LabIcon | undefined;
       if (iconSvg) {
         icon = new LabIcon({
@@ -593,6 +720,11 @@ const plugin: JupyterFrontEndPlugin<void> = {
       });
     }
 
+    startLauncherPrestartHints(prestartTargets, settings);
+    void app.restored.then(() =>
+      prestartWarmSet(app, prestartTargets, settings)
+    );
+
     // Add built-in tools to the Neurodesk category
     launcher.add({
       command: 'terminal:create-new',
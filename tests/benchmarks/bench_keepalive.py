@@ -0,0 +1,139 @@
+"""Benchmark: request rate through the wrapper with and without keep-alive.
+
+Sends small proxied GETs to a wrapper on a Unix socket in front of a local
+HTTP/1.1 backend.  "close" opens a new connection for every request, as
+every request did while the wrapper answered HTTP/1.0; "keep-alive" sends
+them all over persistent connections.  Each client thread runs its requests
+back to back.
+
+Run from a checkout::
+
+    python tests/benchmarks/bench_keepalive.py [--requests 2000] [--clients 4]
+"""
+
+import argparse
+import http.client
+import http.server
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from testlib import load_source_module, webapp_config  # noqa: E402
+
+BODY = b"x" * 512
+
+
+def load_wrapper():
+    return load_source_module(
+        "webapp_wrapper_bench",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+class BackendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # One write per response; split writes stall on delayed ACKs over TCP
+    wbufsize = -1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+def start_wrapper(wrapper, server_mode, backend_port, socket_path, logfile):
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, Path(logfile).parent, "bench", backend_port,
+        path_rewrites=[],
+        logfile=logfile,
+        keepalive_max_requests=1000000,
+    ))
+    app.container_ready = True
+    if server_mode == "asyncio":
+        httpd = wrapper.AsyncUnixSocketHTTPServer(socket_path, app)
+    else:
+        httpd = wrapper.UnixSocketHTTPServer(socket_path, wrapper.WebappHandler, app=app)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    return httpd, thread
+
+
+def run_client(socket_path, count, keep_alive):
+    request = b"GET /user/alice/bench/data HTTP/1.1\r\nHost: hub\r\n"
+    request += b"\r\n" if keep_alive else b"Connection: close\r\n\r\n"
+    conn = None
+    for _ in range(count):
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.connect(socket_path)
+        conn.sendall(request)
+        response = http.client.HTTPResponse(conn, method="GET")
+        response.begin()
+        if response.read() != BODY:
+            raise SystemExit("unexpected response body")
+        if not keep_alive or response.will_close:
+            conn.close()
+            conn = None
+    if conn is not None:
+        conn.close()
+
+
+def requests_per_second(socket_path, total, clients, keep_alive):
+    per_client = total // clients
+    threads = [
+        threading.Thread(target=run_client, args=(socket_path, per_client, keep_alive))
+        for _ in range(clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return per_client * clients / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=4)
+    args = parser.parse_args()
+
+    wrapper = load_wrapper()
+    backend = http.server.ThreadingHTTPServer(("127.0.0.1", 0), BackendHandler)
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.requests} requests of {len(BODY)} bytes from {args.clients} clients")
+        for server_mode in ("threaded", "asyncio"):
+            socket_path = os.path.join(tmp, f"{server_mode}.sock")
+            httpd, thread = start_wrapper(
+                wrapper, server_mode, backend.server_address[1], socket_path,
+                os.path.join(tmp, "bench_wrapper.log"),
+            )
+            # Warm the backend connection pool
+            requests_per_second(socket_path, args.clients * 10, args.clients, True)
+            close = requests_per_second(socket_path, args.requests, args.clients, False)
+            keep_alive = requests_per_second(socket_path, args.requests, args.clients, True)
+            httpd.shutdown()
+            thread.join()
+            httpd.server_close()
+            print(f"{server_mode:9} connection per request: {close:8.0f} req/s")
+            print(f"{server_mode:9} keep-alive            : {keep_alive:8.0f} req/s"
+                  f"  ({keep_alive / close:.2f}x)")
+    backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Micro-benchmark: streamed path rewriting of large JS bundles.
+
+Compares the wrapper's cached PathRewriter/RewriteStream with the previous
+per-chunk implementation (sort + ``re.compile`` on every chunk, and an
+``overlap + chunk`` copy per 128 KB chunk), which is reproduced below as the
+baseline. The streamed output must equal a whole-buffer rewrite; the baseline
+is reported separately because it misses matches that straddle its
+``to_send``/overlap split.
+
+Run from a checkout::
+
+    python tests/benchmarks/bench_path_rewriter.py [--size-mb 16] [--repeat 5]
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from testlib import load_source_module  # noqa: E402
+
+
+def load_wrapper():
+    return load_source_module(
+        "webapp_wrapper_bench",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def legacy_apply(data, rewrite_map):
+    rewrite_map = sorted(rewrite_map, key=lambda item: len(item[0]), reverse=True)
+    replacements = {old: new for old, new in rewrite_map}
+    pattern = re.compile(b"|".join(re.escape(old) for old, _ in rewrite_map))
+    return pattern.sub(lambda match: replacements[match.group(0)], data)
+
+
+def legacy_stream(chunks, rewrite_map):
+    overlap_size = max(max(len(old) for old, _ in rewrite_map) - 1, 0)
+    overlap = b""
+    for chunk in chunks:
+        data = overlap + chunk
+        if len(data) > overlap_size:
+            to_send = data[:-overlap_size]
+            overlap = data[-overlap_size:]
+        else:
+            overlap = data
+            continue
+        yield legacy_apply(to_send, rewrite_map)
+    if overlap:
+        yield legacy_apply(overlap, rewrite_map)
+
+
+def current_stream(chunks, rewriter):
+    stream = rewriter.stream()
+    for chunk in chunks:
+        yield from stream.feed(chunk)
+    yield from stream.flush()
+
+
+def make_bundle(size, seed=0):
+    """A minified-JS-like bundle with hard-coded absolute paths sprinkled in."""
+    rng = random.Random(seed)
+    filler = b"function(e,t,n){var r=n(12);return r.default(e)+t;},"
+    paths = [b'"/assets/chunk.js"', b'fetch("/version")', b'"/jamovi/analyses"']
+    parts = []
+    total = 0
+    while total < size:
+        part = filler * rng.randint(4, 40) + rng.choice(paths)
+        parts.append(part)
+        total += len(part)
+    return b"".join(parts)[:size]
+
+
+def split(data, chunk_size):
+    return [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    wrapper = load_wrapper()
+    rewrites = [
+        {"from": "/assets/", "to": "${base_path}assets/"},
+        {"from": "\"/version\"", "to": "\"${base_path}version\""},
+        "/jamovi/",
+    ]
+    base_path = "/user/alice/jamovi/"
+    rewrite_map = wrapper.build_path_rewrite_map(rewrites, base_path)
+    rewriter = wrapper.get_path_rewriter(rewrites, base_path)
+
+    bundle = make_bundle(int(args.size_mb * 1024 * 1024))
+    chunks = split(bundle, wrapper.STREAM_CHUNK_SIZE)
+
+    expected = rewriter.rewrite(bundle)
+    actual = b"".join(bytes(segment) for segment in current_stream(chunks, rewriter))
+    if actual != expected:
+        raise SystemExit("RewriteStream output differs from a whole-buffer rewrite")
+    legacy_output = b"".join(legacy_stream(chunks, rewrite_map))
+
+    legacy = best_of(args.repeat, lambda: sum(len(c) for c in legacy_stream(chunks, rewrite_map)))
+    current = best_of(args.repeat, lambda: sum(len(c) for c in current_stream(chunks, rewriter)))
+
+    megabytes = len(bundle) / (1024 * 1024)
+    print(f"bundle: {megabytes:.1f} MiB in {len(chunks)} chunks of {wrapper.STREAM_CHUNK_SIZE} bytes")
+    print(f"legacy regex per chunk : {legacy * 1000:8.1f} ms  {megabytes / legacy:8.1f} MiB/s")
+    print(f"compiled RewriteStream : {current * 1000:8.1f} ms  {megabytes / current:8.1f} MiB/s")
+    print(f"speedup                : {legacy / current:8.2f}x")
+    if legacy_output != expected:
+        print(
+            "legacy output differs from a whole-buffer rewrite "
+            f"({len(expected) - len(legacy_output)} bytes of rewrites missed at chunk splits)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark: binary download throughput through the wrapper.
+
+Streams a multi-GB binary body from a local HTTP/1.1 backend through a
+wrapper on a Unix socket and reads it back.  "buffered" writes every chunk
+through the wfile buffer, as the wrapper did before chunk payloads were sent
+with sendmsg(); "sendmsg" gathers the chunk framing and payload in one send.
+The backend answers /chunked without a length, so the wrapper adds chunk
+framing, and /sized with a Content-Length.
+
+Run from a checkout::
+
+    python tests/benchmarks/bench_streaming.py [--size-mb 2048]
+"""
+
+import argparse
+import http.client
+import http.server
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_keepalive import load_wrapper, start_wrapper  # noqa: E402
+
+BLOCK = os.urandom(1024 * 1024)
+READ_SIZE = 1024 * 1024
+
+
+class BackendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    blocks = 0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        chunked = self.path.endswith("/chunked")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Content-Length", str(len(BLOCK) * self.blocks))
+        self.end_headers()
+        frame = [f"{len(BLOCK):x}\r\n".encode(), BLOCK, b"\r\n"] if chunked else [BLOCK]
+        for _ in range(self.blocks):
+            self.wfile.writelines(frame)
+        if chunked:
+            self.wfile.write(b"0\r\n\r\n")
+
+
+def download(socket_path, path):
+    """Read one response to the end; return its body size in bytes."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.connect(socket_path)
+    try:
+        conn.sendall(f"GET {path} HTTP/1.1\r\nHost: hub\r\nConnection: close\r\n\r\n".encode())
+        response = http.client.HTTPResponse(conn, method="GET")
+        response.begin()
+        size = 0
+        buffer = bytearray(READ_SIZE)
+        while True:
+            count = response.readinto(buffer)
+            if not count:
+                return size
+            size += count
+    finally:
+        conn.close()
+
+
+def megabytes_per_second(socket_path, path, expected):
+    started = time.perf_counter()
+    size = download(socket_path, path)
+    elapsed = time.perf_counter() - started
+    if size != expected:
+        raise SystemExit(f"{path}: read {size} bytes, expected {expected}")
+    return size / elapsed / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=2048)
+    args = parser.parse_args()
+
+    wrapper = load_wrapper()
+    BackendHandler.blocks = args.size_mb
+    expected = len(BLOCK) * args.size_mb
+    backend = http.server.ThreadingHTTPServer(("127.0.0.1", 0), BackendHandler)
+    threading.Thread(target=backend.serve_forever, daemon=True).start()
+    sendmsg_min_payload = wrapper.SENDMSG_MIN_PAYLOAD
+
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.size_mb} MB binary download, {wrapper.STREAM_CHUNK_SIZE // 1024} KB chunks")
+        for server_mode in ("threaded", "asyncio"):
+            socket_path = os.path.join(tmp, f"{server_mode}.sock")
+            httpd, thread = start_wrapper(
+                wrapper, server_mode, backend.server_address[1], socket_path,
+                os.path.join(tmp, "bench_wrapper.log"),
+            )
+            for framing in ("chunked", "sized"):
+                path = f"/user/alice/bench/{framing}"
+                if server_mode == "asyncio":
+                    # The transport does its own writes; there is nothing to compare
+                    rate = megabytes_per_second(socket_path, path, expected)
+                    print(f"{server_mode:9} {framing:8} transport: {rate:7.0f} MB/s")
+                    continue
+                results = {}
+                for writer, min_payload in (("buffered", sys.maxsize), ("sendmsg", sendmsg_min_payload)):
+                    wrapper.SENDMSG_MIN_PAYLOAD = min_payload
+                    results[writer] = megabytes_per_second(socket_path, path, expected)
+                print(f"{server_mode:9} {framing:8} buffered: {results['buffered']:7.0f} MB/s"
+                      f"  sendmsg: {results['sendmsg']:7.0f} MB/s"
+                      f"  ({results['sendmsg'] / results['buffered']:.2f}x)")
+            wrapper.SENDMSG_MIN_PAYLOAD = sendmsg_min_payload
+            httpd.shutdown()
+            thread.join()
+            httpd.server_close()
+    backend.shutdown()
+
+
+if __name__ == "__main__":
+    main()
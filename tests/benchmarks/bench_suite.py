@@ -0,0 +1,542 @@
+"""Load benchmark and regression gate for the webapp wrapper.
+
+Runs the wrapper and a stub backend in their own processes and drives the
+wrapper's Unix socket from concurrent keep-alive clients. The stub is an
+asyncio HTTP server that serves HTML and JS for path rewriting, a binary
+download, a slow-drip chunked response, an upload sink and a WebSocket
+echo. Each scenario runs for a fixed time on each engine:
+
+- ``plain``: binary GETs passed through unchanged;
+- ``rewritten``: HTML and JS GETs with path rewriting and head injection;
+- ``drip``: GETs of a chunked body the backend sends in timed pieces;
+- ``upload``: POSTs with a request body streamed to the backend;
+- ``upgrade``: WebSocket echo round trips over tunneled connections.
+
+Each scenario records req/s, p50/p99 latency, body bytes/s and the wrapper
+process's RSS. ``--output`` writes the results as JSON. ``--baseline``
+compares them with an earlier JSON file and exits with status 1 if a
+metric is more than ``--threshold`` percent worse, or if a request failed.
+
+Run from a checkout::
+
+    python tests/benchmarks/bench_suite.py [--duration 5] [--clients 8] \\
+        [--output results.json] [--baseline baseline.json --threshold 10]
+"""
+
+import argparse
+import asyncio
+import base64
+import hashlib
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench_keepalive import load_wrapper  # noqa: E402
+from testlib import webapp_config  # noqa: E402
+
+SCENARIOS = ("plain", "rewritten", "drip", "upload", "upgrade")
+ENGINES = ("threaded", "asyncio")
+APP_PATH = "/user/alice/bench"
+READ_SIZE = 1024 * 1024
+WEBSOCKET_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Metric -> whether larger values are better, for the regression gate
+GATED_METRICS = {
+    "requests_per_second": True,
+    "bytes_per_second": True,
+    "p50_ms": False,
+    "p99_ms": False,
+    "rss_mb": False,
+}
+
+
+# -- Stub backend -----------------------------------------------------------
+
+def build_payloads(args):
+    """Bodies served by the stub backend, keyed by path."""
+    js_line = b"fetch('/bench/api/items').then(r => r.json()); // /bench/static/x.png\n"
+    html_line = b'<p><a href="/bench/page">page</a> <img src="/bench/static/logo.png"></p>\n'
+    html_head = b'<!DOCTYPE html>\n<html><head><script src="/bench/app.js"></script></head><body>\n'
+    return {
+        "/index.html": (
+            "text/html; charset=utf-8",
+            html_head + html_line * (args.html_kb * 1024 // len(html_line)) + b"</body></html>\n",
+        ),
+        "/app.js": ("application/javascript", js_line * (args.js_kb * 1024 // len(js_line))),
+        "/blob.bin": ("application/octet-stream", os.urandom(args.binary_kb * 1024)),
+    }
+
+
+async def echo_websocket(reader, writer):
+    """Send every client frame back unmasked until a close frame."""
+    while True:
+        first, second = await reader.readexactly(2)
+        size = second & 0x7F
+        if size == 126:
+            size = int.from_bytes(await reader.readexactly(2), "big")
+        elif size == 127:
+            size = int.from_bytes(await reader.readexactly(8), "big")
+        mask = await reader.readexactly(4) if second & 0x80 else None
+        payload = await reader.readexactly(size)
+        if mask is not None:
+            key = (mask * (size // 4 + 1))[:size]
+            payload = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(size, "big")
+        writer.write(websocket_frame(first & 0x0F, payload))
+        await writer.drain()
+        if first & 0x0F == 0x8:
+            return
+
+
+def websocket_frame(opcode, payload, mask=None):
+    """Encode one final WebSocket frame, masked when ``mask`` is given."""
+    size = len(payload)
+    mask_bit = 0x80 if mask is not None else 0
+    if size < 126:
+        head = bytes([0x80 | opcode, mask_bit | size])
+    elif size < 65536:
+        head = bytes([0x80 | opcode, mask_bit | 126]) + size.to_bytes(2, "big")
+    else:
+        head = bytes([0x80 | opcode, mask_bit | 127]) + size.to_bytes(8, "big")
+    if mask is None:
+        return head + payload
+    key = (mask * (size // 4 + 1))[:size]
+    masked = (int.from_bytes(payload, "big") ^ int.from_bytes(key, "big")).to_bytes(size, "big")
+    return head + mask + masked
+
+
+async def handle_backend_connection(reader, writer, payloads, args):
+    try:
+        while True:
+            head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+            request_line, *header_lines = head.split("\r\n")
+            method, target, _version = request_line.split(" ", 2)
+            headers = {}
+            for line in header_lines:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            path = target.split("?", 1)[0]
+
+            if path == "/ws":
+                key = headers["sec-websocket-key"].encode()
+                accept = base64.b64encode(hashlib.sha1(key + WEBSOCKET_GUID).digest())
+                writer.write(
+                    b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                    b"Connection: Upgrade\r\nSec-WebSocket-Accept: " + accept + b"\r\n\r\n"
+                )
+                await writer.drain()
+                await echo_websocket(reader, writer)
+                return
+
+            if path == "/upload" and method == "POST":
+                remaining = int(headers.get("content-length", "0"))
+                while remaining:
+                    remaining -= len(await reader.read(min(READ_SIZE, remaining)))
+                body = b'{"ok": true}'
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    + f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+                )
+            elif path == "/drip":
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/octet-stream\r\n"
+                    b"Transfer-Encoding: chunked\r\n\r\n"
+                )
+                piece = b"d" * args.drip_bytes
+                for _ in range(args.drip_chunks):
+                    writer.write(f"{len(piece):x}\r\n".encode() + piece + b"\r\n")
+                    await writer.drain()
+                    await asyncio.sleep(args.drip_interval_ms / 1000)
+                writer.write(b"0\r\n\r\n")
+            elif path in payloads:
+                content_type, body = payloads[path]
+                writer.write(
+                    f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode()
+                )
+                if method != "HEAD":
+                    writer.write(body)
+            else:
+                writer.write(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_backend(args):
+    payloads = build_payloads(args)
+    server = await asyncio.start_server(
+        lambda reader, writer: handle_backend_connection(reader, writer, payloads, args),
+        "127.0.0.1", 0,
+    )
+    print(server.sockets[0].getsockname()[1], flush=True)
+    # Serve until the parent closes our stdin
+    await asyncio.get_running_loop().run_in_executor(None, sys.stdin.read)
+    server.close()
+
+
+# -- Wrapper process --------------------------------------------------------
+
+def serve_wrapper(args):
+    wrapper = load_wrapper()
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, Path(args.logfile).parent, "bench", args.backend_port,
+        logfile=args.logfile,
+        keepalive_max_requests=1000000,
+    ))
+    app.container_ready = True
+    if args.engine == "asyncio":
+        httpd = wrapper.AsyncUnixSocketHTTPServer(args.socket, app)
+    else:
+        httpd = wrapper.UnixSocketHTTPServer(args.socket, wrapper.WebappHandler, app=app)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    print("ready", flush=True)
+    sys.stdin.read()
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+def spawn(role, *extra):
+    """Start this script in ``role`` and return (process, first output line)."""
+    process = subprocess.Popen(
+        [sys.executable, __file__, "--role", role, *extra],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+    )
+    line = process.stdout.readline().strip()
+    if not line:
+        process.kill()
+        raise SystemExit(f"{role} process failed to start")
+    return process, line
+
+
+def stop(process):
+    process.stdin.close()
+    try:
+        process.wait(10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def memory_mb(pid):
+    """Current and peak resident set size of a process, in MB."""
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            name, _, value = line.partition(":")
+            if name in ("VmRSS", "VmHWM"):
+                values[name] = int(value.split()[0]) / 1024
+    return values.get("VmRSS", 0.0), values.get("VmHWM", 0.0)
+
+
+# -- Load generator ---------------------------------------------------------
+
+class HttpClient:
+    """One keep-alive client connection to the wrapper socket."""
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.conn = None
+        self.buffer = bytearray(READ_SIZE)
+        self.requests = 0
+
+    def request(self, method, path, body=b""):
+        """Send one request and read the response; return the body bytes moved."""
+        self.requests += 1
+        if self.conn is None:
+            self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.conn.settimeout(30)
+            self.conn.connect(self.socket_path)
+        head = f"{method} {APP_PATH}{path} HTTP/1.1\r\nHost: hub\r\n"
+        if body:
+            head += f"Content-Type: application/octet-stream\r\nContent-Length: {len(body)}\r\n"
+        self.conn.sendall(head.encode() + b"\r\n")
+        if body:
+            self.conn.sendall(body)
+        response = http.client.HTTPResponse(self.conn, method=method)
+        response.begin()
+        size = 0
+        while True:
+            count = response.readinto(self.buffer)
+            if not count:
+                break
+            size += count
+        if response.status != 200:
+            raise RuntimeError(f"{method} {path}: HTTP {response.status}")
+        if response.will_close:
+            self.close()
+        return size + len(body)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class WebSocketClient:
+    """A WebSocket connection through the wrapper to the stub's echo."""
+
+    def __init__(self, socket_path, message_size):
+        self.message = os.urandom(message_size)
+        self.conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.conn.settimeout(30)
+        self.conn.connect(socket_path)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.conn.sendall(
+            f"GET {APP_PATH}/ws HTTP/1.1\r\nHost: hub\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n".encode()
+        )
+        self.pending = b""
+        response = self._read_until(b"\r\n\r\n")
+        if not response.startswith(b"HTTP/1.1 101"):
+            raise RuntimeError(f"WebSocket upgrade refused: {response.splitlines()[0]!r}")
+
+    def _read_until(self, marker):
+        while marker not in self.pending:
+            data = self.conn.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("WebSocket connection closed")
+            self.pending += data
+        head, _, self.pending = self.pending.partition(marker)
+        return head
+
+    def _read_exactly(self, size):
+        while len(self.pending) < size:
+            data = self.conn.recv(READ_SIZE)
+            if not data:
+                raise ConnectionError("WebSocket connection closed")
+            self.pending += data
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+    def echo(self):
+        """Send one message and wait for its echo; return the bytes moved."""
+        self.conn.sendall(websocket_frame(0x2, self.message, mask=os.urandom(4)))
+        _first, second = self._read_exactly(2)
+        size = second & 0x7F
+        if size == 126:
+            size = int.from_bytes(self._read_exactly(2), "big")
+        elif size == 127:
+            size = int.from_bytes(self._read_exactly(8), "big")
+        if self._read_exactly(size) != self.message:
+            raise RuntimeError("WebSocket echo does not match the message")
+        return 2 * size
+
+    def close(self):
+        self.conn.close()
+
+
+def scenario_operation(name, args):
+    """Return (make_client, operation) for a scenario."""
+    if name == "upgrade":
+        return (lambda path: WebSocketClient(path, args.message_bytes)), WebSocketClient.echo
+    if name == "plain":
+        return HttpClient, lambda client: client.request("GET", "/blob.bin")
+    if name == "drip":
+        return HttpClient, lambda client: client.request("GET", "/drip")
+    if name == "upload":
+        body = os.urandom(args.upload_kb * 1024)
+        return HttpClient, lambda client: client.request("POST", "/upload", body)
+    # rewritten: alternate the page and its bundle on each connection
+    pages = ("/index.html", "/app.js")
+    return HttpClient, lambda client: client.request("GET", pages[client.requests % 2])
+
+
+def run_scenario(name, socket_path, args):
+    """Drive one scenario for ``args.duration`` seconds from ``args.clients`` threads."""
+    make_client, operation = scenario_operation(name, args)
+    latencies = []
+    totals = {"bytes": 0, "errors": 0}
+    lock = threading.Lock()
+    start = threading.Barrier(args.clients + 1)
+
+    def worker():
+        local, moved, errors = [], 0, 0
+        client = None
+        start.wait()
+        deadline = time.perf_counter() + args.duration
+        while time.perf_counter() < deadline:
+            began = time.perf_counter()
+            try:
+                if client is None:
+                    client = make_client(socket_path)
+                moved += operation(client)
+            except (OSError, RuntimeError, http.client.HTTPException):
+                errors += 1
+                if client is not None:
+                    client.close()
+                    client = None
+                continue
+            local.append(time.perf_counter() - began)
+        if client is not None:
+            client.close()
+        with lock:
+            latencies.extend(local)
+            totals["bytes"] += moved
+            totals["errors"] += errors
+
+    threads = [threading.Thread(target=worker) for _ in range(args.clients)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(fraction):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": totals["errors"],
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p99_ms": percentile(0.99),
+        "bytes_per_second": round(totals["bytes"] / elapsed),
+    }
+
+
+# -- Regression gate --------------------------------------------------------
+
+def find_regressions(results, baseline, threshold, metrics=tuple(GATED_METRICS)):
+    """Compare two result sets; return a message per metric worse than threshold %."""
+    regressions = []
+    for engine, scenarios in results.items():
+        for scenario, values in scenarios.items():
+            if values["errors"]:
+                regressions.append(f"{engine}/{scenario}: {values['errors']} failed requests")
+            before = baseline.get(engine, {}).get(scenario)
+            if not before:
+                continue
+            for metric in metrics:
+                higher_is_better = GATED_METRICS[metric]
+                old, new = before.get(metric), values.get(metric)
+                if not old or new is None:
+                    continue
+                change = (new - old) / old * 100
+                worse = -change if higher_is_better else change
+                if worse > threshold:
+                    regressions.append(
+                        f"{engine}/{scenario}: {metric} {old:g} -> {new:g} ({change:+.1f}%)"
+                    )
+    return regressions
+
+
+def run_suite(args):
+    backend, backend_port = spawn(
+        "backend",
+        "--html-kb", str(args.html_kb), "--js-kb", str(args.js_kb),
+        "--binary-kb", str(args.binary_kb), "--drip-chunks", str(args.drip_chunks),
+        "--drip-bytes", str(args.drip_bytes), "--drip-interval-ms", str(args.drip_interval_ms),
+    )
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            for engine in args.engines:
+                socket_path = os.path.join(tmp, f"{engine}.sock")
+                wrapper, _ready = spawn(
+                    "wrapper", "--engine", engine, "--socket", socket_path,
+                    "--backend-port", backend_port, "--logfile", os.path.join(tmp, "bench_wrapper.log"),
+                )
+                results[engine] = {}
+                try:
+                    for scenario in args.scenarios:
+                        metrics = run_scenario(scenario, socket_path, args)
+                        rss, peak = memory_mb(wrapper.pid)
+                        metrics["rss_mb"] = round(rss, 1)
+                        metrics["peak_rss_mb"] = round(peak, 1)
+                        results[engine][scenario] = metrics
+                        print(
+                            f"{engine:9} {scenario:10} {metrics['requests_per_second']:9.1f} req/s"
+                            f"  p50 {metrics['p50_ms'] or 0:8.2f} ms  p99 {metrics['p99_ms'] or 0:8.2f} ms"
+                            f"  {metrics['bytes_per_second'] / 1e6:8.1f} MB/s  rss {metrics['rss_mb']:6.1f} MB"
+                            + (f"  errors {metrics['errors']}" if metrics["errors"] else ""),
+                            flush=True,
+                        )
+                finally:
+                    stop(wrapper)
+    finally:
+        stop(backend)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--role", choices=("suite", "backend", "wrapper"), default="suite",
+                        help=argparse.SUPPRESS)
+    parser.add_argument("--engine", choices=ENGINES, help=argparse.SUPPRESS)
+    parser.add_argument("--socket", help=argparse.SUPPRESS)
+    parser.add_argument("--backend-port", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--logfile", help=argparse.SUPPRESS)
+
+    parser.add_argument("--engines", nargs="+", choices=ENGINES, default=list(ENGINES))
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per scenario")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent client connections")
+    parser.add_argument("--html-kb", type=int, default=64)
+    parser.add_argument("--js-kb", type=int, default=256)
+    parser.add_argument("--binary-kb", type=int, default=1024)
+    parser.add_argument("--upload-kb", type=int, default=1024)
+    parser.add_argument("--message-bytes", type=int, default=256, help="WebSocket message size")
+    parser.add_argument("--drip-chunks", type=int, default=10)
+    parser.add_argument("--drip-bytes", type=int, default=1024)
+    parser.add_argument("--drip-interval-ms", type=int, default=20)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent a metric may get worse before the gate fails")
+    parser.add_argument("--gate-metrics", nargs="+", choices=tuple(GATED_METRICS),
+                        default=list(GATED_METRICS), help="metrics the gate compares")
+    args = parser.parse_args()
+
+    if args.role == "backend":
+        asyncio.run(serve_backend(args))
+        return
+    if args.role == "wrapper":
+        serve_wrapper(args)
+        return
+
+    print(f"{args.clients} clients, {args.duration:g} s per scenario")
+    results = run_suite(args)
+    document = {
+        "python": platform.python_version(),
+        "clients": args.clients,
+        "duration": args.duration,
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2) + "\n")
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = find_regressions(
+            results, baseline["results"], args.threshold, args.gate_metrics
+        )
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No metric more than {args.threshold:g}% worse than {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
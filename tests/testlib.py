@@ -10,9 +10,15 @@ Both tiers resolve their subject through the helpers here so that no test has to
 know which layout it is running in.
 """
 
+import contextlib
+import http.client
+import http.server
 import importlib.util
+import itertools
 import os
+import socket
 import subprocess
+import threading
 from pathlib import Path
 
 TESTS_DIR = Path(__file__).resolve().parent
@@ -101,3 +107,85 @@ def run_cmd(cmd, cwd=None, env=None, timeout=None):
         timeout=timeout,
     )
     return process.returncode, process.stdout.strip()
+
+
+# Unix socket paths must stay short, so test servers listen in /tmp itself
+_socket_ids = itertools.count()
+
+
+def webapp_config(wrapper, tmp_path, app_name="ezbids", port=0, **fields):
+    """A webapp wrapper config for *app_name* with its files under *tmp_path*.
+
+    Every field starts at the wrapper's own default for an app listening on
+    *port*, so a test sets only the *fields* it exercises; a field the config
+    does not have is an error.
+    """
+    config = wrapper.WebappConfig(app_name, {app_name: {"port": port}})
+    config.logfile = str(tmp_path / f"{app_name}_wrapper.log")
+    config.access_logfile = str(tmp_path / f"{app_name}_wrapper_access.log")
+    config.asset_cache_dir = str(tmp_path / f"{app_name}_asset_cache")
+    config.launch_plan_file = str(tmp_path / f"{app_name}_launch_plan.json")
+    config.local_sif = str(tmp_path / f"{app_name}.sif")
+    for name, value in fields.items():
+        if not hasattr(config, name):
+            raise AttributeError(f"WebappConfig has no field {name!r}")
+        setattr(config, name, value)
+    return config
+
+
+@contextlib.contextmanager
+def http_backend(handler_class):
+    """Serve *handler_class* on a localhost port; yield the server."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@contextlib.contextmanager
+def serve_webapp(wrapper, app, engine="threaded"):
+    """Serve *app* on a Unix socket with the "threaded" or "asyncio" engine.
+
+    Yields the socket path.
+    """
+    socket_path = Path("/tmp") / f"ndwrap-{os.getpid()}-{next(_socket_ids)}.sock"
+    socket_path.unlink(missing_ok=True)
+    if engine == "asyncio":
+        httpd = wrapper.AsyncUnixSocketHTTPServer(str(socket_path), app)
+    else:
+        httpd = wrapper.UnixSocketHTTPServer(str(socket_path), wrapper.WebappHandler, app=app)
+    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    server_thread.start()
+    try:
+        yield str(socket_path)
+    finally:
+        httpd.shutdown()
+        server_thread.join(5)
+        httpd.server_close()
+        socket_path.unlink(missing_ok=True)
+
+
+def unix_request(socket_path, method, path, body=b"", headers=None, timeout=10):
+    """Send one request over a new Unix socket connection.
+
+    Returns ``(response, body)``: the ``http.client.HTTPResponse`` and its body
+    with any chunked framing removed.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(timeout)
+    client.connect(socket_path)
+    try:
+        head = f"{method} {path} HTTP/1.1\r\nHost: hub\r\nConnection: close\r\n"
+        if body or method in ("POST", "PUT"):
+            head += f"Content-Length: {len(body)}\r\n"
+        for name, value in (headers or {}).items():
+            head += f"{name}: {value}\r\n"
+        client.sendall(head.encode() + b"\r\n" + body)
+        response = http.client.HTTPResponse(client, method=method)
+        response.begin()
+        return response, response.read()
+    finally:
+        client.close()
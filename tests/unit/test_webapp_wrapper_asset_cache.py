@@ -0,0 +1,148 @@
+import http.server
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+BUNDLE = b'fetch("/ezbids/api/info");' * 64
+BUNDLE_ETAG = '"bundle-v1"'
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_asset_cache",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stats = self.server.stats
+        if self.headers.get("If-None-Match") == BUNDLE_ETAG:
+            stats["not_modified"] += 1
+            self.send_response(304)
+            self.send_header("ETag", BUNDLE_ETAG)
+            self.end_headers()
+            return
+        stats["full"] += 1
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/javascript")
+        self.send_header("Content-Length", str(len(BUNDLE)))
+        self.send_header("ETag", BUNDLE_ETAG)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(BUNDLE)
+
+
+@pytest.fixture(params=["threaded", "asyncio"])
+def cached_wrapper(request, tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        backend.stats = {"full": 0, "not_modified": 0}
+        backend.delay = 0
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1]))
+        app.container_ready = True
+        app.asset_cache = wrapper.AssetCache(tmp_path / "cache", 1024 * 1024, "ezbids/1.0")
+        with serve_webapp(wrapper, app, request.param) as socket_path:
+            yield SimpleNamespace(wrapper=wrapper, app=app, socket_path=socket_path, backend=backend)
+
+
+def test_rewritten_asset_is_served_from_cache_and_revalidated_with_its_own_etag(cached_wrapper):
+    rewritten = BUNDLE.replace(b"/ezbids/", b"/user/alice/ezbids/")
+    path = "/user/alice/ezbids/app.js"
+
+    response, body = unix_request(cached_wrapper.socket_path, "GET", path)
+    assert response.status == 200
+    assert body == rewritten
+    # The upstream ETag describes the unrewritten bytes
+    assert response.getheader("ETag") is None
+
+    response, body = unix_request(cached_wrapper.socket_path, "GET", path)
+    assert response.status == 200
+    assert body == rewritten
+    assert response.getheader("Content-Length") == str(len(rewritten))
+    assert response.getheader("ETag").startswith('"ndw-')
+    etag = response.getheader("ETag")
+
+    response, body = unix_request(cached_wrapper.socket_path, "GET", path, headers={"If-None-Match": etag})
+    assert response.status == 304
+    assert body == b""
+    assert response.getheader("ETag") == etag
+
+    assert cached_wrapper.backend.stats == {"full": 1, "not_modified": 2}
+    assert cached_wrapper.app.asset_cache.stats()["hits"] == 2
+
+
+def test_concurrent_misses_for_one_asset_share_a_backend_fetch(cached_wrapper):
+    cached_wrapper.backend.delay = 0.3
+    results = []
+
+    def fetch():
+        response, body = unix_request(cached_wrapper.socket_path, "GET", "/user/alice/ezbids/app.js")
+        results.append((response.status, body))
+
+    threads = [threading.Thread(target=fetch) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+
+    assert [status for status, _body in results] == [200] * 4
+    assert len({body for _status, body in results}) == 1
+    assert cached_wrapper.backend.stats["full"] == 1
+
+
+def test_asset_cache_evicts_least_recently_used_entries_and_clears_on_new_version(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    cache = wrapper.AssetCache(tmp_path / "cache", 4096, "app/1")
+    response = SimpleNamespace(headers=wrapper.httpx.Headers({"Content-Type": "text/css"}))
+
+    def store(url, size):
+        lookup = cache.lookup(url, "/base/", coalesce=True)
+        writer = cache.open_writer(lookup.key)
+        writer.write([b"x" * size])
+        entry = writer.commit(response)
+        lookup.release()
+        return entry
+
+    first = store("http://localhost/a.css", 1000)
+    store("http://localhost/b.css", 1000)
+    assert cache.lookup("http://localhost/a.css", "/base/", coalesce=False).entry is first
+    store("http://localhost/c.css", 1000)
+    store("http://localhost/d.css", 1000)
+    store("http://localhost/e.css", 1000)
+
+    # b.css was least recently used once a.css had been read again
+    assert cache.lookup("http://localhost/b.css", "/base/", coalesce=False).entry is None
+    assert cache.lookup("http://localhost/a.css", "/base/", coalesce=False).entry is first
+    assert cache.stats()["bytes"] <= 4096
+
+    assert cache.clear_if_version_changed("app/1") is False
+    assert cache.clear_if_version_changed("app/2") is True
+    assert cache.stats()["entries"] == 0
+    assert not first.path.exists()
+
+
+def test_asset_cache_refuses_directories_others_control(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+    with pytest.raises(PermissionError):
+        wrapper.AssetCache(shared / "cache", 4096, "app/1")
+
+    # A planted symlink survives the wipe and must not be written through
+    elsewhere = tmp_path / "elsewhere"
+    elsewhere.mkdir()
+    (tmp_path / "cache").symlink_to(elsewhere)
+    with pytest.raises(PermissionError):
+        wrapper.AssetCache(tmp_path / "cache", 4096, "app/1")
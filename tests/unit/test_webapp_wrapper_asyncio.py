@@ -0,0 +1,162 @@
+import http.server
+import json
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_asyncio",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/app.js":
+            body = b'fetch("/ezbids/api/info");' * 4
+            self.send_response(200)
+            self.send_header("Content-Type", "application/javascript")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        body = b"binary-payload"
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        body = self.rfile.read(length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def async_wrapper(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        backend_port = backend.server_address[1]
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend_port))
+        app.container_ready = True
+        with serve_webapp(wrapper, app, "asyncio") as socket_path:
+            yield SimpleNamespace(wrapper=wrapper, app=app, socket_path=socket_path, backend_port=backend_port)
+
+
+def test_server_mode_is_read_per_app_with_environment_default(monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+
+    monkeypatch.delenv("NEURODESK_WEBAPP_SERVER_MODE", raising=False)
+    assert wrapper.get_default_server_mode() == "threaded"
+    monkeypatch.setenv("NEURODESK_WEBAPP_SERVER_MODE", "asyncio")
+    assert wrapper.get_default_server_mode() == "asyncio"
+
+    assert wrapper.parse_server_mode("AsyncIO", "threaded") == "asyncio"
+    assert wrapper.parse_server_mode("fork", "threaded") == "threaded"
+    assert wrapper.parse_server_mode(None, "asyncio") == "asyncio"
+
+
+def test_asyncio_engine_serves_status_and_rewrites_proxied_text(async_wrapper):
+    response, body = unix_request(async_wrapper.socket_path, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+    assert response.status == 200
+    assert json.loads(body)["ready"] is True
+
+    response, body = unix_request(async_wrapper.socket_path, "GET", "/user/alice/ezbids/app.js")
+    assert response.status == 200
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert body == b'fetch("/user/alice/ezbids/api/info");' * 4
+
+
+def test_asyncio_engine_streams_request_and_response_bodies(async_wrapper):
+    payload = b"u" * (async_wrapper.wrapper.STREAM_CHUNK_SIZE + 5)
+    response, body = unix_request(async_wrapper.socket_path, "POST", "/user/alice/ezbids/api/upload", payload)
+    assert response.status == 200
+    assert body == payload
+
+
+def test_asyncio_engine_closes_a_connection_that_trickles_its_headers(async_wrapper):
+    async_wrapper.app.config.keepalive_timeout = 1
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(5)
+    client.connect(async_wrapper.socket_path)
+    try:
+        started = time.monotonic()
+        client.sendall(b"GET /user/alice/ezbids/app.js HTTP/1.1\r\nHost: hub\r\n")
+        # One header line at a time, never the blank line that ends the head
+        with pytest.raises((BrokenPipeError, ConnectionResetError)):
+            while time.monotonic() - started < 5:
+                client.sendall(b"X-Slow: 1\r\n")
+                time.sleep(0.1)
+        assert time.monotonic() - started < 3
+    finally:
+        client.close()
+
+
+def test_asyncio_engine_tunnels_websocket_upgrades(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    received = {}
+
+    backend_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    backend_socket.bind(("127.0.0.1", 0))
+    backend_socket.listen(1)
+    backend_port = backend_socket.getsockname()[1]
+
+    def backend():
+        conn, _addr = backend_socket.accept()
+        with conn:
+            request = b""
+            while b"\r\n\r\n" not in request:
+                request += conn.recv(4096)
+            received["request"] = request
+            conn.sendall(b"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n\r\n")
+            received["payload"] = conn.recv(len(b"client-data"))
+            conn.sendall(b"server-data")
+
+    backend_thread = threading.Thread(target=backend, daemon=True)
+    backend_thread.start()
+
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, "jamovi", backend_port, path_rewrites=[]))
+    app.container_ready = True
+
+    with serve_webapp(wrapper, app, "asyncio") as socket_path:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(socket_path)
+        try:
+            client.sendall(
+                b"GET /user/alice/jamovi/abc123/coms HTTP/1.1\r\n"
+                b"Host: hub.example.test\r\n"
+                b"Upgrade: websocket\r\n"
+                b"Connection: Upgrade\r\n"
+                b"\r\n"
+            )
+            response = b""
+            while b"\r\n\r\n" not in response:
+                response += client.recv(4096)
+            assert b"101 Switching Protocols" in response
+
+            client.sendall(b"client-data")
+            assert client.recv(len(b"server-data")) == b"server-data"
+        finally:
+            client.close()
+    backend_socket.close()
+
+    backend_thread.join(2)
+    assert received["payload"] == b"client-data"
+    assert received["request"].startswith(b"GET /abc123/coms HTTP/1.1\r\n")
@@ -0,0 +1,203 @@
+import gzip
+import http.server
+import os
+import random
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_content_encoding",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _decode(encoding, data):
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "deflate":
+        return zlib.decompress(data)
+    return data
+
+
+def test_accept_encoding_picks_the_best_supported_coding():
+    wrapper = _load_webapp_wrapper_module()
+
+    assert wrapper.choose_content_encoding(None) is None
+    assert wrapper.choose_content_encoding("identity") is None
+    assert wrapper.choose_content_encoding("deflate, gzip") == "gzip"
+    assert wrapper.choose_content_encoding("gzip;q=0.5, deflate") == "deflate"
+    assert wrapper.choose_content_encoding("*;q=0, deflate;q=0.1") == "deflate"
+    assert wrapper.choose_content_encoding("gzip;q=0") is None
+    expected = "br" if wrapper.brotli is not None else "gzip"
+    assert wrapper.choose_content_encoding("gzip, deflate, br") == expected
+
+
+@pytest.mark.parametrize("upstream", ["gzip", "deflate"])
+@pytest.mark.parametrize("output", [None, "gzip", "deflate"])
+def test_compressed_bodies_are_decoded_rewritten_and_reencoded_at_any_split(upstream, output):
+    wrapper = _load_webapp_wrapper_module()
+    rewriter = wrapper.get_path_rewriter(["/ezbids/"], "/user/alice/ezbids/")
+    body = b"".join(
+        b'fetch("/ezbids/api/%d");' % i + b"x" * random.Random(i).randint(0, 300)
+        for i in range(400)
+    )
+    compressed = gzip.compress(body) if upstream == "gzip" else zlib.compress(body)
+
+    rng = random.Random(upstream)
+    for _ in range(10):
+        transformer = wrapper.TextResponseTransformer(
+            rewriter,
+            decoder=wrapper.ContentDecoder(upstream),
+            encoder=wrapper.ContentEncoder(output) if output else None,
+        )
+        segments = []
+        position = 0
+        while position < len(compressed):
+            step = rng.randint(1, 2048)
+            segments += transformer.feed(compressed[position:position + step])
+            position += step
+        segments += transformer.close()
+
+        assert _decode(output, b"".join(bytes(s) for s in segments)) == rewriter.rewrite(body)
+
+
+def test_raw_deflate_without_zlib_wrapper_is_decoded():
+    wrapper = _load_webapp_wrapper_module()
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    body = b"body { background: url(/ezbids/bg.png); }" * 50
+    raw = compressor.compress(body) + compressor.flush()
+
+    decoder = wrapper.ContentDecoder("deflate")
+    assert decoder.decompress(raw[:10]) + decoder.decompress(raw[10:]) + decoder.flush() == body
+
+
+def _get(socket_path, path):
+    return unix_request(socket_path, "GET", path, headers={"Accept-Encoding": "gzip, deflate"})
+
+
+class _GzipBackendHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = gzip.compress(b'fetch("/ezbids/api/info");' * 100)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/javascript")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def test_proxied_gzip_javascript_is_rewritten_and_stays_compressed(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_GzipBackendHandler) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1]))
+        app.container_ready = True
+        with serve_webapp(wrapper, app) as socket_path:
+            response, body = _get(socket_path, "/user/alice/ezbids/app.js")
+
+    assert response.getheader("Content-Encoding") == "gzip"
+    assert response.getheader("Transfer-Encoding") == "chunked"
+    assert gzip.decompress(body) == b'fetch("/user/alice/ezbids/api/info");' * 100
+
+
+def _response(content_type, status_code=200, **headers):
+    headers = {name.replace("_", "-"): value for name, value in headers.items()}
+    return SimpleNamespace(status_code=status_code, headers={"content-type": content_type, **headers})
+
+
+def test_compressor_takes_text_bodies_large_enough_to_be_worth_it():
+    wrapper = _load_webapp_wrapper_module()
+    compressor = wrapper.ResponseCompressor(6, 1024, 0.8)
+
+    assert compressor.applies(_response("application/json; charset=utf-8", content_length="5000"))
+    assert compressor.applies(_response("text/css"))  # unknown length
+    assert compressor.applies(_response("application/vnd.api+json"))
+    assert not compressor.applies(_response("application/json", content_length="200"))
+    assert not compressor.applies(_response("image/png"))
+    assert not compressor.applies(_response("text/event-stream"))
+    assert not compressor.applies(_response("text/plain", content_encoding="zstd"))
+    assert not compressor.applies(_response("text/plain", cache_control="no-transform"))
+    assert not compressor.applies(_response("text/plain", status_code=206, content_range="bytes 0-9/99"))
+
+
+def test_cpu_monitor_reports_the_share_of_a_core_used_over_the_last_window():
+    wrapper = _load_webapp_wrapper_module()
+    now, cpu = [100.0], [10.0]
+    monitor = wrapper.ProcessCpuMonitor(window=1.0, clock=lambda: now[0], cpu_clock=lambda: cpu[0])
+
+    now[0], cpu[0] = 102.0, 11.8
+    assert monitor.usage() == pytest.approx(0.9)
+    # Within the window the last reading stands
+    now[0], cpu[0] = 102.5, 11.8
+    assert monitor.usage() == pytest.approx(0.9)
+    now[0], cpu[0] = 103.0, 12.0
+    assert monitor.usage() == pytest.approx(0.2)
+
+
+JSON_BODY = b'{"subjects": [' + b", ".join(b'{"id": "sub-%03d", "session": "ses-01"}' % n for n in range(300)) + b"]}"
+
+
+class _PlainBackendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        content_type, body = {
+            "/data.json": ("application/json", JSON_BODY),
+            "/tiny.json": ("application/json", b'{"ok": true}'),
+            "/image.png": ("image/png", os.urandom(4096)),
+        }[self.path]
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", '"v1"')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_uncompressed_text_is_compressed_on_the_fly_within_the_cpu_budget(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_PlainBackendHandler) as backend:
+        config = webapp_config(wrapper, tmp_path, "dicompare", backend.server_address[1], path_rewrites=[])
+        app = wrapper.WebappApp(config)
+        app.container_ready = True
+        load = [0.1]
+        app.compressor = wrapper.ResponseCompressor(
+            6, 1024, 0.8, cpu_monitor=SimpleNamespace(usage=lambda: load[0])
+        )
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            response, body = _get(socket_path, "/user/alice/dicompare/data.json")
+            assert response.getheader("Content-Encoding") == "gzip"
+            assert response.getheader("Vary") == "Accept-Encoding"
+            assert response.getheader("ETag") == 'W/"v1"'
+            assert response.getheader("Content-Length") is None
+            assert gzip.decompress(body) == JSON_BODY
+            assert len(body) < len(JSON_BODY) // 4
+
+            # Too small, or not worth compressing: passed through as sent
+            for path in ("/tiny.json", "/image.png"):
+                response, body = _get(socket_path, f"/user/alice/dicompare{path}")
+                assert response.getheader("Content-Encoding") is None
+                assert response.getheader("ETag") == '"v1"'
+
+            # A saturated wrapper stops compressing new responses
+            load[0] = 0.95
+            response, body = _get(socket_path, "/user/alice/dicompare/data.json")
+            assert response.getheader("Content-Encoding") is None
+            assert body == JSON_BODY
+
+    metrics = app.metrics.snapshot()
+    assert metrics["compression_input_bytes_total", None] == len(JSON_BODY)
+    assert metrics["compression_skipped_total", None] == 1
@@ -0,0 +1,213 @@
+import http.server
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import pytest
+
+from testlib import http_backend, load_source_module, resolve_source, unix_request
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_daemon",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+class _NamedBackendHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = f"{self.server.name} {self.path}".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _config(wrapper, tmp_path, app_name, webapps):
+    config = wrapper.WebappConfig(app_name, webapps)
+    config.socket_path = f"/tmp/ndwrap-daemon-{os.getpid()}-{app_name}.sock"
+    config.logfile = str(tmp_path / f"{app_name}_wrapper.log")
+    config.asset_cache_mb = 0
+    config.idle_timeout = 0
+    return config
+
+
+def _get(socket_path, path):
+    return unix_request(socket_path, "GET", path)[1]
+
+
+@pytest.fixture
+def daemon_apps(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_NamedBackendHandler) as alpha, http_backend(_NamedBackendHandler) as beta:
+        alpha.name, beta.name = "alpha", "beta"
+        webapps = {backend.name: {"port": backend.server_address[1]} for backend in (alpha, beta)}
+        webapps["viewer"] = {"direct_url": "https://viewer.example.test/"}
+        wrapper.CONFIG_PATH = tmp_path / "webapps.json"
+        wrapper.CONFIG_PATH.write_text(json.dumps({"webapps": webapps}))
+
+        # Short owner-only directory: tmp_path can exceed the Unix socket path limit
+        control_dir = tempfile.mkdtemp(prefix="ndwrap-daemon-")
+        daemon = wrapper.WebappDaemon(webapps, os.path.join(control_dir, "control.sock"))
+        for app_name in wrapper.container_webapp_names(webapps):
+            daemon.add_app(_config(wrapper, tmp_path, app_name, webapps))
+
+        yield wrapper, daemon
+        daemon.close()
+        shutil.rmtree(control_dir, ignore_errors=True)
+
+
+def test_one_daemon_serves_every_container_app_from_its_own_socket(daemon_apps):
+    _wrapper, daemon = daemon_apps
+    alpha, beta = daemon.apps["alpha"], daemon.apps["beta"]
+    assert sorted(daemon.apps) == ["alpha", "beta"]
+
+    alpha.container_ready = True
+    beta.container_ready = True
+    assert _get(alpha.config.socket_path, "/user/alice/alpha/data") == b"alpha /data"
+    assert _get(beta.config.socket_path, "/user/alice/beta/data") == b"beta /data"
+
+    # Per-app state stays separate
+    beta.container_ready = False
+    beta.container_error = "beta failed"
+    assert b'"ready": true' in _get(alpha.config.socket_path, "/user/alice/alpha/alpha-wrapper-status")
+    assert b'"error": null' in _get(alpha.config.socket_path, "/user/alice/alpha/alpha-wrapper-status")
+
+
+def _attach(control_path, app_name):
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(5)
+    conn.connect(control_path)
+    conn.sendall(f"attach {app_name}\n".encode())
+    reply = b""
+    while not reply.endswith(b"\n"):
+        data = conn.recv(1024)
+        if not data:
+            break
+        reply += data
+    return conn, reply
+
+
+def test_launchers_attach_to_start_a_backend_and_the_last_detach_stops_it(daemon_apps, monkeypatch):
+    _wrapper, daemon = daemon_apps
+    alpha = daemon.apps["alpha"]
+    events = []
+    monkeypatch.setattr(alpha, "ensure_container_starting", lambda reason: events.append(reason))
+    monkeypatch.setattr(alpha, "stop_backend", lambda message: events.append(message))
+    daemon.start_control_socket()
+    assert os.stat(daemon.control_path).st_mode & 0o777 == 0o600
+
+    first, reply = _attach(daemon.control_path, "alpha")
+    assert reply == b"ok\n"
+    second, reply = _attach(daemon.control_path, "alpha")
+    assert reply == b"ok\n"
+    assert events == ["launcher attached", "launcher attached"]
+
+    first.close()
+    deadline = time.time() + 5
+    while alpha.attachments != 1:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert len(events) == 2
+
+    second.close()
+    deadline = time.time() + 5
+    while len(events) < 3:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    assert events[2] == "Last launcher detached; stopping backend"
+
+    conn, reply = _attach(daemon.control_path, "nosuchapp")
+    conn.close()
+    assert reply.startswith(b"error Unknown webapp: nosuchapp")
+
+
+def test_attach_client_reports_daemon_errors(daemon_apps):
+    _wrapper, daemon = daemon_apps
+    daemon.start_control_socket()
+    attach_script = resolve_source(
+        "/opt/neurodesktop/webapp_wrapper/webapp_attach.py",
+        "config/jupyter/webapp_wrapper/webapp_attach.py",
+    )
+
+    result = subprocess.run(
+        [sys.executable, str(attach_script), "nosuchapp"],
+        env={**os.environ, "NEURODESK_WEBAPP_DAEMON_SOCKET": daemon.control_path},
+        capture_output=True,
+        text=True,
+        timeout=10,
+    )
+
+    assert result.returncode == 1
+    assert "Unknown webapp: nosuchapp" in result.stdout
+
+
+def test_control_socket_and_lock_refuse_shared_or_symlinked_paths(daemon_apps, tmp_path):
+    wrapper, daemon = daemon_apps
+    shared = tmp_path / "shared"
+    shared.mkdir()
+    shared.chmod(0o777)
+
+    daemon.control_path = str(shared / "control.sock")
+    with pytest.raises(PermissionError):
+        daemon.start_control_socket()
+    assert not os.path.exists(daemon.control_path)
+
+    private = tmp_path / "private"
+    private.mkdir(mode=0o700)
+    (private / "daemon.lock").symlink_to(tmp_path / "elsewhere")
+    wrapper.DAEMON_LOCK_PATH = str(private / "daemon.lock")
+    with pytest.raises(OSError):
+        wrapper.acquire_daemon_lock()
+    assert not (tmp_path / "elsewhere").exists()
+
+
+def test_attach_client_refuses_a_control_socket_served_by_another_user(daemon_apps, monkeypatch):
+    _wrapper, daemon = daemon_apps
+    daemon.start_control_socket()
+    attach = load_source_module(
+        "webapp_attach_peer",
+        "/opt/neurodesktop/webapp_wrapper/webapp_attach.py",
+        "config/jupyter/webapp_wrapper/webapp_attach.py",
+    )
+    monkeypatch.setattr(attach, "CONTROL_SOCKET", daemon.control_path)
+    sock = attach.connect()
+    assert sock is not None
+    sock.close()
+
+    uid = os.getuid()
+    monkeypatch.setattr(attach.os, "getuid", lambda: uid + 1)
+    with pytest.raises(PermissionError):
+        attach.connect()
+
+
+def test_idle_scheduler_checks_each_app_on_its_own_interval(daemon_apps, monkeypatch):
+    _wrapper, daemon = daemon_apps
+    checks = []
+    for app in daemon.apps.values():
+        app.config.idle_timeout = 60
+        app.next_idle_check = 0
+        monkeypatch.setattr(app, "check_idle", lambda name=app.config.app_name: checks.append(name))
+    daemon.apps["alpha"].config.idle_check_interval = 0.05
+    daemon.apps["beta"].config.idle_check_interval = 60
+
+    scheduler = threading.Thread(target=daemon.run_idle_scheduler, daemon=True)
+    scheduler.start()
+    time.sleep(0.5)
+    daemon.shutdown("test finished")
+    scheduler.join(5)
+
+    assert checks.count("beta") == 1
+    assert checks.count("alpha") >= 5
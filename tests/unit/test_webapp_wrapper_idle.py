@@ -0,0 +1,294 @@
+import http.server
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_idle",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _start_sleeping_backend(wrapper, tmp_path, cgroup_limits=None):
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, tmp_path, "idleapp",
+        startup_command="echo started; exec sleep 60",
+        startup_timeout=10,
+        stop_timeout=2,
+        ready_probes=[{"type": "output", "pattern": "started"}],
+        cgroup_limits=cgroup_limits or {},
+    ))
+    thread = threading.Thread(target=app.start_container, daemon=True)
+    thread.start()
+    assert app.wait_for_container_ready(10) is True
+    thread.join(5)
+    return app
+
+
+def _process_state(pid):
+    with open(f"/proc/{pid}/stat") as f:
+        return f.read().rsplit(")", 1)[1].split()[0]
+
+
+def _process_alive(pid):
+    try:
+        return _process_state(pid) != "Z"
+    except OSError:
+        return False
+
+
+def test_idle_action_defaults_to_stop_and_reads_environment(monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+
+    monkeypatch.delenv("NEURODESK_WEBAPP_IDLE_ACTION", raising=False)
+    assert wrapper.get_default_idle_action() == "stop"
+    monkeypatch.setenv("NEURODESK_WEBAPP_IDLE_ACTION", "Freeze")
+    assert wrapper.get_default_idle_action() == "freeze"
+    assert wrapper.parse_idle_action("hibernate", "stop") == "stop"
+    assert wrapper.get_default_idle_kill_timeout() == 1800
+
+
+def test_backend_without_cgroup_is_frozen_with_sigstop_and_thawed(tmp_path, monkeypatch):
+    monkeypatch.setenv("NEURODESK_WEBAPP_CGROUP_ROOT", str(tmp_path / "no-cgroupfs"))
+    wrapper = _load_webapp_wrapper_module()
+    app = _start_sleeping_backend(wrapper, tmp_path)
+    pid = app.container_process.pid
+    try:
+        assert app.container_cgroup is None
+        assert app.freeze_backend_for_idle(120) is True
+        assert app.container_frozen_by == "sigstop"
+        deadline = time.time() + 2
+        while _process_state(pid) != "T":
+            assert time.time() < deadline
+            time.sleep(0.01)
+
+        app.thaw_backend("test")
+        assert app.container_frozen_by is None
+        deadline = time.time() + 2
+        while _process_state(pid) == "T":
+            assert time.time() < deadline
+            time.sleep(0.01)
+        wrapper.flush_logs()
+        assert "Thawed backend (test) in" in open(app.config.logfile).read()
+    finally:
+        app.stop_container_processes()
+
+
+def test_stopping_a_frozen_backend_thaws_it_first(tmp_path, monkeypatch):
+    monkeypatch.setenv("NEURODESK_WEBAPP_CGROUP_ROOT", str(tmp_path / "no-cgroupfs"))
+    wrapper = _load_webapp_wrapper_module()
+    app = _start_sleeping_backend(wrapper, tmp_path)
+    process = app.container_process
+    assert app.freeze_backend_for_idle(120) is True
+
+    started = time.time()
+    app.stop_container_processes()
+
+    assert process.wait(5) is not None
+    # SIGTERM was acted on rather than escalating to SIGKILL after stop_timeout
+    assert time.time() - started < app.config.stop_timeout
+    assert app.container_frozen_by is None
+
+
+@pytest.mark.skipif(
+    os.geteuid() != 0 or not os.path.exists("/proc/self/mountinfo"),
+    reason="needs a writable cgroup v2 hierarchy",
+)
+def test_backend_in_a_delegated_cgroup_is_frozen_with_the_cgroup_freezer(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    parent = wrapper.get_backend_cgroup_parent()
+    if parent is None or not os.access(parent / "cgroup.procs", os.W_OK):
+        pytest.skip("no writable cgroup v2 hierarchy")
+    app = _start_sleeping_backend(wrapper, tmp_path)
+    cgroup = app.container_cgroup
+    if cgroup is None or not (cgroup.path / "cgroup.freeze").exists():
+        app.stop_container_processes()
+        pytest.skip("cgroup freezer unavailable")
+    try:
+        assert app.container_process.pid in cgroup.pids()
+        assert app.freeze_backend_for_idle(120) is True
+        assert app.container_frozen_by == "cgroup"
+        assert cgroup.wait_for_event("frozen", 1, timeout=2)
+
+        app.thaw_backend("test")
+        assert cgroup.events()["frozen"] == 0
+    finally:
+        app.stop_container_processes()
+
+
+class _OkHandler(http.server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+
+def test_asyncio_engine_keeps_serving_while_a_cgroup_thaw_is_pending(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    thawing = threading.Event()
+    release = threading.Event()
+
+    def wait_for_event(_name, _value, timeout):
+        # The kernel is slow to report the thaw; hold the wait until released
+        thawing.set()
+        release.wait(5)
+        return True
+
+    with http_backend(_OkHandler) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, "idleapp", backend.server_address[1]))
+        app.container_ready = True
+        app.container_frozen_by = "cgroup"
+        app.container_frozen_at = time.time()
+        app.container_cgroup = SimpleNamespace(thaw=lambda: None, wait_for_event=wait_for_event)
+
+        with serve_webapp(wrapper, app, "asyncio") as socket_path:
+            statuses = []
+            thawed = threading.Thread(
+                target=lambda: statuses.append(unix_request(socket_path, "GET", "/user/alice/idleapp/data")[0].status),
+                daemon=True,
+            )
+            thawed.start()
+            assert thawing.wait(5)
+
+            response, _body = unix_request(
+                socket_path, "GET", "/user/alice/idleapp/idleapp-wrapper-status", timeout=2
+            )
+            assert response.status == 200
+            assert statuses == []
+
+            release.set()
+            thawed.join(5)
+            assert statuses == [200]
+
+
+class FakeCgroupKernel:
+    """Plays the kernel's part for a cgroup directory made of plain files.
+
+    Keeps cgroup.events in step with whether the listed pids are alive and
+    acts on writes to cgroup.kill.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.kills = 0
+        path.mkdir(parents=True)
+        for name in ("cgroup.procs", "cgroup.kill", "cgroup.freeze"):
+            (path / name).write_text("")
+        (path / "cgroup.events").write_text("populated 0\nfrozen 0\n")
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _alive(self):
+        alive = []
+        for pid in (self.path / "cgroup.procs").read_text().split():
+            if _process_alive(int(pid)):
+                alive.append(int(pid))
+        return alive
+
+    def _run(self):
+        while not self._stop.is_set():
+            if (self.path / "cgroup.kill").read_text().strip() == "1":
+                (self.path / "cgroup.kill").write_text("")
+                self.kills += 1
+                for pid in self._alive():
+                    os.kill(pid, 9)
+            populated = 1 if self._alive() else 0
+            # Replaced atomically: readers never see a half-written file
+            (self.path / "events.tmp").write_text(f"populated {populated}\nfrozen 0\n")
+            os.replace(self.path / "events.tmp", self.path / "cgroup.events")
+            time.sleep(0.01)
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(2)
+
+
+def test_backend_is_torn_down_through_its_cgroup_without_scanning_proc(tmp_path, monkeypatch):
+    monkeypatch.setenv("NEURODESK_WEBAPP_CGROUP_ROOT", str(tmp_path / "cgroup"))
+    kernel = FakeCgroupKernel(tmp_path / "cgroup" / "neurodesk-webapp-idleapp")
+    procs = kernel.path / "cgroup.procs"
+    wrapper = _load_webapp_wrapper_module()
+
+    def no_proc_scan(*_args):
+        raise AssertionError("/proc scan used despite a populated cgroup")
+
+    monkeypatch.setattr(wrapper, "_find_session_pids", no_proc_scan)
+    monkeypatch.setattr(wrapper, "_kill_processes_on_port", no_proc_scan)
+
+    try:
+        app = _start_sleeping_backend(wrapper, tmp_path)
+        process = app.container_process
+        assert app.container_cgroup.pids() == [process.pid]
+
+        # A child that ignores SIGTERM and leaves the process group and session
+        escaped = int(os.popen(
+            f"trap '' TERM; setsid sleep 60 > /dev/null 2>&1 & echo $! | tee -a {procs}"
+        ).read())
+        deadline = time.time() + 2
+        while not app.container_cgroup.is_populated():
+            assert time.time() < deadline
+            time.sleep(0.01)
+        app.config.stop_timeout = 0.5
+
+        app.stop_container_processes()
+
+        assert kernel.kills == 1
+        assert process.wait(5) is not None
+        assert not _process_alive(escaped)
+        assert app.container_cgroup is None
+    finally:
+        kernel.close()
+
+
+def test_cgroup_event_wait_returns_as_soon_as_the_value_changes(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    (tmp_path / "cgroup.events").write_text("populated 1\nfrozen 0\n")
+    cgroup = wrapper.BackendCgroup(tmp_path)
+
+    assert cgroup.wait_for_event("populated", 0, timeout=0.05) is False
+    threading.Timer(0.1, (tmp_path / "cgroup.events").write_text, ["populated 0\nfrozen 0\n"]).start()
+    started = time.time()
+    assert cgroup.wait_for_event("populated", 0, timeout=5) is True
+    assert time.time() - started < 1
+
+
+def test_backend_cgroup_limits_are_applied_at_launch(tmp_path, monkeypatch):
+    monkeypatch.setenv("NEURODESK_WEBAPP_CGROUP_ROOT", str(tmp_path / "cgroup"))
+    kernel = FakeCgroupKernel(tmp_path / "cgroup" / "neurodesk-webapp-idleapp")
+    (tmp_path / "cgroup" / "cgroup.subtree_control").write_text("")
+    # The io controller is not delegated here
+    (kernel.path / "cgroup.controllers").write_text("cpu memory\n")
+    wrapper = _load_webapp_wrapper_module()
+    limits = wrapper.parse_cgroup_limits(
+        {"cpu_quota": 1.5, "memory_max": "512M", "io_weight": 50}, "idleapp"
+    )
+
+    try:
+        app = _start_sleeping_backend(wrapper, tmp_path, limits)
+        assert (kernel.path / "cpu.max").read_text() == "150000 100000"
+        assert (kernel.path / "memory.max").read_text() == str(512 * 1024 * 1024)
+        assert not (kernel.path / "io.weight").exists()
+        assert app.resource_monitor.cgroup is app.container_cgroup
+        assert app.container_cgroup.wait_for_event("populated", 1, timeout=2)
+
+        app.stop_container_processes()
+        assert app.resource_monitor is None
+        wrapper.flush_logs()
+        log_text = open(app.config.logfile).read()
+        assert "Backend limits: cpu.max=150000 100000, memory.max=536870912" in log_text
+        assert "Cannot set io.weight=default 50: io controller is not available" in log_text
+    finally:
+        kernel.close()
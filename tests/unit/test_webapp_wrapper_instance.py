@@ -0,0 +1,134 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from testlib import load_source_module, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_instance",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+# Records every call; instances are marker files, exec runs the command itself
+FAKE_APPTAINER = """#!/bin/bash
+echo "$*" >> "$FAKE_APPTAINER_DIR/calls"
+name="${@: -1}"
+case "$1 $2" in
+  "instance start") touch "$FAKE_APPTAINER_DIR/$name"; exit 0 ;;
+  "instance stop") rm -f "$FAKE_APPTAINER_DIR/$name"; exit 0 ;;
+  "instance list")
+    if [ -e "$FAKE_APPTAINER_DIR/$name" ]; then
+      echo "{\\"instances\\": [{\\"instance\\": \\"$name\\"}]}"
+    else
+      echo '{"instances": []}'
+    fi
+    exit 0 ;;
+esac
+[ "$1" = exec ] && exec bash -c "$3"
+exit 1
+"""
+
+
+@pytest.fixture
+def fake_apptainer(tmp_path, monkeypatch):
+    state = tmp_path / "apptainer"
+    state.mkdir()
+    binary = tmp_path / "bin" / "apptainer"
+    binary.parent.mkdir()
+    binary.write_text(FAKE_APPTAINER)
+    binary.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{binary.parent}:{os.environ['PATH']}")
+    monkeypatch.setenv("FAKE_APPTAINER_DIR", str(state))
+    calls = state / "calls"
+    return lambda: [call.split(" ", 2)[:2] for call in calls.read_text().splitlines()] if calls.exists() else []
+
+
+def test_launch_mode_defaults_to_exec_and_reads_the_environment(monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    monkeypatch.delenv("NEURODESK_WEBAPP_LAUNCH_MODE", raising=False)
+    assert wrapper.get_default_launch_mode() == "exec"
+    monkeypatch.setenv("NEURODESK_WEBAPP_LAUNCH_MODE", " Instance ")
+    assert wrapper.get_default_launch_mode() == "instance"
+    assert wrapper.parse_launch_mode("docker", "exec") == "exec"
+
+
+def test_instance_is_reused_until_its_image_changes(tmp_path, fake_apptainer):
+    wrapper = _load_webapp_wrapper_module()
+    image = tmp_path / "ezbids.sif"
+    image.write_bytes(b"sif")
+    messages = []
+    instance = wrapper.ApptainerInstance("neurodesk-webapp-ezbids", str(image), log=messages.append)
+
+    assert instance.ensure_running() and instance.active
+    assert instance.ensure_running()
+    assert fake_apptainer().count(["instance", "start"]) == 1
+    assert messages[-1] == "Reusing apptainer instance neurodesk-webapp-ezbids"
+
+    image.write_bytes(b"rebuilt sif")
+    assert instance.ensure_running()
+    assert fake_apptainer()[-2:] == [["instance", "stop"], ["instance", "start"]]
+    assert any("changed; restarting" in message for message in messages)
+
+    instance.stop("test")
+    assert not instance.active
+    assert not (tmp_path / "apptainer" / "neurodesk-webapp-ezbids").exists()
+    # Stopping again does nothing
+    calls = len(fake_apptainer())
+    instance.stop("test")
+    assert len(fake_apptainer()) == calls
+
+
+def test_missing_apptainer_falls_back_to_exec(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    image = tmp_path / "ezbids.sif"
+    image.write_bytes(b"sif")
+    monkeypatch.setenv("PATH", str(tmp_path / "empty"))
+    messages = []
+    instance = wrapper.ApptainerInstance("neurodesk-webapp-ezbids", str(image), log=messages.append)
+
+    assert instance.ensure_running() is False
+    assert not instance.active
+    assert "instance start failed" in messages[-1]
+
+
+def test_idle_stops_keep_the_instance_until_the_instance_timeout(tmp_path, fake_apptainer):
+    wrapper = _load_webapp_wrapper_module()
+    image = tmp_path / "probeapp.sif"
+    image.write_bytes(b"sif")
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, tmp_path, "probeapp",
+        startup_command="echo up; sleep 30",
+        startup_timeout=10,
+        stop_timeout=2,
+        ready_probes=[{"type": "output", "pattern": "up"}],
+        local_sif=str(image),
+        launch_mode="instance",
+        instance_timeout=600,
+    ))
+
+    for _ in range(2):
+        app.reset_container_runtime_state()
+        app.start_container()
+        assert app.container_ready is True
+        app.stop_container_processes()
+        app.reset_container_runtime_state()
+
+    calls = fake_apptainer()
+    assert calls.count(["instance", "start"]) == 1
+    assert calls.count(["exec", "instance://neurodesk-webapp-probeapp"]) == 2
+
+    app.stop_idle_instance(599)
+    assert app.container_instance.active
+    app.stop_idle_instance(600)
+    assert not app.container_instance.active
+    assert fake_apptainer()[-1] == ["instance", "stop"]
+
+    wrapper.flush_logs()
+    log_text = Path(app.config.logfile).read_text()
+    assert "Reusing apptainer instance neurodesk-webapp-probeapp" in log_text
+    assert "Stopping apptainer instance neurodesk-webapp-probeapp (no traffic for 600s)" in log_text
@@ -0,0 +1,193 @@
+import http.client
+import io
+import http.server
+import socket
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_keepalive",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+# Large enough to be sent with sendmsg() in several backend reads
+LARGE_BODY = bytes(range(256)) * 4099
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    """HTTP/1.0 backend: /sized sends Content-Length, /unsized ends at close."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        body = LARGE_BODY if self.path.startswith("/large") else b"backend " + self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        if self.path in ("/sized", "/large-sized"):
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_HEAD = do_GET
+
+
+@pytest.fixture(params=["threaded", "asyncio"])
+def keepalive_wrapper(request, tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1], path_rewrites=[]))
+        app.container_ready = True
+        with serve_webapp(wrapper, app, request.param) as socket_path:
+            yield SimpleNamespace(app=app, socket_path=socket_path)
+
+
+def _connect(socket_path):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(5)
+    client.connect(socket_path)
+    return client
+
+
+def _exchange(client, method, path, body=b"", version="HTTP/1.1"):
+    head = f"{method} {path} {version}\r\nHost: hub\r\n"
+    if body:
+        head += f"Content-Length: {len(body)}\r\n"
+    client.sendall(head.encode() + b"\r\n" + body)
+    response = http.client.HTTPResponse(client, method=method)
+    response.begin()
+    return response, response.read()
+
+
+def _closed(client):
+    try:
+        return client.recv(1) == b""
+    except ConnectionResetError:
+        return True
+
+
+def test_every_response_is_framed_so_one_connection_serves_many_requests(keepalive_wrapper, monkeypatch):
+    monkeypatch.setattr(keepalive_wrapper.app, "ensure_container_starting", lambda _reason: None)
+    client = _connect(keepalive_wrapper.socket_path)
+    try:
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+        assert response.status == 200 and response.getheader("Content-Length")
+        assert b'"ready": true' in body
+
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/sized")
+        assert body == b"backend /sized"
+        assert response.getheader("Content-Length") == str(len(body))
+
+        # No upstream length: the wrapper adds chunked framing
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/unsized")
+        assert body == b"backend /unsized"
+        assert response.getheader("Transfer-Encoding") == "chunked"
+
+        response, body = _exchange(client, "HEAD", "/user/alice/ezbids/unsized")
+        assert response.status == 200 and body == b""
+
+        # A heartbeat with a body nobody reads still leaves the connection usable
+        response, body = _exchange(client, "POST", "/user/alice/ezbids/ezbids-wrapper-status", b"{}")
+        assert response.status == 204
+
+        keepalive_wrapper.app.container_ready = False
+        keepalive_wrapper.app.container_error = "failed"
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/api/info")
+        assert response.status == 503
+        assert b"still starting up" in body
+
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+        assert b'"error": "failed"' in body
+        assert not response.will_close
+    finally:
+        client.close()
+
+
+def test_large_bodies_keep_their_framing_when_written_with_sendmsg(keepalive_wrapper):
+    client = _connect(keepalive_wrapper.socket_path)
+    try:
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/large-unsized")
+        assert response.getheader("Transfer-Encoding") == "chunked"
+        assert body == LARGE_BODY
+
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/large-sized")
+        assert response.getheader("Content-Length") == str(len(LARGE_BODY))
+        assert body == LARGE_BODY
+
+        # The next response on the connection follows the large ones intact
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/unsized")
+        assert body == b"backend /unsized"
+    finally:
+        client.close()
+
+
+def test_partial_sendmsg_resumes_mid_segment():
+    wrapper = _load_webapp_wrapper_module()
+    sent = bytearray()
+
+    class _Connection:
+        def sendmsg(self, buffers):
+            # Accept at most 5000 bytes per call, like a full socket buffer
+            data = b"".join(bytes(buffer) for buffer in buffers)[:5000]
+            sent.extend(data)
+            return len(data)
+
+    handler = wrapper.WebappHandler.__new__(wrapper.WebappHandler)
+    handler.connection = _Connection()
+    handler.wfile = io.BytesIO()
+    handler._chunked = True
+    payload = bytes(range(256)) * 100
+
+    handler._write_chunk([payload[:9000], b"", payload[9000:]])
+    assert bytes(sent) == f"{len(payload):x}\r\n".encode() + payload + b"\r\n"
+
+    # Small chunks stay in the buffer for the next write
+    sent.clear()
+    handler._write_chunk(b"tail")
+    assert sent == b"" and handler.wfile.getvalue() == b"4\r\ntail\r\n"
+
+
+def test_connection_closes_after_the_request_cap(keepalive_wrapper):
+    keepalive_wrapper.app.config.keepalive_max_requests = 3
+    client = _connect(keepalive_wrapper.socket_path)
+    try:
+        for _ in range(2):
+            response, _body = _exchange(client, "GET", "/user/alice/ezbids/sized")
+            assert response.getheader("Connection") is None
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/sized")
+        assert body == b"backend /sized"
+        assert response.getheader("Connection") == "close"
+        assert _closed(client)
+    finally:
+        client.close()
+
+
+def test_idle_connection_is_closed_after_the_keepalive_timeout(keepalive_wrapper):
+    keepalive_wrapper.app.config.keepalive_timeout = 1
+    client = _connect(keepalive_wrapper.socket_path)
+    try:
+        _exchange(client, "GET", "/user/alice/ezbids/sized")
+        started = time.monotonic()
+        assert _closed(client)
+        assert 0.5 < time.monotonic() - started < 4
+    finally:
+        client.close()
+
+
+def test_http10_client_gets_a_close_delimited_body(keepalive_wrapper):
+    client = _connect(keepalive_wrapper.socket_path)
+    try:
+        response, body = _exchange(client, "GET", "/user/alice/ezbids/unsized", version="HTTP/1.0")
+        assert body == b"backend /unsized"
+        assert response.getheader("Transfer-Encoding") is None
+        assert _closed(client)
+    finally:
+        client.close()
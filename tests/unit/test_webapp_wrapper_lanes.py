@@ -0,0 +1,224 @@
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_lanes",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+MiB = 1024 * 1024
+
+
+def test_requests_are_classified_from_method_path_and_upload_size():
+    wrapper = _load_webapp_wrapper_module()
+
+    def lane(method, path, headers=None):
+        return wrapper.classify_request_lane(method, path, headers or {}, 8 * MiB)
+
+    assert lane("GET", "/api/info", {"Accept": "application/json"}) == "interactive"
+    assert lane("GET", "/index.html") == "interactive"
+    assert lane("POST", "/api/upload", {"Content-Length": "1024"}) == "interactive"
+    assert lane("POST", "/api/upload", {"Content-Length": str(8 * MiB)}) == "bulk"
+    assert lane("POST", "/api/upload", {"Transfer-Encoding": "chunked"}) == "bulk"
+    assert lane("GET", "/download/sub-01_T1w.NII.GZ") == "bulk"
+    assert lane("DELETE", "/files/session.zip") == "interactive"
+
+
+def test_responses_are_classified_from_type_length_and_disposition():
+    wrapper = _load_webapp_wrapper_module()
+
+    def lane(**headers):
+        headers = {name.replace("_", "-"): value for name, value in headers.items()}
+        return wrapper.classify_response_lane(wrapper.httpx.Headers(headers), 8 * MiB)
+
+    assert lane(content_type="application/json") == "interactive"
+    assert lane(content_type="text/javascript", content_length=str(20 * MiB)) == "interactive"
+    assert lane(content_type="image/png", content_length="4096") == "interactive"
+    assert lane(content_type="image/png", content_length=str(9 * MiB)) == "bulk"
+    assert lane(content_type="application/zip") == "bulk"
+    assert lane(content_type="application/octet-stream", content_length="100") == "interactive"
+    assert lane(content_type="video/mp4", content_length=str(MiB)) == "bulk"
+    assert lane(content_type="text/csv", content_disposition='attachment; filename="x.csv"') == "bulk"
+
+
+def test_lane_hands_released_slots_to_waiters_in_arrival_order():
+    wrapper = _load_webapp_wrapper_module()
+    lane = wrapper.ProxyLane("bulk", 1)
+    woken = []
+
+    assert lane.try_acquire(lambda: woken.append("first")) is True
+    assert lane.try_acquire(lambda: woken.append("second")) is False
+    assert lane.try_acquire(lambda: woken.append("third")) is False
+    assert lane.stats() == {"active": 1, "queued": 2, "limit": 1, "requests": 1}
+
+    lane.release()
+    assert woken == ["second"]
+    lane.release()
+    assert woken == ["second", "third"]
+    lane.release()
+    assert lane.stats() == {"active": 0, "queued": 0, "limit": 1, "requests": 3}
+
+    # A request moved in after its response started may exceed the limit;
+    # releasing it does not hand out a slot the lane does not have
+    lane.try_acquire(lambda: None)
+    lane.add()
+    assert lane.try_acquire(lambda: woken.append("fourth")) is False
+    lane.release()
+    assert woken == ["second", "third"]
+    lane.release()
+    assert woken == ["second", "third", "fourth"]
+
+
+def test_token_bucket_paces_bulk_bodies_only_while_interactive_requests_are_about():
+    wrapper = _load_webapp_wrapper_module()
+    now = [100.0]
+    lanes = wrapper.ProxyLanes(2, 8 * MiB, 4 * MiB, clock=lambda: now[0])
+
+    # Nothing interactive yet: bulk bodies go at full speed
+    assert lanes.pace(64 * MiB) == 0.0
+
+    lane = lanes.classify("GET", "/api/info", {})
+    assert lane is lanes.interactive
+    lane.try_acquire(lambda: None)
+    assert lanes.pace(MiB) == 0.0  # The quarter-second burst
+    assert lanes.pace(4 * MiB) == pytest.approx(1.0)
+    now[0] += 0.5
+    assert lanes.pace(MiB) == pytest.approx(0.75)
+    assert lanes.stats()["bulk"]["paced_seconds"] == pytest.approx(1.8)
+
+    lanes.release(lane)
+    now[0] += wrapper.INTERACTIVE_PRESSURE_SECONDS + 10
+    assert lanes.pace(64 * MiB) == 0.0
+
+
+def test_responses_that_turn_out_bulk_move_lanes_and_their_path_is_remembered():
+    wrapper = _load_webapp_wrapper_module()
+    lanes = wrapper.ProxyLanes(2, 8 * MiB, 0)
+    headers = wrapper.httpx.Headers({
+        "Content-Type": "application/zip",
+        "Content-Disposition": 'attachment; filename="ezBIDS.zip"',
+    })
+
+    lane = lanes.classify("GET", "/api/export", {})
+    assert lane is lanes.interactive
+    lane.try_acquire(lambda: None)
+    lane = lanes.settle(lane, "/api/export", headers)
+    assert lane is lanes.bulk
+    assert lanes.interactive.stats()["active"] == 0
+    assert lanes.bulk.stats()["active"] == 1
+
+    assert lanes.classify("GET", "/api/export", {}) is lanes.bulk
+    assert lanes.classify("GET", "/api/info", {}) is lanes.interactive
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    """Archive downloads wait for ``server.release``; everything else is instant."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.endswith(".zip"):
+            self.server.release.wait(10)
+            body = b"PK" + b"\0" * 4096
+            content_type = "application/zip"
+        else:
+            body = b'{"ok": true}'
+            content_type = "application/json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _wait_for(condition):
+    deadline = time.time() + 5
+    while not condition():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_bulk_downloads_queue_behind_their_cap_while_interactive_requests_proceed(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        backend.release = threading.Event()
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1], path_rewrites=[]))
+        app.container_ready = True
+        app.lanes = wrapper.ProxyLanes(1, 8 * MiB, 0)
+
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            downloads = []
+            threads = [
+                threading.Thread(target=lambda name=name: downloads.append(
+                    unix_request(socket_path, "GET", f"/user/alice/ezbids/{name}")
+                ))
+                for name in ("first.zip", "second.zip")
+            ]
+            try:
+                threads[0].start()
+                _wait_for(lambda: app.lanes.bulk.stats()["active"] == 1)
+                threads[1].start()
+                _wait_for(lambda: app.lanes.bulk.stats()["queued"] == 1)
+
+                response, body = unix_request(socket_path, "GET", "/user/alice/ezbids/api/info")
+                assert (response.status, body) == (200, b'{"ok": true}')
+                _response, body = unix_request(socket_path, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+                lanes = json.loads(body)["lanes"]
+                assert lanes["bulk"]["active"] == 1 and lanes["bulk"]["queued"] == 1
+                assert lanes["interactive"] == {"active": 0, "queued": 0, "limit": 20, "requests": 1}
+
+                backend.release.set()
+                for thread in threads:
+                    thread.join(10)
+                assert [response.status for response, _body in downloads] == [200, 200]
+                # The slot is released once the proxy has finished with the response
+                _wait_for(lambda: app.lanes.bulk.stats()["active"] == 0)
+                assert app.lanes.bulk.stats() == {"active": 0, "queued": 0, "limit": 1, "requests": 2}
+            finally:
+                backend.release.set()
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_a_queued_request_gives_up_with_503_when_no_slot_frees(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    wrapper.LANE_WAIT_SECONDS = 0.2
+    with http_backend(_BackendHandler) as backend:
+        backend.release = threading.Event()
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1], path_rewrites=[]))
+        app.container_ready = True
+        app.lanes = wrapper.ProxyLanes(1, 8 * MiB, 0)
+
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            downloads = []
+            first = threading.Thread(target=lambda: downloads.append(
+                unix_request(socket_path, "GET", "/user/alice/ezbids/first.zip")
+            ))
+            try:
+                first.start()
+                _wait_for(lambda: app.lanes.bulk.stats()["active"] == 1)
+
+                response, body = unix_request(socket_path, "GET", "/user/alice/ezbids/second.zip")
+                assert response.status == 503
+                assert response.getheader("Retry-After") == "5"
+                assert json.loads(body)["status"] == "busy"
+                # The waiter left the queue; the slot holder is untouched
+                assert app.lanes.bulk.stats() == {"active": 1, "queued": 0, "limit": 1, "requests": 1}
+
+                backend.release.set()
+                first.join(10)
+                assert [response.status for response, _body in downloads] == [200]
+                _wait_for(lambda: app.lanes.bulk.stats()["active"] == 0)
+            finally:
+                backend.release.set()
@@ -0,0 +1,184 @@
+import json
+import os
+from pathlib import Path
+import subprocess
+
+from testlib import load_source_module, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_launch_plan",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _write_env_dump(path, env):
+    Path(path).write_bytes(b"\0".join(f"{name}={value}".encode() for name, value in env.items()))
+
+
+def test_plan_records_the_module_environment_and_is_dropped_when_its_inputs_change(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    modulefile = tmp_path / "ezbids" / "1.0.lua"
+    modulefile.parent.mkdir()
+    modulefile.write_text("prepend_path('PATH', '/cvmfs/containers/ezbids_1.0')\n")
+    revision = ["1234"]
+    messages = []
+    store = wrapper.LaunchPlanStore(
+        str(tmp_path / "plan.json"), log=messages.append, revision=lambda: revision[0]
+    )
+    base_env = {"PATH": "/usr/bin", "HOME": "/home/jovyan", "NEURODESK_WEBAPP_PORT": "4000", "OLD": "1"}
+    _write_env_dump(store.capture_path, {
+        "PATH": "/cvmfs/containers/ezbids_1.0:/usr/bin",
+        "HOME": "/home/jovyan",
+        "NEURODESK_WEBAPP_PORT": "4000",
+        "SINGULARITY_BINDPATH": "/cvmfs,/neurodesktop-storage",
+        "_LMFILES_": str(modulefile),
+        "SHLVL": "2",
+    })
+
+    plan = store.record("ezbids/1.0", base_env, 12.5)
+
+    assert not os.path.exists(store.capture_path)
+    assert plan["set_env"] == {
+        "PATH": "/cvmfs/containers/ezbids_1.0:/usr/bin",
+        "SINGULARITY_BINDPATH": "/cvmfs,/neurodesktop-storage",
+        "_LMFILES_": str(modulefile),
+    }
+    assert plan["unset_env"] == ["OLD"]
+    assert store.load("ezbids/1.0") == plan
+    assert wrapper.LaunchPlanStore.apply(plan, {**base_env, "NEURODESK_WEBAPP_PORT": "5000"}) == {
+        "PATH": "/cvmfs/containers/ezbids_1.0:/usr/bin",
+        "HOME": "/home/jovyan",
+        "NEURODESK_WEBAPP_PORT": "5000",
+        "SINGULARITY_BINDPATH": "/cvmfs,/neurodesktop-storage",
+        "_LMFILES_": str(modulefile),
+    }
+    assert "binds: /cvmfs,/neurodesktop-storage" in messages[-1]
+
+    assert store.load("ezbids/1.1") is None
+    assert not os.path.exists(store.path)
+
+    _write_env_dump(store.capture_path, {"_LMFILES_": str(modulefile)})
+    store.record("ezbids/1.0", base_env, 12.5)
+    revision[0] = "1235"
+    assert store.load("ezbids/1.0") is None
+    assert "CVMFS revision changed from 1234 to 1235" in messages[-1]
+
+    _write_env_dump(store.capture_path, {"_LMFILES_": str(modulefile)})
+    store.record("ezbids/1.0", base_env, 12.5)
+    modulefile.write_text("prepend_path('PATH', '/cvmfs/containers/ezbids_1.0_fixed')\n")
+    assert store.load("ezbids/1.0") is None
+    assert messages[-1] == "Discarding launch plan: module file changed"
+
+
+def test_plan_is_not_recorded_when_the_module_did_not_load(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    messages = []
+    store = wrapper.LaunchPlanStore(str(tmp_path / "plan.json"), log=messages.append, revision=lambda: None)
+    _write_env_dump(store.capture_path, {"PATH": "/usr/bin"})
+
+    assert store.record("ezbids/1.0", {"PATH": "/usr/bin"}, 3.0) is None
+    assert messages == ["Launch plan not recorded: ezbids/1.0 did not load"]
+    assert not os.path.exists(store.path)
+
+
+def test_planted_or_foreign_plans_are_never_applied(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    messages = []
+    store = wrapper.LaunchPlanStore(str(tmp_path / "plan.json"), log=messages.append, revision=lambda: None)
+    planted = {
+        "module_spec": "ezbids/1.0",
+        "revision": None,
+        "module_files": {},
+        "set_env": {"LD_PRELOAD": "/tmp/evil.so"},
+        "unset_env": [],
+        "startup_seconds": 1.0,
+    }
+
+    # A plan without module files would pass the freshness check
+    Path(store.path).write_text(json.dumps(planted))
+    assert store.load("ezbids/1.0") is None
+    assert messages[-1] == "Discarding launch plan: no module files recorded"
+
+    modulefile = tmp_path / "ezbids.lua"
+    modulefile.write_text("-- module\n")
+    planted["module_files"] = wrapper.module_file_stamps([str(modulefile)])
+
+    Path(store.path).write_text(json.dumps(planted))
+    os.chmod(store.path, 0o666)
+    assert store.load("ezbids/1.0") is None
+    assert not os.path.exists(store.path)
+
+    other = tmp_path / "other.json"
+    other.write_text(json.dumps(planted))
+    os.symlink(other, store.path)
+    assert store.load("ezbids/1.0") is None
+    assert not os.path.lexists(store.path)
+
+    if os.getuid() == 0:
+        Path(store.path).write_text(json.dumps(planted))
+        os.chown(store.path, 65534, 65534)
+        assert store.load("ezbids/1.0") is None
+
+    Path(store.path).write_text(json.dumps(planted))
+    os.chmod(store.path, 0o600)
+    assert store.load("ezbids/1.0")["set_env"] == {"LD_PRELOAD": "/tmp/evil.so"}
+
+
+def test_environment_capture_does_not_write_through_an_existing_file(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    store = wrapper.LaunchPlanStore(str(tmp_path / "plans" / "plan.json"), log=lambda message: None)
+    command = store.capture_command()
+    assert (tmp_path / "plans").stat().st_mode & 0o777 == 0o700
+
+    # Someone else creates the dump first, hoping to read the tokens
+    Path(store.capture_path).write_text("")
+    os.chmod(store.capture_path, 0o666)
+    result = subprocess.run(["bash", "-c", command], env={"SECRET_TOKEN": "abc"})
+    assert result.returncode != 0
+    assert Path(store.capture_path).read_text() == ""
+
+    os.unlink(store.capture_path)
+    subprocess.run(["bash", "-c", command], env={"SECRET_TOKEN": "abc"}, check=True)
+    assert os.stat(store.capture_path).st_mode & 0o777 == 0o600
+    assert wrapper.read_env_dump(store.capture_path)["SECRET_TOKEN"] == "abc"
+
+
+def test_warm_starts_run_the_startup_command_with_the_recorded_environment(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    modulefile = tmp_path / "probeapp.lua"
+    modulefile.write_text("-- module\n")
+    # Stands in for the module load: Lmod would export this itself
+    monkeypatch.setenv("_LMFILES_", str(modulefile))
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, tmp_path, "probeapp",
+        version="1.0",
+        startup_command='echo "opts=[$neurodesk_singularity_opts] up"; sleep 30',
+        startup_timeout=10,
+        stop_timeout=2,
+        ready_probes=[{"type": "output", "pattern": "up"}],
+    ))
+    app.launch_plans = app.create_launch_plan_store()
+
+    def start():
+        app.reset_container_runtime_state()
+        try:
+            app.start_container()
+            assert app.container_ready is True
+            return list(app.container_output)
+        finally:
+            app.stop_container_processes()
+
+    assert start() == ["opts=[ --writable-tmpfs ] up"]
+    plan = json.loads(Path(app.launch_plans.path).read_text())
+    assert plan["module_spec"] == "probeapp/1.0"
+    assert plan["set_env"]["neurodesk_singularity_opts"] == " --writable-tmpfs "
+
+    # The recorded variables reach the command without sourcing anything
+    assert start() == ["opts=[ --writable-tmpfs ] up"]
+    wrapper.flush_logs()
+    log_text = Path(app.config.logfile).read_text()
+    assert "Using cached launch plan for probeapp/1.0" in log_text
+    assert "Launch plan saved" in log_text
@@ -1,10 +1,14 @@
 import os
 from pathlib import Path
+import random
 import socket
 import threading
+import time
 from types import SimpleNamespace
 
-from testlib import load_source_module
+import pytest
+
+from testlib import load_source_module, serve_webapp, webapp_config
 
 
 def _load_webapp_wrapper_module():
@@ -36,9 +40,10 @@ def test_close_beacon_does_not_schedule_immediate_backend_stop(monkeypatch):
     scheduled_close_checks = []
     direct_stops = []
 
-    monkeypatch.setattr(wrapper, "log", lambda _message: None)
+    app = wrapper.WebappApp(SimpleNamespace(app_name="jamovi"))
+    monkeypatch.setattr(app, "log", lambda _message: None)
     monkeypatch.setattr(
-        wrapper,
+        app,
         "stop_backend_for_idle",
         lambda idle_for: direct_stops.append(idle_for),
     )
@@ -50,6 +55,7 @@ def test_close_beacon_does_not_schedule_immediate_backend_stop(monkeypatch):
     )
 
     handler = DummyStatusHandler()
+    handler.app = app
     wrapper.WebappHandler._send_status(handler, "POST", is_close=True)
 
     assert handler.responses == [204]
@@ -61,8 +67,8 @@ def test_close_beacon_does_not_schedule_immediate_backend_stop(monkeypatch):
 
 def test_location_rewrites_keep_relative_redirects_under_app_path():
     wrapper = _load_webapp_wrapper_module()
-    wrapper.config = SimpleNamespace(app_name="jamovi")
     handler = object.__new__(wrapper.WebappHandler)
+    handler.app = wrapper.WebappApp(SimpleNamespace(app_name="jamovi"))
     handler.path = "/user/alice/jamovi"
 
     assert (
@@ -123,11 +129,44 @@ def test_path_rewrite_map_supports_explicit_base_path_targets():
     )
 
 
-def test_jamovi_config_roots_use_browser_facing_base_path():
+def test_streamed_path_rewrites_match_whole_buffer_rewrites_at_any_split():
     wrapper = _load_webapp_wrapper_module()
-    wrapper.config = SimpleNamespace(app_name="jamovi")
+    rewriter = wrapper.PathRewriter([
+        (b"/a", b"/user/alice/a/"),
+        (b"/abc", b"/user/alice/abc/"),
+        (b"/assets/", b"/user/alice/app/assets/"),
+    ])
+    rng = random.Random(1234)
+    alphabet = [b"/", b"a", b"b", b"c", b"assets/", b"x", b"/abc", b"/a"]
+    for _ in range(200):
+        body = b"".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60)))
+        expected = rewriter.rewrite(body)
+
+        stream = rewriter.stream()
+        output = []
+        position = 0
+        while position < len(body):
+            size = rng.randint(1, 9)
+            output.extend(stream.feed(body[position:position + size]))
+            position += size
+        output.extend(stream.flush())
+
+        assert b"".join(bytes(segment) for segment in output) == expected
+
+
+def test_path_rewriter_is_compiled_once_per_base_path():
+    wrapper = _load_webapp_wrapper_module()
+    rewrites = [{"from": "/assets/", "to": "${base_path}assets/"}, "/jamovi/"]
+
+    first = wrapper.get_path_rewriter(rewrites, "/user/alice/jamovi/")
+    assert wrapper.get_path_rewriter(rewrites, "/user/alice/jamovi/") is first
+    assert wrapper.get_path_rewriter(rewrites, "/jamovi/") is not first
 
+
+def test_jamovi_config_roots_use_browser_facing_base_path():
+    wrapper = _load_webapp_wrapper_module()
     handler = object.__new__(wrapper.WebappHandler)
+    handler.app = wrapper.WebappApp(SimpleNamespace(app_name="jamovi"))
     handler.path = "/user/alice/jamovi/config.js"
     handler.headers = {"Host": "hub.example.test"}
 
@@ -172,54 +211,128 @@ def test_websocket_upgrade_requests_are_tunneled_to_backend(tmp_path):
     backend_thread.start()
     assert backend_ready.wait(2)
 
-    wrapper.config = SimpleNamespace(
-        app_name="jamovi",
-        target_port=backend_port,
-        default_port=backend_port,
-        routes=[("/jamovi", backend_port)],
-        path_rewrites=[],
-        status_endpoint="jamovi-wrapper-status",
-        logfile=str(tmp_path / "jamovi_wrapper.log"),
-    )
-    wrapper.container_ready = True
-
-    socket_path = Path("/tmp") / f"ndwrap-{os.getpid()}-{backend_port}.sock"
-    socket_path.unlink(missing_ok=True)
-    httpd = wrapper.UnixSocketHTTPServer(str(socket_path), wrapper.WebappHandler)
-    server_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
-    server_thread.start()
-
-    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    client.settimeout(5)
-    client.connect(str(socket_path))
-    try:
-        client.sendall(
-            b"GET /user/alice/jamovi/abc123/coms HTTP/1.1\r\n"
-            b"Host: hub.example.test\r\n"
-            b"Upgrade: websocket\r\n"
-            b"Connection: Upgrade\r\n"
-            b"Sec-WebSocket-Key: dGVzdA==\r\n"
-            b"Sec-WebSocket-Version: 13\r\n"
-            b"\r\n"
-        )
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, "jamovi", backend_port, path_rewrites=[]))
+    app.container_ready = True
+
+    with serve_webapp(wrapper, app) as socket_path:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(socket_path)
+        try:
+            client.sendall(
+                b"GET /user/alice/jamovi/abc123/coms HTTP/1.1\r\n"
+                b"Host: hub.example.test\r\n"
+                b"Upgrade: websocket\r\n"
+                b"Connection: Upgrade\r\n"
+                b"Sec-WebSocket-Key: dGVzdA==\r\n"
+                b"Sec-WebSocket-Version: 13\r\n"
+                b"\r\n"
+            )
 
-        response = b""
-        while b"\r\n\r\n" not in response:
-            response += client.recv(4096)
+            response = b""
+            while b"\r\n\r\n" not in response:
+                response += client.recv(4096)
 
-        assert b"101 Switching Protocols" in response
+            assert b"101 Switching Protocols" in response
 
-        client.sendall(b"client-data")
-        assert client.recv(len(b"server-data")) == b"server-data"
-    finally:
-        client.close()
-        httpd.shutdown()
-        httpd.server_close()
-        socket_path.unlink(missing_ok=True)
-        backend_socket.close()
-        server_thread.join(2)
+            client.sendall(b"client-data")
+            assert client.recv(len(b"server-data")) == b"server-data"
+        finally:
+            client.close()
+    backend_socket.close()
 
     assert backend_done.wait(2)
     assert received["payload"] == b"client-data"
     assert received["request"].startswith(b"GET /abc123/coms HTTP/1.1\r\n")
     assert f"Host: localhost:{backend_port}\r\n".encode() in received["request"]
+
+
+@pytest.mark.parametrize("use_splice", [True, False])
+def test_tunnel_multiplexer_forwards_bulk_bytes_and_counts_them(tmp_path, use_splice):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, "jamovi"))
+    if use_splice and not hasattr(os, "splice"):
+        pytest.skip("os.splice is not available")
+
+    client_side, client_peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener = socket.create_server(("127.0.0.1", 0))
+    upstream = socket.create_connection(listener.getsockname())
+    backend_peer, _addr = listener.accept()
+    listener.close()
+
+    mux = wrapper.TunnelMultiplexer(use_splice=use_splice)
+    mux.add(client_peer, upstream, "/jamovi/coms", app)
+
+    payload = os.urandom(3 * wrapper.STREAM_CHUNK_SIZE + 11)
+    received = bytearray()
+
+    def backend_echo_reader():
+        while len(received) < len(payload):
+            data = backend_peer.recv(65536)
+            if not data:
+                break
+            received.extend(data)
+        backend_peer.sendall(b"server-data")
+
+    reader = threading.Thread(target=backend_echo_reader, daemon=True)
+    reader.start()
+    client_side.sendall(payload)
+    reader.join(10)
+    client_side.settimeout(5)
+    assert client_side.recv(len(b"server-data")) == b"server-data"
+    assert bytes(received) == payload
+
+    [stats] = mux.stats()
+    assert stats["path"] == "/jamovi/coms"
+    assert stats["bytes_up"] == len(payload)
+    assert stats["bytes_down"] == len(b"server-data")
+
+    backend_peer.close()
+    assert client_side.recv(1) == b""
+    client_side.close()
+    assert mux.stats() == []
+    # The close is logged just after the tunnel leaves the stats
+    deadline = time.time() + 5
+    while True:
+        wrapper.flush_logs()
+        log_path = Path(app.config.logfile)
+        if log_path.exists() and "bytes up" in log_path.read_text():
+            break
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+    # A client that hangs up while its bytes still wait for a slow backend:
+    # the tunnel must idle until the backend reads them, then close
+    client_side, client_peer = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener = socket.create_server(("127.0.0.1", 0))
+    upstream = socket.create_connection(listener.getsockname())
+    backend_peer, _addr = listener.accept()
+    listener.close()
+    mux.add(client_peer, upstream, "/jamovi/upload", app)
+
+    client_side.setblocking(False)
+    sent = 0
+    chunk = os.urandom(65536)
+    deadline = time.time() + 2
+    while time.time() < deadline:
+        try:
+            sent += client_side.send(chunk)
+        except BlockingIOError:
+            time.sleep(0.01)
+    client_side.close()
+
+    cpu_before = time.process_time()
+    time.sleep(0.5)
+    assert time.process_time() - cpu_before < 0.25
+    assert len(mux.stats()) == 1
+
+    backend_peer.settimeout(5)
+    drained = 0
+    while True:
+        data = backend_peer.recv(65536)
+        if not data:
+            break
+        drained += len(data)
+    backend_peer.close()
+    assert drained == sent
+    assert mux.stats() == []
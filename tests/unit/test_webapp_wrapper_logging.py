@@ -0,0 +1,107 @@
+import http.server
+import json
+import os
+from pathlib import Path
+import threading
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_logging",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def test_log_files_rotate_by_size_keeping_the_configured_generations(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    writer = wrapper.LogWriter(max_bytes=100, backups=2)
+    path = str(tmp_path / "app_wrapper.log")
+
+    for number in range(10):
+        writer.write(path, f"record {number:02d} " + "x" * 19 + "\n")  # 30 bytes
+    writer.flush(5)
+
+    assert sorted(os.listdir(tmp_path)) == ["app_wrapper.log", "app_wrapper.log.1", "app_wrapper.log.2"]
+    records = [
+        [line.split()[1] for line in Path(f"{path}{suffix}").read_text().splitlines()]
+        for suffix in (".2", ".1", "")
+    ]
+    assert records == [["03", "04", "05"], ["06", "07", "08"], ["09"]]
+
+
+def test_records_are_dropped_and_counted_instead_of_blocking_when_the_queue_is_full(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    process_log = tmp_path / "daemon.log"
+    monkeypatch.setattr(wrapper, "process_logfile", str(process_log))
+    release = threading.Event()
+    appending = threading.Event()
+
+    class StalledWriter(wrapper.LogWriter):
+        def _append(self, path, line):
+            appending.set()
+            release.wait(5)
+            super()._append(path, line)
+
+    writer = StalledWriter(max_bytes=0, backups=0, queue_size=3)
+    path = str(tmp_path / "app_wrapper.log")
+    writer.write(path, "first\n")
+    assert appending.wait(5)
+    for number in range(10):
+        writer.write(path, f"queued {number}\n")
+
+    # The writer holds one record, three wait in the queue, the rest are dropped
+    assert writer.dropped == 7
+    release.set()
+    writer.flush(5)
+    assert Path(path).read_text() == "first\nqueued 0\nqueued 1\nqueued 2\n"
+    assert "7 log records dropped" in process_log.read_text()
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.endswith(".js"):
+            body, content_type = b"fetch('/ezbids/api');", "application/javascript"
+        else:
+            body, content_type = b"\0" * 1000, "application/octet-stream"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_each_request_writes_one_structured_access_record(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1]))
+        app.container_ready = True
+        app.access_logfile = app.config.access_logfile
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            unix_request(socket_path, "GET", "/user/alice/ezbids/data.bin?token=secret")
+            unix_request(socket_path, "GET", "/user/alice/ezbids/app.js")
+            unix_request(socket_path, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+    wrapper.flush_logs()
+
+    raw, rewritten, status = [
+        json.loads(line) for line in Path(app.access_logfile).read_text().splitlines()
+    ]
+    assert raw["method"] == "GET"
+    assert raw["path"] == "/user/alice/ezbids/data.bin"
+    assert (raw["status"], raw["bytes"], raw["kind"], raw["rewritten"]) == (200, 1000, "proxied", False)
+    assert raw["ttfb_ms"] >= 0 and raw["duration_ms"] >= raw["ttfb_ms"]
+    assert rewritten["rewritten"] is True
+    assert rewritten["bytes"] == len(b"fetch('/user/alice/ezbids/api');")
+    assert status["status"] == 200 and status["ttfb_ms"] is None
+    # Request lines no longer go to the text log one by one
+    assert not Path(app.config.logfile).exists() or "HTTP:" not in Path(app.config.logfile).read_text()
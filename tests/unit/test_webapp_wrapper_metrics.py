@@ -0,0 +1,155 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+from testlib import http_backend, load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_metrics",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _parse(text):
+    """Map each sample line's name and labels to its value."""
+    samples = {}
+    for line in text.decode().splitlines():
+        if line and not line.startswith("#"):
+            name, _space, value = line.rpartition(" ")
+            samples[name] = float(value)
+    return samples
+
+
+def test_counters_from_many_threads_are_summed_and_exited_threads_folded():
+    wrapper = _load_webapp_wrapper_module()
+    metrics = wrapper.WrapperMetrics()
+
+    def work():
+        for _ in range(1000):
+            metrics.add("response_body_bytes_total", 2)
+        metrics.observe("upstream_ttfb_seconds", 0.02)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.add("tunnels_open")
+
+    snapshot = metrics.snapshot()
+    assert snapshot["response_body_bytes_total", None] == 16000
+    assert snapshot["tunnels_open", None] == 1
+    # Only the live (current) thread keeps a shard of its own
+    assert len(metrics._shards) == 1
+    assert metrics.snapshot() == snapshot
+
+
+def test_metrics_render_in_prometheus_text_format():
+    wrapper = _load_webapp_wrapper_module()
+    metrics = wrapper.WrapperMetrics()
+    for seconds in (0.003, 0.2, 0.2, 90):
+        metrics.observe("request_duration_seconds", seconds, 'kind="proxied"')
+    metrics.add("backend_starts_total")
+
+    text = metrics.render("ezbids", {("requests_in_flight", None): 3})
+    samples = _parse(text)
+
+    assert "# TYPE neurodesk_webapp_request_duration_seconds histogram" in text.decode()
+    bucket = 'neurodesk_webapp_request_duration_seconds_bucket{app="ezbids",kind="proxied",le="%s"}'
+    assert samples[bucket % "0.005"] == 1
+    assert samples[bucket % "0.1"] == 1
+    assert samples[bucket % "0.25"] == 3
+    assert samples[bucket % "60"] == 3
+    assert samples[bucket % "+Inf"] == 4
+    assert samples['neurodesk_webapp_request_duration_seconds_count{app="ezbids",kind="proxied"}'] == 4
+    assert samples['neurodesk_webapp_request_duration_seconds_sum{app="ezbids",kind="proxied"}'] == (
+        pytest.approx(90.403)
+    )
+    assert samples['neurodesk_webapp_backend_starts_total{app="ezbids"}'] == 1
+    assert samples['neurodesk_webapp_requests_in_flight{app="ezbids"}'] == 3
+    # Unrecorded counters still appear, at zero
+    assert samples['neurodesk_webapp_idle_stops_total{app="ezbids"}'] == 0
+
+
+def test_idle_stops_count_only_backends_that_were_running(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, idle_timeout=60, idle_action="stop"))
+    app.container_ready = True
+
+    app.last_client_activity = time.time() - 120
+    app.check_idle()
+    assert app.container_ready is False
+    assert app.metrics.snapshot()["idle_stops_total", None] == 1
+
+    # Still idle on the next tick, but there is nothing left to stop
+    app.last_client_activity = time.time() - 180
+    app.check_idle()
+    assert app.metrics.snapshot()["idle_stops_total", None] == 1
+
+
+class _BackendHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith(".js"):
+            self._reply(b"fetch('/ezbids/api');", "application/javascript")
+        else:
+            self._reply(b"\0" * 1000, "application/octet-stream")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self._reply(str(len(body)).encode(), "text/plain")
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_metrics_endpoint_reports_proxied_traffic_without_counting_as_activity(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    with http_backend(_BackendHandler) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1]))
+        app.lanes = wrapper.ProxyLanes(4, 8 * 1024 * 1024, 0)
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            metrics_path = "/user/alice/ezbids/ezbids-wrapper-metrics"
+            # A scrape while the backend is down neither starts it nor counts as use
+            response, body = unix_request(socket_path, "GET", metrics_path)
+            assert response.status == 200
+            assert response.getheader("Content-Type").startswith("text/plain; version=0.0.4")
+            assert _parse(body)['neurodesk_webapp_backend_ready{app="ezbids"}'] == 0
+            assert app.last_client_activity == 0.0
+            assert app.container_start_thread is None
+
+            app.container_ready = True
+            assert unix_request(socket_path, "GET", "/user/alice/ezbids/data.bin")[1] == b"\0" * 1000
+            assert unix_request(socket_path, "GET", "/user/alice/ezbids/app.js")[1] == (
+                b"fetch('/user/alice/ezbids/api');"
+            )
+            assert unix_request(socket_path, "POST", "/user/alice/ezbids/api", b"x" * 300)[1] == b"300"
+
+            samples = _parse(unix_request(socket_path, "GET", metrics_path)[1])
+            labels = '{app="ezbids",kind="%s"}'
+            assert samples["neurodesk_webapp_request_duration_seconds_count" + labels % "proxied"] == 2
+            assert samples["neurodesk_webapp_request_duration_seconds_count" + labels % "rewritten"] == 1
+            assert samples['neurodesk_webapp_upstream_ttfb_seconds_count{app="ezbids"}'] == 3
+            assert samples['neurodesk_webapp_request_body_bytes_total{app="ezbids"}'] == 300
+            assert samples['neurodesk_webapp_response_body_bytes_total{app="ezbids"}'] == (
+                1000 + len(b"fetch('/user/alice/ezbids/api');") + 3
+            )
+            assert samples['neurodesk_webapp_rewrite_cpu_seconds_total{app="ezbids"}'] >= 0
+            assert samples['neurodesk_webapp_requests_in_flight{app="ezbids"}'] == 0
+            assert samples['neurodesk_webapp_backend_ready{app="ezbids"}'] == 1
+            assert samples['neurodesk_webapp_lane_requests{app="ezbids",lane="interactive",state="queued"}'] == 0
+            assert 'neurodesk_webapp_backend_pool_connections{app="ezbids",pool="bulk",state="idle"}' in samples
@@ -0,0 +1,141 @@
+import http.client
+import json
+import socket
+
+import pytest
+
+from testlib import load_source_module, serve_webapp, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_output",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def test_output_ring_keeps_the_newest_lines_within_its_line_and_byte_caps():
+    wrapper = _load_webapp_wrapper_module()
+    ring = wrapper.OutputRing(max_lines=5, max_bytes=1000)
+    for number in range(8):
+        ring.append(f"line {number}")
+
+    assert list(ring) == [f"line {number}" for number in range(3, 8)]
+    assert "line 7" in ring and "line 2" not in ring
+
+    # 100-byte lines (plus newline): only nine fit under the byte cap
+    ring = wrapper.OutputRing(max_lines=100, max_bytes=1000)
+    for number in range(20):
+        ring.append(f"{number:02d}" + "x" * 98)
+    assert len(ring) == 9
+    assert ring.tail(1)[0].startswith("19")
+
+    ring.append("y" * (wrapper.OUTPUT_LINE_MAX_CHARS * 2))
+    assert ring.tail(1)[0].endswith(" [truncated]")
+    assert len(ring) == 1
+
+
+def test_readers_resume_from_a_sequence_number_and_learn_what_they_missed():
+    wrapper = _load_webapp_wrapper_module()
+    ring = wrapper.OutputRing(max_lines=3)
+    ring.append("a")
+    ring.append("b")
+
+    lines, seq, missed = ring.since(0)
+    assert (lines, seq, missed) == (["a", "b"], 2, 0)
+    assert ring.since(seq) == ([], 2, 0)
+
+    for line in "cdef":
+        ring.append(line)
+    assert ring.since(seq) == (["d", "e", "f"], 6, 1)
+
+
+def test_startup_error_quotes_only_the_last_lines_of_output(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(
+        wrapper, tmp_path, "crashapp",
+        startup_command='for i in $(seq 1 500); do echo "output $i"; done; exit 3',
+        startup_timeout=10,
+        stop_timeout=2,
+        ready_probes=[{"type": "output", "pattern": "ready"}],
+    ))
+    monkeypatch.setattr(wrapper, "PROCESS_EXIT_READY_GRACE", 0.2)
+
+    app.start_container()
+
+    quoted = app.container_error.split("\n")
+    assert len(quoted) == wrapper.ERROR_OUTPUT_LINES
+    assert quoted[0] == f"Container exited unexpectedly: output {500 - wrapper.ERROR_OUTPUT_LINES + 1}"
+    assert quoted[-1] == "output 500"
+
+
+def _connect(socket_path, path, accept=None):
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(10)
+    client.connect(socket_path)
+    head = f"GET {path} HTTP/1.1\r\nHost: hub\r\nConnection: close\r\n"
+    if accept:
+        head += f"Accept: {accept}\r\n"
+    client.sendall((head + "\r\n").encode())
+    response = http.client.HTTPResponse(client, method="GET")
+    response.begin()
+    return client, response
+
+
+def _read_event(response):
+    """Read the next SSE event, skipping comments and retry hints."""
+    event = None
+    while True:
+        line = response.fp.readline().decode().rstrip("\n")
+        if line.startswith("event: "):
+            event = line[len("event: "):]
+        elif line.startswith("data: ") and event is not None:
+            response.fp.readline()
+            return event, json.loads(line[len("data: "):])
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_logs_endpoint_serves_the_tail_and_follows_new_output(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=1, path_rewrites=[]))
+    for number in range(150):
+        app.container_output.append(f"boot {number}")
+
+    logs_path = "/user/alice/ezbids/ezbids-wrapper-logs"
+    with serve_webapp(wrapper, app, server_mode) as socket_path:
+        try:
+            client, response = _connect(socket_path, logs_path)
+            body = response.read().decode()
+            client.close()
+            assert response.getheader("Content-Type") == "text/plain; charset=utf-8"
+            assert body.splitlines() == [f"boot {number}" for number in range(50, 150)]
+
+            client, response = _connect(socket_path, f"{logs_path}?lines=2")
+            assert response.read() == b"boot 148\nboot 149\n"
+            client.close()
+
+            client, response = _connect(socket_path, f"{logs_path}?lines=3", accept="text/event-stream")
+            try:
+                assert response.getheader("Content-Type") == "text/event-stream"
+                assert _read_event(response) == (
+                    "output", {"lines": ["boot 147", "boot 148", "boot 149"], "missed": 0}
+                )
+                app.container_output.append("listening on 8080")
+                app.notify_container_state()
+                assert _read_event(response) == ("output", {"lines": ["listening on 8080"], "missed": 0})
+
+                app.reset_container_runtime_state()
+                app.container_output.append("second start")
+                app.notify_container_state()
+                assert _read_event(response) == ("restart", {})
+                assert _read_event(response) == ("output", {"lines": ["second start"], "missed": 0})
+            finally:
+                client.close()
+
+            # Watching the output neither starts the backend nor counts as use
+            assert app.container_start_thread is None
+            assert app.last_client_activity == 0.0
+        finally:
+            app.shutdown_event.set()
+            app.notify_container_state()
@@ -0,0 +1,146 @@
+import json
+from pathlib import Path
+import time
+
+import pytest
+
+from testlib import load_source_module, repo_path, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_prestart",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+DAY = 86400
+
+
+def test_launcher_hints_use_the_wrapper_endpoint_and_history_file():
+    wrapper = _load_webapp_wrapper_module()
+    launcher = repo_path("extensions/neurodesk-launcher/src/index.ts").read_text(encoding="utf-8")
+
+    assert "`${target.name}-wrapper-prestart`" in launcher
+    history = wrapper.LAUNCH_HISTORY_PATH.relative_to(Path.home())
+    assert f"const LAUNCH_HISTORY_PATH = '{history}';" in launcher
+    for reason in ("'hover'", "'focus'", "'warm'"):
+        assert f"prestartWebapp(target, {reason}, settings)" in launcher
+        assert reason.strip("'") in wrapper.PRESTART_REASONS
+
+
+def test_warm_set_is_the_most_launched_apps_of_the_last_weeks(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    now = [100 * DAY]
+    history = wrapper.LaunchHistory(tmp_path / "launches.json", 2, clock=lambda: now[0])
+    history.path.write_text("{not json")
+
+    for name in ("jamovi", "ezbids", "ezbids", "rstudio", "rstudio", "rstudio"):
+        history.record(name)
+    saved = json.loads(history.path.read_text())
+    assert saved["launches"]["rstudio"] == {"count": 3, "last": 100 * DAY}
+    assert saved["warm_set"] == ["rstudio", "ezbids"]
+
+    # Apps not opened for a month drop out, however often they were used
+    now[0] += (wrapper.WARM_SET_WINDOW_DAYS + 1) * DAY
+    history.record("jamovi")
+    assert json.loads(history.path.read_text())["warm_set"] == ["jamovi"]
+
+
+def test_launch_history_is_off_unless_a_warm_set_size_is_configured(monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    monkeypatch.delenv("NEURODESK_WEBAPP_WARM_SET", raising=False)
+    assert wrapper.create_launch_history() is None
+    monkeypatch.setenv("NEURODESK_WEBAPP_WARM_SET", "3")
+    assert wrapper.create_launch_history().warm_set_size == 3
+
+
+def _idle_config(wrapper, tmp_path):
+    return webapp_config(
+        wrapper, tmp_path,
+        idle_timeout=600,
+        idle_action="freeze",
+        idle_kill_timeout=1800,
+        prestart_idle_timeout=30,
+    )
+
+
+def test_unopened_prestarted_backend_is_stopped_after_the_shorter_timeout(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_idle_config(wrapper, tmp_path))
+    stops = []
+    monkeypatch.setattr(app, "stop_backend", stops.append)
+    monkeypatch.setattr(app, "ensure_container_starting", lambda reason: None)
+
+    assert app.prestart("hover") is True
+    app.set_container_ready()
+    app.last_client_activity = time.time() - 20
+    app.check_idle()
+    assert stops == []
+
+    app.last_client_activity = time.time() - 31
+    app.check_idle()
+    assert len(stops) == 1 and stops[0].startswith("Prestarted backend not opened")
+    assert app.metrics.snapshot()["prestarts_total", 'outcome="miss"'] == 1
+
+
+def test_an_opened_backend_goes_back_to_normal_idle_handling(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_idle_config(wrapper, tmp_path))
+    stops = []
+    monkeypatch.setattr(app, "stop_backend", stops.append)
+    monkeypatch.setattr(app, "ensure_container_starting", lambda reason: None)
+
+    app.prestart("hover")
+    app.set_container_ready()
+    app.begin_client_request()
+    app.end_client_request()
+    assert app.prestarted is False
+    assert app.metrics.snapshot()["prestarts_total", 'outcome="hit"'] == 1
+
+    # A hint for an app already in use does not shorten its lifetime
+    assert app.prestart("hover") is False
+    app.last_client_activity = time.time() - 31
+    app.check_idle()
+    assert stops == []
+
+
+def _post(socket_path, path):
+    response, body = unix_request(socket_path, "POST", path)
+    return response.status, json.loads(body)
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_prestart_endpoint_starts_the_backend_and_the_first_request_records_a_launch(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=1, path_rewrites=[], prestart=True))
+    starts = []
+    app.ensure_container_starting = starts.append
+    app.launch_history = wrapper.LaunchHistory(tmp_path / "launches.json", 3)
+
+    prestart_path = "/user/alice/ezbids/ezbids-wrapper-prestart"
+    with serve_webapp(wrapper, app, server_mode) as socket_path:
+        assert _post(socket_path, f"{prestart_path}?reason=hover") == (
+            202, {"prestarted": True, "ready": False}
+        )
+        assert _post(socket_path, f"{prestart_path}?reason=<script>") == (
+            202, {"prestarted": True, "ready": False}
+        )
+        assert starts == ["prestart: hover", "prestart: hint"]
+        assert app.prestarted is True
+        assert app.active_client_requests == 0
+        assert not app.launch_history.path.exists()
+
+        # The user opens the app: a launch, counted once per backend run
+        unix_request(socket_path, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+        unix_request(socket_path, "GET", "/user/alice/ezbids/ezbids-wrapper-status")
+        deadline = time.time() + 5
+        while not app.launch_history.path.exists():
+            assert time.time() < deadline
+            time.sleep(0.01)
+        time.sleep(0.1)
+        assert app.launch_history.load()["ezbids"]["count"] == 1
+        assert app.prestarted is False
+
+        assert _post(socket_path, prestart_path) == (200, {"prestarted": False, "ready": False})
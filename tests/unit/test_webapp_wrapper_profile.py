@@ -0,0 +1,106 @@
+import os
+import re
+import threading
+import tracemalloc
+
+import pytest
+
+from testlib import load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_profile",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def test_profiling_is_off_unless_enabled(monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    monkeypatch.delenv("NEURODESK_WEBAPP_PROFILING", raising=False)
+    config = wrapper.WebappConfig("ezbids", {"ezbids": {}})
+    assert config.profiling is False
+    assert config.profile_endpoint == "ezbids-wrapper-profile"
+    assert wrapper.WebappConfig("ezbids", {"ezbids": {"profiling": True}}).profiling is True
+    monkeypatch.setenv("NEURODESK_WEBAPP_PROFILING", "1")
+    assert wrapper.WebappConfig("ezbids", {"ezbids": {}}).profiling is True
+
+
+def _spin_for_profile(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _allocate_for_profile(stop, kept):
+    while not stop.is_set():
+        kept.append(bytearray(4096))
+        stop.wait(0.001)
+
+
+def _get(socket_path, path):
+    response, body = unix_request(socket_path, "GET", path)
+    return response.status, body.decode()
+
+
+@pytest.fixture(params=["threaded", "asyncio"])
+def profiled_wrapper(request, tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=1, path_rewrites=[]))
+    starts = []
+    app.ensure_container_starting = starts.append
+    app.profiler = wrapper.WrapperProfiler(interval=0.002)
+    with serve_webapp(wrapper, app, request.param) as socket_path:
+        yield wrapper, app, socket_path, starts
+
+
+PROFILE_PATH = "/user/alice/ezbids/ezbids-wrapper-profile"
+
+
+def test_cpu_profile_returns_collapsed_stacks_of_every_thread(profiled_wrapper):
+    _wrapper, app, socket_path, starts = profiled_wrapper
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin_for_profile, args=(stop,), name="busy-worker", daemon=True)
+    worker.start()
+    try:
+        status, body = _get(socket_path, f"{PROFILE_PATH}?seconds=1")
+    finally:
+        stop.set()
+        worker.join(5)
+
+    assert status == 200
+    lines = body.splitlines()
+    assert lines and all(re.fullmatch(r"[^;]+(;[^;]+)* \d+", line) for line in lines)
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert any(";_spin_for_profile (test_webapp_wrapper_profile.py:" in line for line in busy)
+    # The profile is not browser activity and leaves the backend alone
+    assert starts == [] and app.active_client_requests == 0
+
+
+def test_memory_profile_reports_growth_and_stops_tracing(profiled_wrapper):
+    _wrapper, _app, socket_path, _starts = profiled_wrapper
+    stop = threading.Event()
+    kept = []
+    worker = threading.Thread(target=_allocate_for_profile, args=(stop, kept), daemon=True)
+    worker.start()
+    try:
+        status, body = _get(socket_path, f"{PROFILE_PATH}?mem=1&seconds=1")
+    finally:
+        stop.set()
+        worker.join(5)
+
+    assert status == 200
+    assert body.startswith("# Top 30 allocation changes over 1s (tracemalloc)\n")
+    assert "test_webapp_wrapper_profile.py:" in body
+    assert not tracemalloc.is_tracing()
+
+
+def test_profiles_are_refused_to_other_users_and_taken_one_at_a_time(profiled_wrapper, monkeypatch):
+    wrapper, app, socket_path, _starts = profiled_wrapper
+
+    monkeypatch.setattr(wrapper, "peer_uid", lambda sock: os.getuid() + 1)
+    assert _get(socket_path, f"{PROFILE_PATH}?seconds=1")[0] == 403
+    monkeypatch.undo()
+
+    with app.profiler.lock:
+        assert _get(socket_path, f"{PROFILE_PATH}?seconds=1") == (409, "A profile is already being taken\n")
@@ -0,0 +1,204 @@
+import os
+from pathlib import Path
+import socket
+import threading
+import time
+
+import pytest
+
+from testlib import load_source_module, serve_webapp, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_readiness",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _config(wrapper, tmp_path, startup_command, ready_probes, **overrides):
+    return webapp_config(
+        wrapper, tmp_path, "probeapp",
+        startup_command=startup_command,
+        startup_timeout=10,
+        stop_timeout=2,
+        ready_probes=ready_probes,
+        **overrides,
+    )
+
+
+def test_ready_probes_default_to_tcp_and_reject_invalid_entries():
+    wrapper = _load_webapp_wrapper_module()
+
+    assert wrapper.parse_ready_probes(None, "app") == [{"type": "tcp"}]
+    assert wrapper.parse_ready_probes(["tcp", {"type": "http", "status": 200}], "app") == [
+        {"type": "tcp"},
+        {"type": "http", "status": 200},
+    ]
+    with pytest.raises(ValueError, match="invalid ready probe"):
+        wrapper.parse_ready_probes([{"type": "ping"}], "app")
+    with pytest.raises(ValueError, match="needs a pattern"):
+        wrapper.parse_ready_probes([{"type": "output"}], "app")
+    with pytest.raises(ValueError, match="needs a path"):
+        wrapper.parse_ready_probes([{"type": "unix_socket"}], "app")
+
+
+def test_unix_socket_probe_passes_once_the_socket_accepts(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    socket_path = Path("/tmp") / f"ndwrap-probe-{os.getpid()}.sock"
+    socket_path.unlink(missing_ok=True)
+    probe = wrapper.UnixSocketReadinessProbe({"type": "unix_socket", "path": str(socket_path)})
+
+    assert probe.check() is False
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        listener.bind(str(socket_path))
+        listener.listen(1)
+        assert probe.check() is True
+    finally:
+        listener.close()
+        socket_path.unlink(missing_ok=True)
+
+
+def test_output_probe_marks_backend_ready_as_the_line_is_printed(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_config(
+        wrapper, tmp_path,
+        "sleep 0.3; echo 'Server listening on socket'; sleep 30",
+        [{"type": "output", "pattern": "listening on"}],
+    ))
+    # Long backoff: readiness must come from the output notification
+    monkeypatch.setattr(wrapper.ReadinessBackoff, "next_delay", lambda _self: 30.0)
+
+    waiter_result = {}
+
+    def waiter():
+        waiter_result["ready"] = app.wait_for_container_ready(10)
+        waiter_result["at"] = time.monotonic()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    started = time.monotonic()
+    starter = threading.Thread(target=app.start_container, daemon=True)
+    starter.start()
+    try:
+        thread.join(10)
+        assert waiter_result["ready"] is True
+        assert waiter_result["at"] - started < 5
+        assert app.container_error is None
+    finally:
+        app.stop_container_processes()
+        starter.join(5)
+
+
+def test_exited_backend_that_never_passes_its_probes_reports_its_output(tmp_path, monkeypatch):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_config(
+        wrapper, tmp_path,
+        "echo 'fatal: no licence'; exit 3",
+        [{"type": "output", "pattern": "ready"}],
+    ))
+    monkeypatch.setattr(wrapper, "PROCESS_EXIT_READY_GRACE", 0.2)
+
+    app.start_container()
+
+    assert app.container_ready is False
+    assert "fatal: no licence" in app.container_error
+    assert app.wait_for_container_ready(1) is False
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_status_event_stream_pushes_output_and_readiness_as_they_happen(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_config(wrapper, tmp_path, "true", [{"type": "tcp"}]))
+    app.startup_start_time = time.time()
+
+    with serve_webapp(wrapper, app, server_mode) as socket_path:
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        client.settimeout(5)
+        client.connect(socket_path)
+        try:
+            client.sendall(
+                b"GET /user/alice/probeapp/probeapp-wrapper-status HTTP/1.1\r\n"
+                b"Host: hub\r\nAccept: text/event-stream\r\n\r\n"
+            )
+            response = b""
+            while b"event: starting" not in response:
+                response += client.recv(4096)
+            assert b"Content-Type: text/event-stream" in response
+
+            app.container_output.append("Loading R libraries")
+            app.notify_container_state()
+            while b"event: output" not in response:
+                response += client.recv(4096)
+            app.set_container_ready()
+
+            while True:
+                data = client.recv(4096)
+                if not data:
+                    break
+                response += data
+        finally:
+            client.close()
+
+    events = [line for line in response.split(b"\n") if line.startswith(b"event: ")]
+    assert events == [b"event: starting", b"event: output", b"event: ready"]
+    assert b'data: {"lines": ["Loading R libraries"]}' in response
+
+
+SOCKET_ACTIVATED_APP = r"""python3 -c '
+import http.server, os, socket, sys, time
+print("fds", os.environ["LISTEN_FDS"], os.environ["LISTEN_PID"].isdigit(), flush=True)
+time.sleep(0.3)
+class Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+server = http.server.HTTPServer(("127.0.0.1", 0), Handler, bind_and_activate=False)
+server.socket.close()
+server.socket = socket.socket(fileno=3)
+server.serve_forever()
+'"""
+
+
+def test_socket_activated_app_inherits_listener_and_is_ready_once_it_accepts(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(_config(
+        wrapper, tmp_path,
+        SOCKET_ACTIVATED_APP,
+        wrapper.parse_ready_probes(None, "probeapp", socket_activation=True),
+        socket_activation=True,
+    ))
+
+    starter = threading.Thread(target=app.start_container, daemon=True)
+    starter.start()
+    try:
+        # A request sent before the app runs queues in the listen backlog
+        early = socket.create_connection(("127.0.0.1", _wait_for_port(app)), timeout=5)
+        early.sendall(b"GET / HTTP/1.0\r\n\r\n")
+        assert app.container_ready is False
+
+        assert app.wait_for_container_ready(10) is True
+        response = b""
+        while not response.endswith(b"ok"):
+            data = early.recv(4096)
+            assert data
+            response += data
+        assert response.startswith(b"HTTP/1.0 200")
+        early.close()
+        assert "fds 1 True" in app.container_output
+        assert app.container_listen_socket is None
+    finally:
+        app.stop_container_processes()
+        starter.join(5)
+
+
+def _wait_for_port(app):
+    deadline = time.time() + 5
+    while app.config.target_port == 0:
+        assert time.time() < deadline
+        time.sleep(0.01)
+    return app.config.target_port
@@ -1,9 +1,16 @@
+import asyncio
+import http.client
+import http.server
 import io
+import random
+import socket
+import threading
 from types import SimpleNamespace
+import zlib
 
 import pytest
 
-from testlib import load_source_module
+from testlib import http_backend, load_source_module, serve_webapp, webapp_config
 
 
 def _load_webapp_wrapper_module():
@@ -49,6 +56,7 @@ def test_proxy_passes_a_lazy_fixed_length_body_to_httpx(monkeypatch):
     wrapper = _load_webapp_wrapper_module()
     payload = b"upload" * wrapper.STREAM_CHUNK_SIZE
     handler = _make_handler(wrapper, payload)
+    handler.command = "POST"
     handler.path = "/user/alice/ezbids/api/upload"
     handler.headers = {
         "Host": "hub.example.test",
@@ -56,11 +64,11 @@ def test_proxy_passes_a_lazy_fixed_length_body_to_httpx(monkeypatch):
         "Content-Length": str(len(payload)),
     }
 
-    wrapper.config = SimpleNamespace(
+    handler.app = wrapper.WebappApp(SimpleNamespace(
         app_name="ezbids",
         target_port=8082,
         path_rewrites=[],
-    )
+    ))
     monkeypatch.setattr(
         wrapper.WebappHandler,
         "_resolve_proxy_target",
@@ -126,3 +134,207 @@ def test_proxy_passes_a_lazy_fixed_length_body_to_httpx(monkeypatch):
         len(chunk) <= wrapper.STREAM_CHUNK_SIZE for chunk in fake_client.chunks
     )
     assert ("Content-Length", str(len(payload))) in fake_client.headers
+
+
+class _GeneratorStream(io.RawIOBase):
+    """Raw stream that reads lazily from a generator of byte pieces."""
+
+    def __init__(self, pieces):
+        self._pieces = iter(pieces)
+        self._pending = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._pieces))
+            except StopIteration:
+                return 0
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+def _synthetic_chunked_upload(total, result, seed=0):
+    """Yield a chunked body of ``total`` bytes; ``result`` gets its CRC.
+
+    Chunk sizes vary and reuse slices of one random block, so generating
+    gigabytes needs no more than a megabyte of memory.
+    """
+    rng = random.Random(seed)
+    block = memoryview(rng.randbytes((1 << 20) + 4099))
+    crc = 0
+    sent = 0
+    while sent < total:
+        size = min(rng.randint(1, len(block)), total - sent)
+        offset = rng.randint(0, len(block) - size)
+        data = block[offset:offset + size]
+        crc = zlib.crc32(data, crc)
+        extension = b";part=%d" % sent if rng.random() < 0.1 else b""
+        yield b"%x%s\r\n" % (size, extension)
+        yield data
+        yield b"\r\n"
+        sent += size
+    result["crc"] = crc
+    yield b"0\r\nX-Upload-Checksum: done\r\n\r\n"
+
+
+@pytest.mark.parametrize("line", [
+    b"\r\n", b"0x10\r\n", b"-1\r\n", b"1 0\r\n", b"10", b"10\n",
+    b"1" * 17 + b"\r\n", b"a;" + b"x" * 5000 + b"\r\n",
+])
+def test_malformed_chunk_size_lines_are_rejected(line):
+    wrapper = _load_webapp_wrapper_module()
+
+    with pytest.raises(wrapper.RequestFramingError):
+        wrapper.parse_chunk_size_line(line)
+
+
+def test_chunked_framing_helpers_accept_extensions_trailers_and_only_chunked():
+    wrapper = _load_webapp_wrapper_module()
+
+    assert wrapper.parse_chunk_size_line(b"1aF ;name=value\r\n") == 0x1AF
+    assert wrapper.is_last_trailer_line(b"\r\n") is True
+    assert wrapper.is_last_trailer_line(b"Digest: sha-256=abc\r\n") is False
+    for trailer in (b": value\r\n", b"No Colon\r\n", b"Bad Name: x\r\n", b"X: y\n"):
+        with pytest.raises(wrapper.RequestFramingError):
+            wrapper.is_last_trailer_line(trailer)
+    assert wrapper.is_chunked_transfer_encoding("Chunked") is True
+    for coding in ("gzip, chunked", "chunked, gzip", "identity"):
+        with pytest.raises(wrapper.RequestFramingError):
+            wrapper.is_chunked_transfer_encoding(coding)
+
+
+def test_chunked_body_decoder_rejects_data_without_its_crlf():
+    wrapper = _load_webapp_wrapper_module()
+    handler = _make_handler(wrapper, b"3\r\nabcX\r\n0\r\n\r\n")
+
+    with pytest.raises(wrapper.RequestFramingError, match="CRLF"):
+        list(handler._iter_chunked_request_body())
+
+
+def test_multi_gigabyte_chunked_upload_is_decoded_in_bounded_chunks():
+    wrapper = _load_webapp_wrapper_module()
+    total = 2 * 1024 ** 3 + 12345
+    expected = {}
+    handler = object.__new__(wrapper.WebappHandler)
+    handler.rfile = io.BufferedReader(_GeneratorStream(
+        [*_synthetic_chunked_upload(total, expected), b"GET /next HTTP/1.1\r\n"]
+    ))
+    handler._chunked_body_pending = True
+
+    received = 0
+    crc = 0
+    for chunk in handler._iter_chunked_request_body():
+        assert 0 < len(chunk) <= wrapper.STREAM_CHUNK_SIZE
+        received += len(chunk)
+        crc = zlib.crc32(chunk, crc)
+
+    assert received == total
+    assert crc == expected["crc"]
+    assert handler._chunked_body_pending is False
+    # The trailer is consumed and the next pipelined request is untouched
+    assert handler.rfile.read() == b"GET /next HTTP/1.1\r\n"
+
+
+def test_multi_gigabyte_chunked_upload_is_decoded_on_the_event_loop():
+    wrapper = _load_webapp_wrapper_module()
+    total = 1024 ** 3 + 777
+    expected = {}
+    writer_sock, reader_sock = socket.socketpair()
+
+    def send_upload():
+        with writer_sock:
+            for piece in _synthetic_chunked_upload(total, expected, seed=1):
+                writer_sock.sendall(piece)
+
+    async def decode():
+        reader, writer = await asyncio.open_connection(sock=reader_sock, limit=65538)
+        handler = object.__new__(wrapper.AsyncWebappHandler)
+        handler.reader = reader
+        received = 0
+        crc = 0
+        async for chunk in handler._iter_chunked_request_body_async():
+            assert 0 < len(chunk) <= wrapper.STREAM_CHUNK_SIZE
+            received += len(chunk)
+            crc = zlib.crc32(chunk, crc)
+        writer.close()
+        return received, crc
+
+    sender = threading.Thread(target=send_upload, daemon=True)
+    sender.start()
+    received, crc = asyncio.run(decode())
+    sender.join(10)
+
+    assert received == total
+    assert crc == expected["crc"]
+
+
+class _ChunkedEchoBackend(http.server.BaseHTTPRequestHandler):
+    """Decodes the chunked body httpx sends and answers with its size and CRC."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        assert self.headers.get("Transfer-Encoding") == "chunked"
+        assert self.headers.get("Content-Length") is None
+        received = 0
+        crc = 0
+        while True:
+            size = int(self.rfile.readline().split(b";")[0], 16)
+            if size == 0:
+                while self.rfile.readline() != b"\r\n":
+                    pass
+                break
+            data = self.rfile.read(size)
+            received += len(data)
+            crc = zlib.crc32(data, crc)
+            self.rfile.readline()
+        body = f"{received} {crc}".encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_chunked_uploads_are_streamed_to_the_backend(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    total = 64 * 1024 ** 2 + 3
+    expected = {}
+    head = (
+        b"POST /user/alice/ezbids/api/upload HTTP/1.1\r\nHost: hub\r\n"
+        b"Transfer-Encoding: chunked\r\n\r\n"
+    )
+
+    with http_backend(_ChunkedEchoBackend) as backend:
+        app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=backend.server_address[1], path_rewrites=[]))
+        app.container_ready = True
+        with serve_webapp(wrapper, app, server_mode) as socket_path:
+            client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            client.settimeout(10)
+            client.connect(socket_path)
+            try:
+                client.sendall(head)
+                for piece in _synthetic_chunked_upload(total, expected):
+                    client.sendall(piece)
+                response = http.client.HTTPResponse(client, method="POST")
+                response.begin()
+                assert response.read() == f"{total} {expected['crc']}".encode()
+                assert not response.will_close
+
+                # Malformed framing is rejected and the connection closed
+                client.sendall(head + b"zz\r\n")
+                response = http.client.HTTPResponse(client, method="POST")
+                response.begin()
+                assert response.status == 400
+                assert b"Invalid chunk size" in response.read()
+                assert response.will_close
+            finally:
+                client.close()
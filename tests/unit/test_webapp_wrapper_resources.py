@@ -0,0 +1,144 @@
+import json
+
+import pytest
+
+from testlib import load_source_module, serve_webapp, unix_request, webapp_config
+
+
+def _load_webapp_wrapper_module():
+    return load_source_module(
+        "webapp_wrapper_resources",
+        "/opt/neurodesktop/webapp_wrapper/webapp_wrapper.py",
+        "config/jupyter/webapp_wrapper/webapp_wrapper.py",
+    )
+
+
+def _pressure(some_avg10, full_avg10=0.0):
+    return (
+        f"some avg10={some_avg10:.2f} avg60=1.50 avg300=0.50 total=12345\n"
+        f"full avg10={full_avg10:.2f} avg60=0.00 avg300=0.00 total=678\n"
+    )
+
+
+def _fake_cgroup(path):
+    """A backend cgroup directory made of plain files with cgroup v2 contents."""
+    path.mkdir()
+    files = {
+        "cpu.stat": "usage_usec 1000000\nuser_usec 800000\nsystem_usec 200000\n",
+        "cpu.max": "150000 100000\n",
+        "memory.current": str(300 * 1048576),
+        "memory.peak": str(400 * 1048576),
+        "memory.max": str(512 * 1048576),
+        "memory.events": "low 0\nhigh 0\nmax 0\noom 0\noom_kill 0\n",
+        "cpu.pressure": _pressure(2.0),
+        "memory.pressure": _pressure(0.0),
+        "io.pressure": _pressure(0.5),
+    }
+    for name, text in files.items():
+        (path / name).write_text(text)
+    return path
+
+
+def test_cgroup_limit_keys_are_validated_into_cgroup_file_values():
+    wrapper = _load_webapp_wrapper_module()
+
+    assert wrapper.parse_cgroup_limits({}, "ezbids") == {}
+    assert wrapper.parse_cgroup_limits(
+        {"cpu_quota": 2, "memory_max": "4G", "io_weight": 200}, "ezbids"
+    ) == {"cpu.max": "200000 100000", "memory.max": str(4 * 1024 ** 3), "io.weight": "default 200"}
+    assert wrapper.parse_cgroup_limits({"cpu_quota": "0.001"}, "ezbids") == {"cpu.max": "1000 100000"}
+
+    assert wrapper.parse_memory_size(1048576) == 1048576
+    assert wrapper.parse_memory_size("1.5 GiB") == int(1.5 * 1024 ** 3)
+    assert wrapper.parse_memory_size("512mb") == 512 * 1048576
+    for invalid in ("lots", "-1G", 0, True):
+        assert wrapper.parse_memory_size(invalid) is None
+
+    for key, value in (
+        ("cpu_quota", 0), ("cpu_quota", "all"), ("cpu_quota", float("nan")),
+        ("memory_max", "4 gigs"), ("io_weight", 0), ("io_weight", 20000),
+    ):
+        with pytest.raises(ValueError, match=f"ezbids: {key}"):
+            wrapper.parse_cgroup_limits({key: value}, "ezbids")
+
+
+def test_cgroup_usage_reads_memory_limits_and_pressure(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    cgroup = wrapper.BackendCgroup(_fake_cgroup(tmp_path / "ezbids"))
+
+    usage = cgroup.usage()
+    assert usage["memory_current"] == 300 * 1048576
+    assert usage["memory_peak"] == 400 * 1048576
+    assert usage["memory_max"] == 512 * 1048576
+    assert usage["cpu_max"] == 1.5
+    assert usage["memory_events"] == {"high": 0, "max": 0, "oom": 0, "oom_kill": 0}
+    assert usage["pressure"]["io"] == {
+        "some": {"avg10": 0.5, "avg60": 1.5, "avg300": 0.5},
+        "full": {"avg10": 0.0, "avg60": 0.0, "avg300": 0.0},
+    }
+
+    # Unlimited, and on kernels without memory.peak or PSI
+    (tmp_path / "ezbids" / "memory.max").write_text("max\n")
+    (tmp_path / "ezbids" / "cpu.max").write_text("max 100000\n")
+    for name in ("memory.peak", "cpu.pressure", "memory.pressure", "io.pressure"):
+        (tmp_path / "ezbids" / name).unlink()
+    usage = cgroup.usage()
+    assert usage["memory_max"] is None and usage["cpu_max"] is None and usage["memory_peak"] is None
+    assert usage["pressure"] == {"cpu": None, "memory": None, "io": None}
+
+
+def test_monitor_measures_cpu_rate_and_logs_memory_pressure_events(tmp_path):
+    wrapper = _load_webapp_wrapper_module()
+    path = _fake_cgroup(tmp_path / "ezbids")
+    messages = []
+    now = [100.0]
+    monitor = wrapper.BackendResourceMonitor(
+        wrapper.BackendCgroup(path), log=messages.append, clock=lambda: now[0]
+    )
+
+    monitor.check()
+    assert monitor.usage()["cpu_percent"] is None
+    now[0] += 5
+    (path / "cpu.stat").write_text("usage_usec 3500000\n")
+    monitor.check()
+    assert monitor.usage()["cpu_percent"] == 50.0
+    assert messages == []
+
+    (path / "memory.events").write_text("low 0\nhigh 0\nmax 4\noom 1\noom_kill 1\n")
+    (path / "memory.pressure").write_text(_pressure(25.0, 12.0))
+    monitor.check()
+    assert messages == [
+        "Backend memory events: max +4, oom +1, oom_kill +1 (300 MiB used of 512 MiB)",
+        "Backend under memory pressure: some avg10=25.0% (300 MiB used of 512 MiB)",
+    ]
+
+    # Still under pressure, then below half the threshold: logged once each
+    (path / "memory.pressure").write_text(_pressure(8.0))
+    monitor.check()
+    (path / "memory.pressure").write_text(_pressure(1.0))
+    monitor.check()
+    assert messages[2:] == ["Backend memory pressure eased: some avg10=1.0% (300 MiB used of 512 MiB)"]
+
+
+def _get_json(socket_path, path):
+    return json.loads(unix_request(socket_path, "GET", path)[1])
+
+
+@pytest.mark.parametrize("server_mode", ["threaded", "asyncio"])
+def test_status_endpoint_reports_backend_resources(tmp_path, server_mode):
+    wrapper = _load_webapp_wrapper_module()
+    app = wrapper.WebappApp(webapp_config(wrapper, tmp_path, port=1, path_rewrites=[]))
+    app.ensure_container_starting = lambda reason: None
+
+    status_path = "/user/alice/ezbids/ezbids-wrapper-status"
+    with serve_webapp(wrapper, app, server_mode) as socket_path:
+        # No delegated cgroup: nothing to report
+        assert "resources" not in _get_json(socket_path, status_path)
+
+        path = _fake_cgroup(tmp_path / "neurodesk-webapp-ezbids")
+        app.resource_monitor = wrapper.BackendResourceMonitor(wrapper.BackendCgroup(path), log=app.log)
+        resources = _get_json(socket_path, status_path)["resources"]
+        assert resources["memory_current"] == 300 * 1048576
+        assert resources["cpu_max"] == 1.5
+        assert resources["cpu_percent"] is None
+        assert resources["pressure"]["cpu"]["some"]["avg10"] == 2.0